@@ -0,0 +1 @@
+''' Benchmarks of the api, run with `python -m benchmarks.<name>` from the api directory. '''
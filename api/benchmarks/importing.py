@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+'''
+Benchmark of parsing a multi-file GPX import serially and on process pools of increasing size.
+Reports the speedup over the serial parse and the parallel efficiency (speedup per process).
+
+    python -m benchmarks.importing --files ../data/*/gpx-data/*.gpx --copies 4
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import time
+from typing import Dict, List
+
+from src.importers import parallel
+
+_DEFAULT_FILES = str(Path(__file__).resolve().parents[2] / 'data' / '*' / 'gpx-data' / '*.gpx')
+
+
+def _best_of(func, repeat: int) -> float:
+    ret = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        ret = min(ret, time.perf_counter() - start)
+    return ret
+
+
+def _run(files: List[bytes], workers: List[int], repeat: int) -> List[Dict[str, float]]:
+    serial = _best_of(lambda: list(map(parallel.parse, files)), repeat)
+    ret = [{'workers': 0, 'seconds': serial, 'speedup': 1.0, 'efficiency': 1.0}]
+    context = multiprocessing.get_context('spawn')
+    for count in workers:
+        with ProcessPoolExecutor(count, mp_context=context) as pool:
+            # Start the processes before timing, as the app's pool is long lived.
+            list(pool.map(int, range(count)))
+            elapsed = _best_of(lambda: list(pool.map(parallel.parse, files)), repeat)
+        speedup = serial / elapsed
+        ret.append({
+            'workers': count,
+            'seconds': elapsed,
+            'speedup': speedup,
+            'efficiency': speedup / count,
+        })
+    return ret
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', nargs='+', default=[_DEFAULT_FILES],
+                        help='GPX files (or glob patterns) making up the import.')
+    parser.add_argument('--copies', type=int, default=4,
+                        help='Number of times the files are repeated in the import.')
+    cores = os.cpu_count() or 1
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, max(1, cores // 2), cores}))
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per setup, best is kept.')
+    parser.add_argument('--json', action='store_true', help='Print results as json lines.')
+    args = parser.parse_args()
+
+    paths = sorted({x for pattern in args.files for x in glob.glob(pattern)})
+    if not paths:
+        parser.error('No GPX files found')
+    files = [Path(x).read_bytes() for x in paths] * args.copies
+    size = sum(map(len, files)) / 1e6
+    if not args.json:
+        print(f'{len(files)} files, {size:.1f} MB, {cores} cores')
+    for ret in _run(files, args.workers, args.repeat):
+        ret['cores'] = cores
+        if args.json:
+            print(json.dumps(ret))
+            continue
+        label = 'serial' if ret['workers'] == 0 else f'workers={ret["workers"]:3d}'
+        print(f'{label:12s} {ret["seconds"]:8.3f} s  speedup={ret["speedup"]:5.2f}  '
+              f'efficiency={ret["efficiency"]:5.2f}')
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+'''
+Load benchmark of a running api: throughput and latency under concurrent picture and track
+requests.
+
+Compare serving profiles by running it against the local production stack (`make localup`, which
+serves with `APP_MODE=production`) and against the development server:
+
+    python -m benchmarks.serving --url http://localhost:8080/api --hike 1 --concurrency 1 4 16
+'''
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import requests
+
+_TIMEOUT = 60
+
+
+def _percentile(values: List[float], perc: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(perc / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _routes(base_url: str, hike_id: int) -> List[str]:
+    ''' Mix of picture downloads and full track requests of the hike. '''
+    resp = requests.get(f'{base_url}/pictures/hike/{hike_id}', timeout=_TIMEOUT)
+    resp.raise_for_status()
+    pics = map(lambda x: f'{base_url}/pictures/{x["id"]}.{x["fmt"].lower()}', resp.json()['data'])
+    pics = list(pics)
+    tracks = [f'{base_url}/tracks/hike/{hike_id}', f'{base_url}/hikes/{hike_id}?includeTrack=true']
+    # Pictures outnumber track requests on a hike page.
+    return list(itertools.chain(pics, tracks * max(1, len(pics) // 4)))
+
+
+def _run(routes: List[str], concurrency: int, duration: float) -> Dict[str, float]:
+    latencies: Dict[str, List[float]] = {'pictures': [], 'tracks': []}
+    errors = 0
+    nbytes = 0
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+    cycle = itertools.cycle(routes)
+
+    def _worker():
+        nonlocal errors, nbytes
+        with requests.Session() as session:
+            while time.monotonic() < stop:
+                with lock:
+                    url = next(cycle)
+                kind = 'pictures' if '/pictures/' in url else 'tracks'
+                start = time.perf_counter()
+                try:
+                    resp = session.get(url, timeout=_TIMEOUT)
+                    size = len(resp.content)
+                    failed = resp.status_code != 200
+                except requests.RequestException:
+                    size, failed = 0, True
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies[kind].append(elapsed)
+                    nbytes += size
+                    errors += int(failed)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(_worker)
+    elapsed = time.monotonic() - start
+
+    total = sum(map(len, latencies.values()))
+    ret: Dict[str, float] = {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': total / elapsed,
+        'throughput_mbps': nbytes / elapsed / 1e6,
+    }
+    for kind, values in latencies.items():
+        ret[f'{kind}_p50_ms'] = _percentile(values, 50) * 1000
+        ret[f'{kind}_p95_ms'] = _percentile(values, 95) * 1000
+        ret[f'{kind}_mean_ms'] = statistics.fmean(values) * 1000 if values else 0.0
+    return ret
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8080/api', help='Base url of the api.')
+    parser.add_argument('--hike', type=int, required=True, help='Hike to request data of.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per run.')
+    parser.add_argument('--json', action='store_true', help='Print results as json lines.')
+    args = parser.parse_args()
+
+    routes = _routes(args.url, args.hike)
+    for concurrency in args.concurrency:
+        ret = _run(routes, concurrency, args.duration)
+        if args.json:
+            print(json.dumps(ret))
+            continue
+        print(f'concurrency={concurrency:3d}  {ret["throughput_rps"]:8.1f} req/s  '
+              f'{ret["throughput_mbps"]:7.2f} MB/s  errors={ret["errors"]}')
+        for kind in ('pictures', 'tracks'):
+            print(f'    {kind:9s} p50={ret[f"{kind}_p50_ms"]:8.1f} ms  '
+                  f'p95={ret[f"{kind}_p95_ms"]:8.1f} ms')
+
+
+if __name__ == '__main__':
+    _main()
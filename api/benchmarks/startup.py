@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+'''
+Benchmark of the start up cost of the api: import time of modules and time to create the app, each
+measured in a fresh interpreter with `python -X importtime`. Reports the heaviest imports, such that
+modules slowing down worker boot can be spotted and loaded lazily instead.
+
+    python -m benchmarks.startup --repeat 5 --top 15
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# Statements run by each target, in a fresh interpreter.
+TARGETS = {
+    'import src.main': 'import src.main',
+    'create_app': 'from src.main import create_app; create_app()',
+    'import src.db.models': 'import src.db.models',
+}
+
+
+def _importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    '''
+    Parse the `-X importtime` report into (module, depth, cumulative microseconds). Depth 0 are the
+    modules imported by the statement itself.
+    '''
+    ret = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        ret.append((name.strip(), depth, int(cumulative)))
+    return ret
+
+
+def _run(statement: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    env = dict(os.environ)
+    env.setdefault('APP_MODE', 'development')
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=env,
+                          check=True, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, _importtime(proc.stderr)
+
+
+def _measure(statement: str, repeat: int, top: int) -> Dict[str, object]:
+    walls = []
+    imports: Dict[str, List[int]] = {}
+    totals = []
+    for _ in range(repeat):
+        wall, report = _run(statement)
+        walls.append(wall)
+        # Modules imported by the interpreter itself (`site`) are not part of the statement.
+        own = [x for x in report if x[1] == 0 and x[0] not in ('site', 'encodings')]
+        totals.append(sum(x[2] for x in own))
+        for name, depth, cumulative in report:
+            if depth <= 1:
+                imports.setdefault(name, []).append(cumulative)
+    heaviest = sorted(
+        ((name, statistics.median(values)) for name, values in imports.items()
+         if name not in ('site', 'encodings')),
+        key=lambda x: -x[1])
+    return {
+        'wall_ms': statistics.median(walls) * 1000,
+        'import_ms': statistics.median(totals) / 1000,
+        'heaviest': [{'module': name, 'ms': value / 1000} for name, value in heaviest[:top]],
+    }
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per target, median is kept.')
+    parser.add_argument('--top', type=int, default=10, help='Number of heaviest imports listed.')
+    parser.add_argument('--json', action='store_true', help='Print results as json lines.')
+    args = parser.parse_args()
+
+    for target in args.targets:
+        ret = {'target': target, **_measure(TARGETS[target], args.repeat, args.top)}
+        if args.json:
+            print(json.dumps(ret))
+            continue
+        print(f'{target:22s} wall={ret["wall_ms"]:8.1f} ms  imports={ret["import_ms"]:8.1f} ms')
+        for item in ret['heaviest']:
+            print(f'    {item["module"]:40s} {item["ms"]:8.1f} ms')
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+'''
+Benchmark suite of the api on synthetic data (see `benchmarks.synthetic`), run in process against
+the database the app is configured with. Hikes created by the suite are deleted at the end.
+
+Results are written as json, such that runs of different commits can be compared:
+
+    python -m benchmarks.suite --output before.json
+    git checkout my-branch
+    python -m benchmarks.suite --output after.json --compare before.json
+'''
+
+import argparse
+from datetime import datetime, timezone
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from benchmarks import synthetic
+from src.bp.pics import _generate_web_image
+from src.db.core import get_engine
+from src.db.models import ApiSession
+from src.importers import gpx
+from src.main import create_app
+
+BENCHMARKS = ('gpx_import_file', 'import_data', 'tracks_from_hike', 'tracks_from_hike_cached',
+              'picture_upload', 'picture_rendition')
+
+# Seconds to wait for the hikes of the suite to be deleted.
+_CLEANUP_TIMEOUT = 120
+
+
+def _summary(times: List[float]) -> Dict[str, float]:
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'max': max(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def _measure(func: Callable[[int], Any], repeat: int,
+             setup: Optional[Callable[[int], Any]] = None) -> List[float]:
+    ''' Seconds of `repeat` runs of `func`, each given the run index and the result of `setup`. '''
+    ret = []
+    for i in range(repeat):
+        arg = setup(i) if setup else i
+        start = time.perf_counter()
+        func(arg)
+        ret.append(time.perf_counter() - start)
+    return ret
+
+
+def _commit() -> Optional[str]:
+    try:
+        proc = subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.decode().strip()
+
+
+class Suite:
+    ''' Benchmarks sharing a test client, the generated data and the hikes to clean up. '''
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.client = create_app().test_client()
+        with Session(get_engine()) as session:
+            key = session.execute(
+                select(ApiSession.key)
+                .where(ApiSession.admin.is_(True))
+                .limit(1)
+            ).scalar_one()
+        self.headers = {'Api-Session': key}
+        self.gpx = synthetic.gpx_files(
+            args.files, args.tracks, args.segments, args.points, args.waypoints, seed=args.seed)
+        self.pictures = synthetic.jpeg_files(
+            args.pictures, args.width, args.height, seed=args.seed)
+        self.hikes: List[int] = []
+
+    def _check(self, resp, status: int = 200):
+        if resp.status_code != status:
+            raise RuntimeError(f'{resp.request.method} {resp.request.path}: {resp.status_code} '
+                               f'{resp.get_data(as_text=True)[:500]}')
+        return resp
+
+    def new_hike(self, index: int = 0) -> int:
+        ''' Create an empty hike for the suite. '''
+        resp = self._check(self.client.post(
+            '/hikes/new', json={'name': f'benchmark-{index}', 'zone': synthetic.ZONE},
+            headers=self.headers))
+        self.hikes.append(resp.json['id'])
+        return resp.json['id']
+
+    def import_data(self, hike_id: int) -> None:
+        ''' Import the generated GPX files into the hike. '''
+        files = {
+            f'synthetic-{i}.gpx': (io.BytesIO(x), f'synthetic-{i}.gpx')
+            for i, x in enumerate(self.gpx)
+        }
+        self._check(self.client.post(
+            f'/hikes/{hike_id}/data', data=files, headers=self.headers))
+
+    def upload_pictures(self, hike_id: int) -> List[int]:
+        ''' Upload the generated pictures to the hike. '''
+        files = {
+            f'synthetic-{i}.jpg': (io.BytesIO(x), f'synthetic-{i}.jpg')
+            for i, x in enumerate(self.pictures)
+        }
+        resp = self._check(self.client.post(
+            f'/pictures/hike/{hike_id}', data=files, headers=self.headers))
+        return [x['id'] for x in resp.json['created']]
+
+    def read_tracks(self, hike_id: int, query: str = '') -> None:
+        ''' Read the tracks of the hike with their points. '''
+        self._check(self.client.get(f'/tracks/hike/{hike_id}{query}')).get_data()
+
+    def cleanup(self) -> None:
+        ''' Delete the hikes of the suite and wait for their deletion to complete. '''
+        for hike_id in self.hikes:
+            self.client.delete(f'/hikes/{hike_id}', headers=self.headers)
+        stop = time.monotonic() + _CLEANUP_TIMEOUT
+        for hike_id in self.hikes:
+            while time.monotonic() < stop:
+                resp = self.client.get(f'/hikes/{hike_id}/deletion', headers=self.headers)
+                if resp.json['state'] == 'deleted':
+                    break
+                time.sleep(0.1)
+
+    def run(self, name: str) -> Dict[str, Any]:
+        ''' Run a benchmark, returning its timings or why it was skipped. '''
+        repeat = self.args.repeat
+        if name == 'gpx_import_file':
+            times = _measure(lambda _: [gpx.import_file(x) for x in self.gpx], repeat)
+        elif name == 'import_data':
+            times = _measure(self.import_data, repeat, setup=self.new_hike)
+        elif name in ('tracks_from_hike', 'tracks_from_hike_cached'):
+            hike_id = self.new_hike()
+            self.import_data(hike_id)
+            if name == 'tracks_from_hike':
+                # Responses are cached per query string, an unused argument makes every run miss.
+                times = _measure(lambda i: self.read_tracks(hike_id, f'?run={i}'), repeat)
+            else:
+                self.read_tracks(hike_id)
+                times = _measure(lambda _: self.read_tracks(hike_id), repeat)
+        elif name == 'picture_upload':
+            hike_id = self.new_hike()
+            self.import_data(hike_id)
+            times = _measure(lambda _: self.upload_pictures(hike_id), repeat)
+        elif name == 'picture_rendition':
+            if shutil.which('convert') is None:
+                return {'skipped': 'ImageMagick convert is not installed'}
+            hike_id = self.new_hike()
+            pic_ids = self.upload_pictures(hike_id)
+
+            def _renditions(_):
+                with Session(get_engine()) as session:
+                    for pic_id in pic_ids:
+                        _generate_web_image(session, pic_id, f'{pic_id}.jpg')
+                    # Rolled back, such that every run generates the renditions again.
+                    session.rollback()
+            times = _measure(_renditions, repeat)
+        else:
+            raise ValueError(f'Unknown benchmark "{name}"')
+        return {'seconds': _summary(times), 'runs': times}
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        ''' Sizes of the generated data and runs per benchmark. '''
+        keys = ('files', 'tracks', 'segments', 'points', 'waypoints', 'pictures', 'width',
+                'height', 'seed', 'repeat')
+        ret = {x: getattr(self.args, x) for x in keys}
+        ret['gpx_bytes'] = sum(map(len, self.gpx))
+        ret['picture_bytes'] = sum(map(len, self.pictures))
+        return ret
+
+
+def _compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f'Compared to {baseline["commit"] or "unknown commit"} ({baseline["time"]})')
+    for name, ret in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name, {})
+        if 'seconds' not in ret or 'seconds' not in base:
+            continue
+        before = base['seconds']['median']
+        after = ret['seconds']['median']
+        print(f'{name:26s} {before * 1000:10.1f} ms -> {after * 1000:10.1f} ms  '
+              f'{after / before:6.2f}x')
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--files', type=int, default=3, help='GPX files per import.')
+    parser.add_argument('--tracks', type=int, default=2, help='Tracks per GPX file.')
+    parser.add_argument('--segments', type=int, default=2, help='Segments per track.')
+    parser.add_argument('--points', type=int, default=2000, help='Points per segment.')
+    parser.add_argument('--waypoints', type=int, default=5, help='Waypoints per GPX file.')
+    parser.add_argument('--pictures', type=int, default=5, help='Pictures per upload.')
+    parser.add_argument('--width', type=int, default=2048, help='Width of the pictures.')
+    parser.add_argument('--height', type=int, default=1536, help='Height of the pictures.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated data.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark.')
+    parser.add_argument('--output', help='File to write the results to, stdout by default.')
+    parser.add_argument('--compare', help='Results of an earlier run to compare to.')
+    args = parser.parse_args()
+
+    suite = Suite(args)
+    results = {
+        'commit': _commit(),
+        'time': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': get_engine().dialect.name,
+        'parameters': suite.parameters,
+        'benchmarks': {},
+    }
+    try:
+        for name in args.only:
+            print(f'Running {name}...', file=sys.stderr)
+            results['benchmarks'][name] = suite.run(name)
+    finally:
+        suite.cleanup()
+
+    data = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(data + '\n')
+    else:
+        print(data)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            _compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    _main()
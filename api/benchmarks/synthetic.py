@@ -0,0 +1,105 @@
+'''
+Deterministic generators of benchmark data: GPX files of configurable size and JPEG pictures with
+an EXIF timestamp. The same arguments always produce the same bytes.
+'''
+
+from datetime import datetime, timedelta, timezone
+import io
+from typing import List
+
+import numpy as np
+import PIL.Image
+import pytz
+
+# Start of the generated tracks, on the trail of the sample hike in `data`.
+START_TIME = datetime(2022, 5, 7, 15, 0, tzinfo=timezone.utc)
+START_COORDS = (35.2506, -85.2386)
+ZONE = 'America/New_York'
+
+# Seconds between recorded points.
+POINT_INTERVAL = 5
+
+_EXIF_DATETIME = 0x0132
+
+
+def _walk(rng: np.random.Generator, count: int, start: float, scale: float) -> np.ndarray:
+    return start + np.cumsum(rng.normal(0.0, scale, count))
+
+
+def gpx_file(tracks: int = 1, segments: int = 1, points: int = 1000, waypoints: int = 0,
+             seed: int = 0, start: datetime = START_TIME) -> bytes:
+    '''
+    GPX file of `tracks` tracks of `segments` segments of `points` points each, plus `waypoints`
+    waypoints along the tracks. Points follow a random walk recorded every `POINT_INTERVAL`
+    seconds, different seeds give different walks.
+    '''
+    rng = np.random.default_rng(seed)
+    lat, lon = START_COORDS
+    ele = 400.0
+    time = start
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+        '<gpx version="1.1" creator="benchmarks" xmlns="http://www.topografix.com/GPX/1/1">',
+    ]
+    stops = []
+    for i in range(tracks):
+        lines.append(f'<trk><name><![CDATA[Synthetic {seed}-{i}]]></name><desc></desc>')
+        for _ in range(segments):
+            lats = _walk(rng, points, lat, 1e-4)
+            lons = _walk(rng, points, lon, 1e-4)
+            eles = _walk(rng, points, ele, 0.5)
+            lines.append('<trkseg>')
+            for lat, lon, ele in zip(lats, lons, eles):
+                lines.append(
+                    f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}"><ele>{ele:.1f}</ele>'
+                    f'<time>{time:%Y-%m-%dT%H:%M:%SZ}</time></trkpt>')
+                time += timedelta(seconds=POINT_INTERVAL)
+            lines.append('</trkseg>')
+            stops.append((lat, lon, ele, time))
+            # Pause between segments, as when the recording is stopped for a break.
+            time += timedelta(minutes=30)
+        lines.append('</trk>')
+    for i in range(waypoints):
+        lat, lon, ele, time = stops[i % len(stops)] if stops else (*START_COORDS, 400.0, start)
+        lines.append(
+            f'<wpt lat="{lat:.6f}" lon="{lon:.6f}"><ele>{ele:.1f}</ele>'
+            f'<time>{time:%Y-%m-%dT%H:%M:%SZ}</time>'
+            f'<name><![CDATA[Waypoint {seed}-{i}]]></name><desc>Synthetic waypoint</desc></wpt>')
+    lines.append('</gpx>')
+    return '\n'.join(lines).encode()
+
+
+def gpx_files(count: int, tracks: int = 1, segments: int = 1, points: int = 1000,
+              waypoints: int = 0, seed: int = 0) -> List[bytes]:
+    ''' GPX files of consecutive days, see `gpx_file`. '''
+    return [
+        gpx_file(tracks, segments, points, waypoints, seed=seed + i,
+                 start=START_TIME + timedelta(days=i))
+        for i in range(count)
+    ]
+
+
+def jpeg_file(width: int = 2048, height: int = 1536, time: datetime = START_TIME,
+              seed: int = 0, quality: int = 90, zone: str = ZONE) -> bytes:
+    '''
+    JPEG picture taken at `time`, stored in the EXIF `DateTime` as local time of `zone` without
+    the zone, like cameras do. The content is a gradient with noise, such that its size is close
+    to that of a photo.
+    '''
+    rng = np.random.default_rng(seed)
+    y_, x_ = np.mgrid[0:height, 0:width]
+    base = np.stack([x_ * 255 / width, y_ * 255 / height, (x_ + y_) * 127 / (width + height)], -1)
+    pixels = np.clip(base + rng.normal(0.0, 24.0, base.shape), 0, 255).astype(np.uint8)
+    exif = PIL.Image.Exif()
+    exif[_EXIF_DATETIME] = f'{time.astimezone(pytz.timezone(zone)):%Y:%m:%d %H:%M:%S}'
+    ret = io.BytesIO()
+    PIL.Image.fromarray(pixels, 'RGB').save(ret, 'JPEG', quality=quality, exif=exif.tobytes())
+    return ret.getvalue()
+
+
+def jpeg_files(count: int, width: int = 2048, height: int = 1536, seed: int = 0) -> List[bytes]:
+    ''' Pictures taken every 10 minutes along the generated tracks, see `jpeg_file`. '''
+    return [
+        jpeg_file(width, height, START_TIME + timedelta(minutes=10 * i), seed=seed + i)
+        for i in range(count)
+    ]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+'''
+Benchmark of reading track point timestamps from the configured database: naive timestamps made
+aware in Python per row (as before timestamps were stored with their time zone) against the
+`AwareDateTime` type of the dialect, which leaves the work to the driver where it can. Reads are
+timed as one statement returning every row and as many single row statements, the latter mostly
+measuring statement compilation, which was not cached for the former type.
+
+    python -m benchmarks.timestamps --rows 100000 --statements 2000
+
+The rows are written to a temporary table, dropped at the end. See `benchmarks.suite` for the cost
+of whole track reads.
+'''
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, TypeDecorator, insert, select
+
+from src.common import to_datetime
+from src.db.core import get_engine
+from src.db.custom import AwareDateTime
+
+
+class NaiveDateTime(TypeDecorator):
+    ''' The former `AwareDateTime`: naive timestamps made aware in Python on every read. '''
+    impl = DateTime
+    # Unset before, which disabled caching of the compiled statements using the type.
+    cache_ok = False
+
+    def process_result_value(self, value, dialect):
+        if value:
+            return to_datetime(value)
+        return value
+
+
+def _times(func, repeat: int) -> List[float]:
+    ret = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        ret.append(time.perf_counter() - start)
+    return ret
+
+
+def _run(rows: int, statements: int, repeat: int) -> Dict[str, object]:
+    engine = get_engine()
+    table = Table(
+        'benchmark_timestamps', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('naive', NaiveDateTime),
+        Column('aware', AwareDateTime),
+    )
+    start = datetime(2022, 5, 7, 15, 0, tzinfo=timezone.utc)
+    values = [
+        {'naive': (start + timedelta(seconds=5 * i)).replace(tzinfo=None),
+         'aware': start + timedelta(seconds=5 * i)}
+        for i in range(rows)
+    ]
+    table.create(engine)
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(table), values)
+
+        def _read(column):
+            with engine.connect() as conn:
+                ret = conn.execute(select(column)).scalars().all()
+            assert len(ret) == rows and ret[0].tzinfo is not None
+
+        def _read_each(column):
+            with engine.connect() as conn:
+                for i in range(1, statements + 1):
+                    conn.execute(select(column).where(table.c.id == i)).scalar_one()
+        times = {
+            'rows': (_times(lambda: _read(table.c.naive), repeat),
+                     _times(lambda: _read(table.c.aware), repeat)),
+            'statements': (_times(lambda: _read_each(table.c.naive), repeat),
+                           _times(lambda: _read_each(table.c.aware), repeat)),
+        }
+    finally:
+        table.drop(engine)
+    ret: Dict[str, object] = {'database': engine.dialect.name, 'rows': rows,
+                              'statements': statements}
+    for name, (before, after) in times.items():
+        ret[name] = {
+            'before_ms': min(before) * 1000,
+            'after_ms': min(after) * 1000,
+            'before_median_ms': statistics.median(before) * 1000,
+            'after_median_ms': statistics.median(after) * 1000,
+            'speedup': min(before) / min(after),
+        }
+    return ret
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Timestamps read per run.')
+    parser.add_argument('--statements', type=int, default=2000,
+                        help='Single row statements per run, at most `rows`.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per type, best is kept.')
+    parser.add_argument('--json', action='store_true', help='Print results as json.')
+    args = parser.parse_args()
+
+    ret = _run(args.rows, min(args.statements, args.rows), args.repeat)
+    if args.json:
+        print(json.dumps(ret))
+        return
+    print(f'{ret["database"]}: {ret["rows"]} rows at once, '
+          f'{ret["statements"]} single row statements')
+    for name in ('rows', 'statements'):
+        item = ret[name]
+        print(f'{name:10s} before={item["before_ms"]:8.1f} ms  after={item["after_ms"]:8.1f} ms  '
+              f'speedup={item["speedup"]:5.2f}')
+
+
+if __name__ == '__main__':
+    _main()
@@ -1,17 +1,25 @@
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import itertools
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import flask
-from flask_expects_json import expects_json
-from sqlalchemy import delete, select
+import numpy as np
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.orm import Session
-
-from src.common import GLOBALS, strict_schema, to_datetime
-from src.db.core import engine
-from src.db.models import Hike, Track, TrackData, TrackSegment, Waypoint
-from src.importers import gpx
+import werkzeug.exceptions
+
+from src import deletion, geo, metrics
+from src.common import GLOBALS, expects_json, strict_schema, to_datetime
+from src.db import trackpack
+from src.db.core import get_engine
+from src.db.models import GpxImport, Hike, Picture, Track, TrackData, TrackSegment, Waypoint
+from src.db.points import SegmentArrays, hike_segments, iter_points_by_segment, segment_ids
+from src.db.revision import bump_revision
+from src.geotag import geotag_hike
+from src.importers import gpx, parallel
 from src.middleware import auth_as_admin
+from src.response_cache import cached_per_hike
 
 bp_hikes = flask.Blueprint('hikes', __name__, url_prefix='/hikes')
 
@@ -33,6 +41,10 @@ NEW_HIKE_SCHEMA = {
     'required': ['name'],
 }
 
+# Meters the simplified tracks of the hike page may deviate from the recorded ones.
+PAGE_TOLERANCE_DEFAULT = 2.0
+PAGE_TOLERANCE_MAX = 1000.0
+
 UPDATE_HIKE_SCHEMA = {
     'type': 'object',
     'properties': {
@@ -50,7 +62,8 @@ UPDATE_HIKE_SCHEMA = {
 
 ####################################################################################################
 
-def _gpx_wp_to_db(session: Session, hike_id: int, item: gpx.GpxWaypoint) -> Waypoint:
+def _gpx_wp_to_db(session: Session, hike_id: int, item: gpx.GpxWaypoint, source: str,
+                  fingerprint: str) -> Waypoint:
     GLOBALS.logger.debug('Waypoint: %s', item)
     wpt = Waypoint(
         parent=hike_id,
@@ -60,62 +73,213 @@ def _gpx_wp_to_db(session: Session, hike_id: int, item: gpx.GpxWaypoint) -> Wayp
         latitude=item.coords[0],
         longitude=item.coords[1],
         elevation=item.coords[2],
+        source=source,
+        fingerprint=fingerprint,
     )
     session.add(wpt)
     session.flush()
     return wpt
 
 
-RetTrack1 = Tuple[Track, List[TrackSegment], List[TrackData]]
-RetTrack2 = Tuple[TrackSegment, List[TrackData]]
+def _timestamp(value: float) -> Optional[datetime]:
+    return None if np.isnan(value) else datetime.fromtimestamp(value, timezone.utc)
+
+
+def _nullable(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def _to_nan(value: Optional[float]) -> float:
+    return np.nan if value is None else value
 
 
 def _gpx_track_segment_to_db(session: Session, track_id: int,
-                             item: gpx.GpxTrackSegment) -> RetTrack2:
-    GLOBALS.logger.debug('Track Segment: %s', item)
+                             item: parallel.ParsedSegment) -> TrackSegment:
+    GLOBALS.logger.debug('Track Segment: %d points', len(item))
     track_seg = TrackSegment(
         parent=track_id,
     )
+    packed = trackpack.storage_mode() == 'packed'
+    if packed:
+        points = trackpack.PackedPoints(*item)
+        track_seg.points = trackpack.pack(points)
+        bbox = trackpack.bounds(points)
+        if bbox is not None:
+            (track_seg.min_latitude, track_seg.max_latitude,
+             track_seg.min_longitude, track_seg.max_longitude) = bbox
     session.add(track_seg)
     session.flush()
     track_seg_id = track_seg.id
     assert isinstance(track_seg_id, int)
 
-    data = []
-    for point in item:
-        # GLOBALS.logger.debug('Track Point: %s', point)
-        ret_point = TrackData(
-            segment=track_seg_id,
-            time=point.time,
-            latitude=point.coords[0],
-            longitude=point.coords[1],
-            elevation=point.coords[2],
-        )
-        data.append(ret_point)
-    session.add_all(data)
-    session.flush()
+    if not packed and len(item):
+        data = map(lambda x: {
+            'segment': track_seg_id,
+            'time': _timestamp(x[0]),
+            'latitude': _nullable(x[1]),
+            'longitude': _nullable(x[2]),
+            'elevation': _nullable(x[3]),
+        }, zip(item.time, item.latitude, item.longitude, item.elevation))
+        session.execute(insert(TrackData), list(data))
 
-    return track_seg, data
+    return track_seg
 
 
-def _gpx_track_to_db(session: Session, hike_id: int, item: gpx.GpxTrack) -> RetTrack1:
-    GLOBALS.logger.debug('Track: %s', item)
+def _gpx_track_to_db(session: Session, hike_id: int, item: parallel.ParsedTrack,
+                     source: str) -> Tuple[Track, List[TrackSegment]]:
+    GLOBALS.logger.debug('Track: %s', item.name)
     track = Track(
         parent=hike_id,
         name=item.name,
         description=item.description,
+        source=source,
+        fingerprint=item.fingerprint,
     )
     session.add(track)
     session.flush()
-    segments = []
-    data = []
-    for seg in item:
-        track_id = track.id
-        assert isinstance(track_id, int)
-        ret_seg, ret_data = _gpx_track_segment_to_db(session, track_id, seg)
-        segments.append(ret_seg)
-        data.extend(ret_data)
-    return track, segments, data
+    track_id = track.id
+    assert isinstance(track_id, int)
+    segments = list(map(lambda x: _gpx_track_segment_to_db(session, track_id, x), item.segments))
+    return track, segments
+
+
+def _stored_summaries(session: Session, track_ids: List[int]) -> Dict[int, List[np.ndarray]]:
+    ''' Summaries (see `parallel.summarize`) of the non empty segments of tracks as stored. '''
+    seg_ids = segment_ids(session, sorted(track_ids))
+    track_of = {y: x for x, segs in seg_ids.items() for y in segs}
+    ret: Dict[int, List[np.ndarray]] = {x: [] for x in track_ids}
+    segments = iter_points_by_segment(session, list(itertools.chain.from_iterable(
+        seg_ids.values())))
+    for seg_id, points in segments:
+        points = list(points)
+        if not points:
+            continue
+        time = [x['time'].timestamp() if x['time'] is not None else np.nan for x in points]
+        channels = [np.array(time)] + [
+            np.array([_to_nan(x[key]) for x in points]) for key in
+            ('latitude', 'longitude', 'elevation')
+        ]
+        ret[track_of[seg_id]].append(parallel.summarize(channels))
+    return ret
+
+
+def _same_track(row, summaries: List[np.ndarray], item: parallel.ParsedTrack) -> bool:
+    ''' Whether a track stored without fingerprint has the content of a parsed track. '''
+    if (row.name, row.description) != (item.name, item.description):
+        return False
+    recorded = [x for x in item.summaries if x[0] > 0]
+    return len(recorded) == len(summaries) and all(map(parallel.same_summary, summaries, recorded))
+
+
+def _same_waypoint(row, item: gpx.GpxWaypoint) -> bool:
+    ''' Whether a waypoint stored without fingerprint is the parsed one. '''
+    if (row.name, row.description) != (item.name, item.description):
+        return False
+    if (row.time is None) != (item.time is None):
+        return False
+    tolerance = parallel.SUMMARY_TOLERANCE
+    if row.time is not None and abs((row.time - item.time).total_seconds()) > tolerance[0]:
+        return False
+    for stored, value, tol in zip((row.latitude, row.longitude, row.elevation), item.coords,
+                                  tolerance[1:]):
+        if (stored is None) != (value is None):
+            return False
+        if stored is not None and abs(stored - value) > tol:
+            return False
+    return True
+
+
+def _gpx_file_to_db(session: Session, hike_id: int, source: str,
+                    items: List[parallel.ParsedItem], counts: Dict[str, int]) -> List[int]:
+    '''
+    Add the tracks and waypoints of an imported file which the hike does not have yet. Those
+    previously imported from a file of the same name but missing from it now are removed, tracks
+    are marked for deletion and their ids returned.
+
+    Tracks and waypoints imported before they were fingerprinted are compared by content instead,
+    and given the fingerprint and source of the file matching them.
+    '''
+    tracks = session.execute(
+        select(Track.id, Track.source, Track.fingerprint, Track.name, Track.description)
+        .where(Track.parent == hike_id)
+        .where(Track.deleting.is_(False))
+    ).all()
+    wpts = session.execute(
+        select(Waypoint.id, Waypoint.source, Waypoint.fingerprint, Waypoint.name,
+               Waypoint.description, Waypoint.time, Waypoint.latitude, Waypoint.longitude,
+               Waypoint.elevation)
+        .where(Waypoint.parent == hike_id)
+    ).all()
+    track_fps = set(map(lambda x: x[2], tracks))
+    wpt_fps = set(map(lambda x: x[2], wpts))
+    legacy_tracks = {x.id: x for x in tracks if x.fingerprint is None}
+    legacy_wpts = {x.id: x for x in wpts if x.fingerprint is None}
+    summaries: Optional[Dict[int, List[np.ndarray]]] = None
+    seen = set()
+    for item in items:
+        if isinstance(item, gpx.GpxWaypoint):
+            fingerprint = parallel.waypoint_fingerprint(item)
+            seen.add(fingerprint)
+            if fingerprint in wpt_fps:
+                counts['wpts_unchanged'] += 1
+                continue
+            match = next((x for x, y in legacy_wpts.items() if _same_waypoint(y, item)), None)
+            if match is not None:
+                del legacy_wpts[match]
+                session.execute(
+                    update(Waypoint)
+                    .where(Waypoint.id == match)
+                    .values(source=source, fingerprint=fingerprint)
+                    .execution_options(synchronize_session=False)
+                )
+                wpt_fps.add(fingerprint)
+                counts['wpts_unchanged'] += 1
+                continue
+            _gpx_wp_to_db(session, hike_id, item, source, fingerprint)
+            wpt_fps.add(fingerprint)
+            counts['wpts'] += 1
+        else:
+            seen.add(item.fingerprint)
+            if item.fingerprint in track_fps:
+                counts['tracks_unchanged'] += 1
+                continue
+            if legacy_tracks and summaries is None:
+                # Read once per file, only for hikes with tracks imported before fingerprints.
+                summaries = _stored_summaries(session, list(legacy_tracks))
+            match = next((x for x, y in legacy_tracks.items()
+                          if _same_track(y, summaries[x], item)), None)
+            if match is not None:
+                del legacy_tracks[match]
+                session.execute(
+                    update(Track)
+                    .where(Track.id == match)
+                    .values(source=source, fingerprint=item.fingerprint)
+                    .execution_options(synchronize_session=False)
+                )
+                track_fps.add(item.fingerprint)
+                counts['tracks_unchanged'] += 1
+                continue
+            _, segs = _gpx_track_to_db(session, hike_id, item, source)
+            track_fps.add(item.fingerprint)
+            counts['tracks'] += 1
+            counts['segments'] += len(segs)
+            counts['points'] += sum(map(len, item.segments))
+            counts['points_dropped'] += item.dropped
+
+    stale_wpts = [x[0] for x in wpts if x[1] == source and x[2] not in seen]
+    if stale_wpts:
+        session.execute(delete(Waypoint).where(Waypoint.id.in_(stale_wpts)))
+    stale_tracks = [x[0] for x in tracks if x[1] == source and x[2] not in seen]
+    if stale_tracks:
+        session.execute(
+            update(Track)
+            .where(Track.id.in_(stale_tracks))
+            .values(deleting=True)
+            .execution_options(synchronize_session=False)
+        )
+    counts['wpts_removed'] += len(stale_wpts)
+    counts['tracks_removed'] += len(stale_tracks)
+    return stale_tracks
 
 
 ####################################################################################################
@@ -124,9 +288,10 @@ def _gpx_track_to_db(session: Session, hike_id: int, item: gpx.GpxTrack) -> RetT
 @bp_hikes.get('/')
 def list_hikes():
     ''' List uploaded hikes. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         hikes = session.execute(
             select(Hike)
+            .where(Hike.deleting.is_(False))
         ).scalars()
         hikes = list(map(lambda x: x.json, map(flask.jsonify, hikes)))
     return {'data': hikes}
@@ -139,42 +304,27 @@ def list_hikes_():
 
 
 @bp_hikes.get('/<int:hike_id>')
+@cached_per_hike
 def one_hike(hike_id: int):
     ''' Manage a hike instance. '''
     GLOBALS.logger.debug('Hike Id: %d', hike_id)
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         hike = session.execute(
             select(Hike)
             .where(Hike.id == hike_id)
         ).scalar_one()
         if flask.request.args.get('includeTrack', 'false') == 'true':
-            tracks = session.execute(
-                select(Track)
+            track_ids = session.execute(
+                select(Track.id)
                 .where(Track.parent == hike_id)
+                .where(Track.deleting.is_(False))
+                .order_by(Track.id)
             ).scalars()
-            tracks = list(tracks)
-            track_ids = list(map(lambda x: x.id, tracks))
-
-            def _get_segments(track_id: int):
-                segments = session.execute(
-                    select(TrackSegment)
-                    .where(TrackSegment.parent == track_id)
-                ).scalars()
-                segments = map(lambda x: x.id, segments)
-                return list(segments)
-            seg_ids = map(_get_segments, track_ids)
-            seg_ids = itertools.chain.from_iterable(seg_ids)
-            seg_ids = list(seg_ids)
-
-            def _get_track_data(seg_id: int):
-                data = session.execute(
-                    select(TrackData)
-                    .where(TrackData.segment == seg_id)
-                ).scalars()
-                return list(map(lambda x: x.serialized, data))
-
-            trackdata = map(_get_track_data, seg_ids)
-            trackdata = list(trackdata)
+            seg_ids = segment_ids(session, list(track_ids)).values()
+            seg_ids = list(itertools.chain.from_iterable(seg_ids))
+
+            trackdata = iter_points_by_segment(session, seg_ids)
+            trackdata = list(map(lambda x: list(x[1]), trackdata))
 
             waypointdata = session.execute(
                 select(Waypoint)
@@ -191,10 +341,70 @@ def one_hike(hike_id: int):
         return flask.jsonify(hike)
 
 
+def _simplified_points(seg: SegmentArrays, tolerance: float) -> List[Dict[str, Any]]:
+    valid = ~(np.isnan(seg.latitude) | np.isnan(seg.longitude))
+    index = np.flatnonzero(valid)
+    index = index[geo.simplify(seg.latitude[valid], seg.longitude[valid], tolerance)]
+    return [
+        {
+            'time': _timestamp(seg.time[i]),
+            'latitude': float(seg.latitude[i]),
+            'longitude': float(seg.longitude[i]),
+            'elevation': _nullable(seg.elevation[i]),
+        }
+        for i in index
+    ]
+
+
+@bp_hikes.get('/<int:hike_id>/page')
+@cached_per_hike
+def hike_page(hike_id: int):
+    '''
+    Everything the hike page shows in a single response: the hike, its tracks with points
+    simplified to within `tolerance` meters, its waypoints and its pictures. Read with a fixed
+    number of statements, whatever the number of tracks.
+    '''
+    tolerance = flask.request.args.get('tolerance', PAGE_TOLERANCE_DEFAULT, type=float)
+    if not 0 <= tolerance <= PAGE_TOLERANCE_MAX:
+        raise werkzeug.exceptions.BadRequest(
+            f'Tolerance must be between 0 and {PAGE_TOLERANCE_MAX} meters')
+    with Session(get_engine()) as session:
+        hike = session.execute(
+            select(Hike)
+            .where(Hike.id == hike_id)
+        ).scalar_one()
+        tracks = session.execute(
+            select(Track)
+            .where(Track.parent == hike_id)
+            .where(Track.deleting.is_(False))
+            .order_by(Track.id)
+        ).scalars()
+        tracks = {x.id: {**x.serialized, 'segments': []} for x in tracks}
+        for seg in hike_segments(session, hike_id):
+            tracks[seg.track]['segments'].append(_simplified_points(seg, tolerance))
+        waypoints = session.execute(
+            select(Waypoint)
+            .where(Waypoint.parent == hike_id)
+            .order_by(Waypoint.time)
+        ).scalars()
+        pictures = session.execute(
+            select(Picture)
+            .where(Picture.parent == hike_id)
+            .order_by(Picture.time)
+        ).scalars()
+        return flask.jsonify({
+            'hike': hike,
+            'tracks': list(tracks.values()),
+            'waypoints': list(waypoints),
+            'pictures': list(pictures),
+        })
+
+
 @bp_hikes.get('/<int:hike_id>/waypoints')
+@cached_per_hike
 def get_hike_waypoints(hike_id: int):
     ''' Get waypoints associated with the hike. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         wpts = session.execute(
             select(Waypoint)
             .where(Waypoint.parent == hike_id)
@@ -219,7 +429,7 @@ def new_hike():
             value = to_datetime(value, flask.g.data.get('zone'))
         return key, value
 
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         data = dict(map(_conv, flask.g.data.items()))
         hike = Hike(**data)
         session.add(hike)
@@ -233,15 +443,29 @@ def new_hike():
 
 @bp_hikes_admin.delete('/<int:hike_id>')
 def hike_delete_one(hike_id: int):
-    ''' Manage a hike instance. '''
+    '''
+    Hide a hike immediately and delete its data in batches in the background. Progress is reported
+    by `/hikes/<hike_id>/deletion`.
+    '''
     GLOBALS.logger.debug('Hike Id: %d', hike_id)
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         session.execute(
-            delete(Hike)
+            update(Hike)
             .where(Hike.id == hike_id)
+            .values(deleting=True)
+            .execution_options(synchronize_session=False)
         )
+        bump_revision(session, hike_id)
         session.commit()
-        return {'status': 'OK'}
+    deletion.start('hike', hike_id)
+    return {'status': 'OK'}
+
+
+@bp_hikes_admin.get('/<int:hike_id>/deletion')
+def hike_deletion_status(hike_id: int):
+    ''' Report the progress of deleting a hike. '''
+    with Session(get_engine()) as session:
+        return deletion.status(session, 'hike', hike_id)
 
 
 @bp_hikes_admin.post('/<int:hike_id>')
@@ -252,7 +476,7 @@ def hike_update_one(hike_id: int):
     GLOBALS.logger.debug('Hike Id: %d', hike_id)
     GLOBALS.logger.debug('Update payload: %d', flask.request.json)
     assert flask.request.json is not None
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         ret = session.execute(
             select(Hike)
             .where(Hike.id == hike_id)
@@ -261,13 +485,19 @@ def hike_update_one(hike_id: int):
             if key in ('start', 'end'):
                 value = to_datetime(value, flask.g.data.get('zone'))
             setattr(ret, key, value)
+        bump_revision(session, hike_id)
         session.commit()
         return {'status': 'OK'}
 
 
 @bp_hikes_admin.post('/<int:hike_id>/data')
 def import_data(hike_id: int):
-    with Session(engine) as session:
+    '''
+    Import GPX files into a hike. Files are recorded by name with the hash of their content, so
+    uploading a file again is a no-op when unchanged and otherwise only replaces the tracks and
+    waypoints which differ.
+    '''
+    with Session(get_engine()) as session:
         hike = session.execute(
             select(Hike)
             .where(Hike.id == hike_id)
@@ -281,23 +511,52 @@ def import_data(hike_id: int):
             'tracks': 0,
             'segments': 0,
             'points': 0,
+            'points_dropped': 0,
+            'files_unchanged': 0,
+            'wpts_unchanged': 0,
+            'tracks_unchanged': 0,
+            'wpts_removed': 0,
+            'tracks_removed': 0,
+            'geotagged': 0,
         }
-        for file in files:
-            data = gpx.import_file(flask.request.files[file].stream.read())
-            for item in data:
-                if isinstance(item, gpx.GpxWaypoint):
-                    _gpx_wp_to_db(session, hike_id, item)
-                    counts['wpts'] += 1
-                elif isinstance(item, gpx.GpxTrack):
-                    _, segs, data = _gpx_track_to_db(session, hike_id, item)
-                    counts['tracks'] += 1
-                    counts['segments'] += len(segs)
-                    counts['points'] += len(data)
-                else:
-                    GLOBALS.logger.warning('Unhandled GpxType: %s', type(item))
+        imports = session.execute(
+            select(GpxImport)
+            .where(GpxImport.parent == hike_id)
+        ).scalars()
+        imports = {x.name: x for x in imports}
+        known = set(map(lambda x: x.sha, imports.values()))
+        uploads = []
+        for name in files:
+            data = flask.request.files[name].stream.read()
+            sha = hashlib.sha256(data).hexdigest()
+            if sha in known:
+                counts['files_unchanged'] += 1
+                continue
+            known.add(sha)
+            uploads.append((name, sha, data))
+
+        # Files are parsed in parallel and written in upload order within this transaction.
+        parsed = parallel.parse_files([x[2] for x in uploads])
+        stale = []
+        for (name, sha, _), items in zip(uploads, parsed):
+            stale.extend(_gpx_file_to_db(session, hike_id, name, items, counts))
+            record = imports.get(name)
+            if record is None:
+                record = GpxImport(parent=hike_id, name=name)
+                session.add(record)
+            record.sha = sha
+            record.time = datetime.now(timezone.utc)
+        changed = ('wpts', 'tracks', 'wpts_removed', 'tracks_removed')
+        if any(map(lambda x: counts[x], changed)):
+            session.flush()
+            counts['geotagged'] = geotag_hike(session, hike_id)
+            bump_revision(session, hike_id)
         session.commit()
         hike = flask.jsonify(hike).json
         GLOBALS.logger.warning('serialized hike: %s', hike)
+    metrics.GPX_POINTS.inc(counts['points'])
+    for track_id in stale:
+        deletion.start('track', track_id)
     return {'status': 'OK', 'items_added': counts, 'hike': hike}
 
 
@@ -1,23 +1,35 @@
 import functools
+import mimetypes
 import operator
 from pathlib import Path
 import subprocess
 import tempfile
+import time
 import hashlib
 
 import flask
 from sqlalchemy.sql.functions import count
 import werkzeug.exceptions
-from flask_expects_json import expects_json
 import pytz
 import pytz.exceptions
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
-from src.common import GLOBALS, picture_format, picture_timestamp, strict_schema, to_datetime
-from src.db.core import engine
+from src import instrumentation, metrics, streaming
+from src.cache import RESPONSE_CACHE
+from src.clusters import cluster_levels, hike_markers
+from src.common import (
+    GLOBALS, expects_json, picture_format, picture_timestamp, strict_schema, to_datetime,
+)
+from src.compression import precompressed
+from src.db.bulk import bulk_update
+from src.db.core import get_engine
 from src.db.models import Hike, Picture, PictureData
+from src.db.revision import bump_revision, hike_revisions
+from src.geotag import geotag_hike
 from src.middleware import auth_as_admin
+from src.response_cache import cached_per_hike
+from src.tiles.geometry import MAX_ZOOM
 
 bp_pics = flask.Blueprint('pics', __name__, url_prefix='/pictures')
 
@@ -39,6 +51,8 @@ UPDATE_PIC_TIMEZONE_SCHEMA = {
     'type': 'object',
     'properties': {
         'zone': {'type': 'string'},
+        'hike': {'type': 'boolean'},
+        'exif': {'type': 'boolean'},
     },
     'required': [],
 }
@@ -55,18 +69,19 @@ def _generate_web_image(session, pic_id, name):
             .where(PictureData.resized == 'original')
         ).one()
         srcfile.write_bytes(orig[0])
-        subprocess.run(
-            [
-                'convert',
-                f'{srcfile}',
-                '-density', '72',
-                '-resize', '1200x1200',
-                f'{destfile}',
-            ],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        with instrumentation.timed('magick'):
+            subprocess.run(
+                [
+                    'convert',
+                    f'{srcfile}',
+                    '-density', '72',
+                    '-resize', '1200x1200',
+                    f'{destfile}',
+                ],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
         orig = destfile.read_bytes()
         data = PictureData(
             parent=pic_id,
@@ -85,15 +100,18 @@ def _generate_web_image(session, pic_id, name):
 @bp_pics.get('')
 def list_pics():
     ''' Return list of pictures. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         if flask.request.method == 'GET':
+            visible = select(Hike.id).where(Hike.deleting.is_(False))
             count = session.execute(
                 select(func.count(Picture.id))
+                .where(Picture.parent.in_(visible))
             ).one()
             GLOBALS.logger.debug('Count res: %s', count)
             count = count[0]
             data = session.execute(
                 select(Picture)
+                .where(Picture.parent.in_(visible))
             ).scalars()
             data = list(map(lambda x: x.json, map(flask.jsonify, data)))
             return {'metadata': {'total': count}, 'data': data}
@@ -109,12 +127,16 @@ def list_pics_():
 @bp_pics.get('/<int:pic_id>')
 def get_pic(pic_id: int):
     ''' Return list of tracks. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         if flask.request.method == 'GET':
             pic = session.execute(
                 select(Picture)
+                .join(Hike, Hike.id == Picture.parent)
                 .where(Picture.id == pic_id)
-            ).scalar_one()
+                .where(Hike.deleting.is_(False))
+            ).scalar_one_or_none()
+            if pic is None:
+                raise werkzeug.exceptions.NotFound(f'Picture {pic_id} does not exist')
             return flask.jsonify(pic)
         raise ValueError(f'Unhandled request method type "{flask.request.method}"')
 
@@ -122,24 +144,35 @@ def get_pic(pic_id: int):
 @bp_pics.get('/<int:pic_id>.<fmt>')
 def get_pic_data(pic_id: int, fmt: str):
     ''' Return list of tracks. '''
-    with Session(engine) as session:
+    visible = (
+        select(Picture.id)
+        .join(Hike, Hike.id == Picture.parent)
+        .where(Picture.id == pic_id)
+        .where(Hike.deleting.is_(False))
+    )
+    with Session(get_engine()) as session:
         pic = session.execute(
             select(PictureData.data)
-            .where(PictureData.parent == pic_id)
+            .where(PictureData.parent.in_(visible))
             .where(PictureData.resized == 'web')
         ).one_or_none()
         if pic is None:
             pic = session.execute(
                 select(PictureData.data)
-                .where(PictureData.parent == pic_id)
+                .where(PictureData.parent.in_(visible))
                 .where(PictureData.resized == 'original')
-            ).one()
-        return pic[0]
+            ).one_or_none()
+        if pic is None:
+            raise werkzeug.exceptions.NotFound(f'Picture {pic_id} does not exist')
+        mimetype, _ = mimetypes.guess_type(f'{pic_id}.{fmt}')
+        metrics.PICTURE_BYTES.inc(len(pic[0]))
+        return flask.Response(pic[0], mimetype=mimetype or 'application/octet-stream')
 
 @bp_pics.get('/hike/<int:hike_id>')
+@cached_per_hike
 def get_pics_for_hike(hike_id: int):
     ''' Get info on the pictures related to a hike. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         pics = session.execute(
             select(Picture)
             .where(Picture.parent == hike_id)
@@ -148,6 +181,34 @@ def get_pics_for_hike(hike_id: int):
         pics = list(map(lambda x: x.json, map(flask.jsonify, pics)))
         return {"data": pics}
 
+
+@bp_pics.get('/hike/<int:hike_id>/clusters')
+def get_clusters_for_hike(hike_id: int):
+    '''
+    Clusters of the hike's geolocated pictures at zoom level `zoom`, along with its waypoints with
+    `waypoints=true`. The clusters of all zoom levels are built at once, once per hike revision.
+    '''
+    zoom = flask.request.args.get('zoom', type=int)
+    if zoom is None or not 0 <= zoom <= MAX_ZOOM:
+        raise werkzeug.exceptions.BadRequest(f'Zoom must be between 0 and {MAX_ZOOM}')
+    waypoints = flask.request.args.get('waypoints', 'false') == 'true'
+    with Session(get_engine()) as session:
+        revision = hike_revisions(session, [hike_id]).get(hike_id)
+        if revision is None:
+            raise werkzeug.exceptions.NotFound(f'Hike {hike_id} does not exist')
+        scope = 'markers' if waypoints else 'pictures'
+        key = f'clusters/hike-{hike_id}/{revision}/{scope}'
+
+        def _build() -> bytes:
+            levels = cluster_levels(hike_markers(session, hike_id, waypoints))
+            for level, clusters in levels.items():
+                if level != zoom:
+                    body = streaming.dumps({'zoom': level, 'data': clusters}).encode()
+                    RESPONSE_CACHE.set(f'{key}/{level}', body)
+            return streaming.dumps({'zoom': zoom, 'data': levels[zoom]}).encode()
+
+        return precompressed(f'{key}/{zoom}', _build, 'application/json', cache=RESPONSE_CACHE)
+
 ####################################################################################################
 # Restricted Routes
 
@@ -155,7 +216,7 @@ def get_pics_for_hike(hike_id: int):
 def upload_picture(hike_id: int):
     ''' Return list of tracks. '''
     GLOBALS.logger.info('Picture upload for %d images', len(flask.request.files))
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         if not flask.request.files:
             raise ValueError('Must provide files for uplaoding images')
         hikeo = session.execute(
@@ -189,6 +250,9 @@ def upload_picture(hike_id: int):
             session.add(picdata)
             created.append(pic)
         session.flush()
+        geotag_hike(session, hike_id)
+        session.expire_all()
+        bump_revision(session, hike_id)
         created = list(map(lambda x: x.json, map(flask.jsonify, created)))
         session.commit()
         return {'status': 'OK', 'created': created}
@@ -201,7 +265,7 @@ def picture_update_one(pic_id: int):
     strict_schema(UPDATE_PIC_SCHEMA)
     data = flask.g.data
     assert data is not None
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         ret = session.execute(
             select(Picture)
             .where(Picture.id == pic_id)
@@ -218,6 +282,10 @@ def picture_update_one(pic_id: int):
             elif key == 'time':
                 value = to_datetime(value, hikeo.zone)
             setattr(ret, key, value)
+        if 'time' in data:
+            session.flush()
+            geotag_hike(session, hikeo.id)
+        bump_revision(session, hikeo.id)
         session.commit()
         return {'status': 'OK'}
 
@@ -225,35 +293,74 @@ def picture_update_one(pic_id: int):
 @bp_pics_admin.post('/hike/<int:hike_id>/timezone')
 @expects_json(UPDATE_PIC_TIMEZONE_SCHEMA, check_formats=True)
 def change_hike_timezone(hike_id: int):
+    '''
+    Interpret the timestamps of the hike's pictures as local times of `zone` (default is the zone
+    of the hike). With `exif` the timestamps are first re-derived from the pictures' EXIF data and
+    with `hike` the start/end of the hike are re-zoned and its zone set as well.
+    '''
     strict_schema(UPDATE_PIC_TIMEZONE_SCHEMA)
     data = flask.g.data
     assert data is not None
 
-    try:
-        zone = pytz.timezone(data['zone'])
-    except pytz.exceptions.UnknownTimeZoneError as _e:
-        raise werkzeug.exceptions.BadRequest(f'Unknown time zone {data["zone"]}') from _e
+    start = time.perf_counter()
+    with Session(get_engine()) as session:
+        hikeo = session.execute(
+            select(Hike)
+            .where(Hike.id == hike_id)
+        ).scalar_one()
+        zone_name = data.get('zone', hikeo.zone) or 'UTC'
+        try:
+            pytz.timezone(zone_name)
+        except pytz.exceptions.UnknownTimeZoneError as _e:
+            raise werkzeug.exceptions.BadRequest(f'Unknown time zone {zone_name}') from _e
 
-    def _update_timestamp(doc):
-        doc.time = doc.time.replace(tzinfo=zone)
-        return doc
+        def _rezone(value):
+            return to_datetime(value.replace(tzinfo=None), zone_name) if value else value
 
-    with Session(engine) as session:
-        ret = session.execute(
-            select(Picture)
-            .where(Picture.parent == hike_id)
-        ).scalars()
-        for doc in ret:
-            _update_timestamp(doc)
+        if data.get('exif', False):
+            ret = session.execute(
+                select(PictureData.parent, PictureData.data)
+                .join(Picture, Picture.id == PictureData.parent)
+                .where(Picture.parent == hike_id)
+                .where(PictureData.resized == 'original')
+                .execution_options(yield_per=50)
+            )
+            it_ = map(lambda x: (x[0], picture_timestamp(x[1], allow_naive=True)), ret)
+            it_ = filter(lambda x: x[1] is not None, it_)
+            it_ = map(lambda x: {'id': x[0], 'time': _rezone(x[1])}, it_)
+            pictures = bulk_update(session, Picture.__table__, list(it_))
+        else:
+            ret = session.execute(
+                select(Picture.id, Picture.time)
+                .where(Picture.parent == hike_id)
+            ).all()
+            it_ = map(lambda x: {'id': x[0], 'time': _rezone(x[1])}, ret)
+            pictures = bulk_update(session, Picture.__table__, it_)
+
+        hikes = 0
+        if data.get('hike', False):
+            hikes = session.execute(
+                update(Hike)
+                .where(Hike.id == hike_id)
+                .values(zone=zone_name, start=_rezone(hikeo.start), end=_rezone(hikeo.end))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        geotagged = geotag_hike(session, hike_id)
+        bump_revision(session, hike_id)
         session.commit()
-        return {'status': 'OK'}
+        return {
+            'status': 'OK',
+            'updated': {'pictures': pictures, 'hikes': hikes, 'geotagged': geotagged},
+            'elapsed': round(time.perf_counter() - start, 3),
+        }
 
 
 @bp_pics_admin.post('/process')
 def process_image_data():
     limit = int(flask.request.args.get('limit', default='5'))
     GLOBALS.logger.info('Starting image processing endpoint for %s images', limit)
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         ret = session.execute(
             select(Picture.id, Picture.name)
         ).all()
@@ -0,0 +1,46 @@
+import hashlib
+
+import flask
+from sqlalchemy.orm import Session
+import werkzeug.exceptions
+
+from src.compression import precompressed
+from src.db.core import get_engine
+from src.db.revision import hike_revisions
+from src.tiles.geometry import valid_tile
+from src.tiles.render import render_tile
+
+bp_tiles = flask.Blueprint('tiles', __name__, url_prefix='/tiles')
+
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+
+####################################################################################################
+
+def _revision_key(revisions: dict) -> str:
+    ''' Digest of the revisions of all hikes rendered into a tile. '''
+    it_ = sorted(revisions.items())
+    it_ = map(lambda x: f'{x[0]}:{x[1]}', it_)
+    return hashlib.sha256(','.join(it_).encode()).hexdigest()[:16]
+
+
+####################################################################################################
+# Read Only Routes
+
+@bp_tiles.get('/<int:z>/<int:x>/<int:y>.mvt')
+def get_tile(z: int, x: int, y: int):
+    '''
+    Vector tile with the `tracks` and `waypoints` layers, limited to a single hike when the `hike`
+    query parameter is provided.
+    '''
+    if not valid_tile(z, x, y):
+        raise werkzeug.exceptions.NotFound(f'Tile {z}/{x}/{y} does not exist')
+    hike_id = flask.request.args.get('hike', type=int)
+    with Session(get_engine()) as session:
+        revisions = hike_revisions(session, [hike_id] if hike_id is not None else None)
+        if hike_id is not None and not revisions:
+            raise werkzeug.exceptions.NotFound(f'Hike {hike_id} does not exist')
+        scope = f'hike-{hike_id}' if hike_id is not None else 'all'
+        key = f'tiles/{scope}/{_revision_key(revisions)}/{z}/{x}/{y}.mvt'
+        return precompressed(
+            key, lambda: render_tile(session, list(revisions.keys()), z, x, y), MVT_MIMETYPE)
@@ -3,13 +3,13 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from src.db.models import Timezone
-from src.db.core import engine
+from src.db.core import get_engine
 
 bp_time = flask.Blueprint('time', __name__, url_prefix='/timezones')
 
 @bp_time.get('')
 def list_timezones():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         ret = session.execute(
             select(Timezone.name)
         ).all()
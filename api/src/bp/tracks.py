@@ -1,17 +1,38 @@
+from datetime import datetime, timedelta
 import itertools
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
 import flask
-from sqlalchemy import delete, select
+import numpy as np
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+import werkzeug.exceptions
 
-from src.db.core import engine
-from src.db.models import Hike, Track, TrackData, TrackSegment
+from src import deletion, geo, streaming
+from src.common import to_datetime
+from src.db.core import get_engine
+from src.db.models import Hike, Picture, Track, TrackSegment
+from src.db.points import (
+    hike_segments, iter_points_by_segment, iter_segment_points, segment_ids,
+)
+from src.db.revision import bump_track_revision
 from src.middleware import auth_as_admin
+from src.response_cache import cached_per_hike
 
 bp_tracks = flask.Blueprint('tracks', __name__, url_prefix='/tracks')
 
 bp_tracks_admin = flask.Blueprint('tracks', __name__)
 bp_tracks_admin.before_request(auth_as_admin)
 
+OUTPUT_FORMATS = ('json', 'geojson')
+
+PROFILE_POINTS_DEFAULT = 500
+PROFILE_POINTS_MAX = 5000
+
+# Seconds before and after the picture of `around` whose points are returned.
+WINDOW_DEFAULT = 600
+WINDOW_MAX = 24 * 3600
+
 
 ####################################################################################################
 # Read Only Routes
@@ -19,9 +40,12 @@ bp_tracks_admin.before_request(auth_as_admin)
 @bp_tracks.get('')
 def list_tracks():
     ''' Return list of tracks. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         tracks = session.execute(
             select(Track)
+            .join(Hike, Hike.id == Track.parent)
+            .where(Track.deleting.is_(False))
+            .where(Hike.deleting.is_(False))
         ).scalars()
         tracks = list(map(lambda x: x.json, map(flask.jsonify, tracks)))
         return {'data': tracks}
@@ -36,12 +60,17 @@ def list_tracks_():
 @bp_tracks.get('/<int:track_id>')
 def one_track(track_id: int):
     ''' Manage a track instance. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         if flask.request.method == 'GET':
             track = session.execute(
                 select(Track)
+                .join(Hike, Hike.id == Track.parent)
                 .where(Track.id == track_id)
-            ).scalar_one()
+                .where(Track.deleting.is_(False))
+                .where(Hike.deleting.is_(False))
+            ).scalar_one_or_none()
+            if track is None:
+                raise werkzeug.exceptions.NotFound(f'Track {track_id} does not exist')
             return flask.jsonify(track)
     raise ValueError(f'Unhandled request method type "{flask.request.method}"')
 
@@ -49,61 +78,235 @@ def one_track(track_id: int):
 @bp_tracks.get('/<int:track_id>/segment')
 def list_segments(track_id: int):
     ''' List segments associated with track. '''
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         track = session.execute(
             select(TrackSegment)
+            .join(Track, Track.id == TrackSegment.parent)
+            .join(Hike, Hike.id == Track.parent)
             .where(TrackSegment.parent == track_id)
-        ).scalar_one()
+            .where(Track.deleting.is_(False))
+            .where(Hike.deleting.is_(False))
+        ).scalar_one_or_none()
+        if track is None:
+            raise werkzeug.exceptions.NotFound(f'Track {track_id} does not exist')
         return flask.jsonify(track)
 
 
+def _output_format() -> str:
+    ret = flask.request.args.get('format', 'json')
+    if ret not in OUTPUT_FORMATS:
+        raise werkzeug.exceptions.BadRequest(f'Unknown format "{ret}"')
+    return ret
+
+
+class TimeWindow(NamedTuple):
+    ''' Times of the points returned, both inclusive, None if unbounded. '''
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
+def _parse_time(name: str) -> Optional[datetime]:
+    value = flask.request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return to_datetime(value)
+    except ValueError:
+        raise werkzeug.exceptions.BadRequest(f'Invalid time "{value}" of "{name}"') from None
+
+
+def _time_window() -> TimeWindow:
+    '''
+    Window of time requested, either from `from` and `to` times or `window` seconds around the
+    time of the picture `around`.
+    '''
+    args = flask.request.args
+    if 'around' not in args:
+        if 'window' in args:
+            raise werkzeug.exceptions.BadRequest('A window needs a picture to be "around"')
+        ret = TimeWindow(_parse_time('from'), _parse_time('to'))
+        if ret.start is not None and ret.end is not None and ret.start > ret.end:
+            raise werkzeug.exceptions.BadRequest('Time "from" is after time "to"')
+        return ret
+    if 'from' in args or 'to' in args:
+        raise werkzeug.exceptions.BadRequest('Either "around" or "from" and "to" can be given')
+    pic_id = args.get('around', type=int)
+    window = args.get('window', WINDOW_DEFAULT, type=int)
+    if pic_id is None or window is None:
+        raise werkzeug.exceptions.BadRequest('Picture id and window must be integers')
+    if not 0 <= window <= WINDOW_MAX:
+        raise werkzeug.exceptions.BadRequest(f'Window must be between 0 and {WINDOW_MAX} seconds')
+    with Session(get_engine()) as session:
+        time = session.execute(
+            select(Picture.time)
+            .where(Picture.id == pic_id)
+        ).scalar()
+    if time is None:
+        raise werkzeug.exceptions.NotFound(f'Picture {pic_id} does not exist')
+    return TimeWindow(time - timedelta(seconds=window), time + timedelta(seconds=window))
+
+
+def _geojson_feature(track: dict,
+                     segments: Iterable[Tuple[int, Iterator[Dict[str, Any]]]]) -> Iterator[str]:
+    '''
+    Encode a track and its segments, pairs of an id and points (see `iter_points_by_segment`), as a
+    GeoJSON `Feature` with a `MultiLineString` geometry. Point times are in
+    the `coordTimes` property, one array per segment aligned with the coordinates, such that points
+    without coordinates are left out of both. Points are read once: the geometry is encoded as they
+    are read and their times are kept to be encoded in the properties after it.
+    '''
+    times: List[List[Optional[datetime]]] = []
+
+    def _coordinates(points: Iterator[Dict[str, Any]], seg_times: List[Optional[datetime]]):
+        for point in points:
+            if point['latitude'] is None or point['longitude'] is None:
+                continue
+            seg_times.append(point['time'])
+            ret = [point['longitude'], point['latitude']]
+            yield ret + [point['elevation']] if point['elevation'] is not None else ret
+
+    yield '{"type":"Feature","id":' + streaming.dumps(track['id'])
+    yield ',"geometry":{"type":"MultiLineString","coordinates":['
+    for i, (_, points) in enumerate(segments):
+        yield ',' if i else ''
+        times.append([])
+        yield from streaming.json_array(_coordinates(points, times[-1]))
+    yield ']},"properties":' + streaming.dumps(track)[:-1] + ',"coordTimes":['
+    for i, seg_times in enumerate(times):
+        yield ',' if i else ''
+        yield from streaming.json_array(seg_times)
+    yield ']}}'
+
+
 @bp_tracks.get('/<int:track_id>/segment/<int:segment_id>/points')
 def list_track_points(track_id: int, segment_id: int):
-    ''' List segments associated with track. '''
-    with Session(engine) as session:
-        points = session.execute(
-            select(TrackData)
-            .where(TrackData.segment == segment_id)
-            .order_by(TrackData.time)
-        ).scalars().all()
-        return points
+    '''
+    List the points of a segment, streamed as they are read. With `format=geojson` the segment is
+    returned as a GeoJSON `Feature` instead. Points can be limited to a window of time, see
+    `_time_window`.
+    '''
+    fmt = _output_format()
+    window = _time_window()
+    with Session(get_engine()) as session:
+        segment = session.execute(
+            select(TrackSegment.id)
+            .join(Track, Track.id == TrackSegment.parent)
+            .join(Hike, Hike.id == Track.parent)
+            .where(TrackSegment.id == segment_id)
+            .where(TrackSegment.parent == track_id)
+            .where(Track.deleting.is_(False))
+            .where(Hike.deleting.is_(False))
+        ).scalar()
+    if segment is None:
+        raise werkzeug.exceptions.NotFound(
+            f'Segment {segment_id} of track {track_id} does not exist')
+
+    def _generate() -> Iterator[str]:
+        with Session(get_engine()) as session:
+            if fmt == 'json':
+                points = iter_segment_points(session, segment_id, **window._asdict())
+                yield from streaming.json_array(points)
+                return
+            track = {'id': segment_id, 'track': track_id}
+            segments = iter_points_by_segment(session, [segment_id], **window._asdict())
+            yield from _geojson_feature(track, segments)
+
+    mimetype = 'application/json' if fmt == 'json' else streaming.GEOJSON_MIMETYPE
+    return streaming.stream(_generate(), mimetype)
 
 
 @bp_tracks.get('/hike/<int:hike_id>')
+@cached_per_hike
 def tracks_from_hike(hike_id: int):
-    ''' Manage a track instance. '''
-    with Session(engine) as session:
-        tracks = session.execute(
-            select(Track)
-            .where(Track.parent == hike_id)
-        ).scalars()
+    '''
+    List the tracks of a hike with their points, encoded while the points are read. With
+    `format=geojson` a GeoJSON `FeatureCollection` with a feature per track is returned instead.
+    Points can be limited to a window of time, see `_time_window`.
+    '''
+    fmt = _output_format()
+    window = _time_window()
 
-        def _get_points(seg_id: int):
-            ret = session.execute(
-                select(TrackData)
-                .where(TrackData.segment == seg_id)
+    def _generate() -> Iterator[str]:
+        with Session(get_engine()) as session:
+            tracks = session.execute(
+                select(Track)
+                .where(Track.parent == hike_id)
+                .where(Track.deleting.is_(False))
+                .order_by(Track.id)
             ).scalars()
-            points = map(lambda x: x.serialized, ret)
-            return list(points)
+            tracks = list(map(lambda x: x.serialized, tracks))
+            seg_ids = segment_ids(session, list(map(lambda x: x['id'], tracks)))
+            # The points of all segments, read by the same two statements as they are encoded.
+            points = iter_points_by_segment(
+                session, list(itertools.chain.from_iterable(seg_ids.values())),
+                **window._asdict())
+            yield '{"data":[' if fmt == 'json' else '{"type":"FeatureCollection","features":['
+            for i, track in enumerate(tracks):
+                yield ',' if i else ''
+                segments = itertools.islice(points, len(seg_ids[track['id']]))
+                if fmt == 'geojson':
+                    yield from _geojson_feature(track, segments)
+                    continue
+                yield streaming.dumps(track)[:-1] + ',"segments":['
+                for j, (_, seg_points) in enumerate(segments):
+                    yield ',' if j else ''
+                    yield from streaming.json_array(seg_points)
+                yield ']}'
+            yield ']}'
 
-        def _get_segments(track_id: int):
-            ret = session.execute(
-                select(TrackSegment)
-                .where(TrackSegment.parent == track_id)
-            ).scalars()
-            ret = map(lambda x: x.id, ret)
-            segments = map(_get_points, ret)
-            segments = list(segments)
-            return segments
-
-        def _format_track(track):
-            ret = track.serialized
-            ret['segments'] = _get_segments(track.id)
-            return ret
-
-        tracks = map(_format_track, tracks)
-        tracks = list(tracks)
-        return {'data': tracks}
+    mimetype = 'application/json' if fmt == 'json' else streaming.GEOJSON_MIMETYPE
+    return streaming.stream(_generate(), mimetype)
+
+
+@bp_tracks.get('/hike/<int:hike_id>/profile')
+@cached_per_hike
+def hike_elevation_profile(hike_id: int):
+    '''
+    Elevation against cumulative distance (meters) along the hike's tracks, downsampled to at most
+    `points` points with Largest-Triangle-Three-Buckets.
+    '''
+    points = flask.request.args.get('points', PROFILE_POINTS_DEFAULT, type=int)
+    if not 3 <= points <= PROFILE_POINTS_MAX:
+        raise werkzeug.exceptions.BadRequest(
+            f'Number of points must be between 3 and {PROFILE_POINTS_MAX}')
+    with Session(get_engine()) as session:
+        segments = hike_segments(session, hike_id)
+
+    distances = []
+    elevations = []
+    climbs = []
+    offset = 0.0
+    for seg in segments:
+        valid = ~(np.isnan(seg.latitude) | np.isnan(seg.longitude) | np.isnan(seg.elevation))
+        if not valid.any():
+            continue
+        # Segments are joined end to end, the gap between two segments is not part of the hike.
+        dist = geo.cumulative_distance(seg.latitude[valid], seg.longitude[valid]) + offset
+        offset = dist[-1]
+        distances.append(dist)
+        elevations.append(seg.elevation[valid])
+        climbs.append(np.diff(seg.elevation[valid]))
+    if not distances:
+        return {'data': {'distance': [], 'elevation': []},
+                'metadata': {'points': 0, 'distance': 0.0, 'ascent': 0.0, 'descent': 0.0}}
+
+    distance = np.concatenate(distances)
+    elevation = np.concatenate(elevations)
+    # Within segments only, the elevation change across a pause is neither ascent nor descent.
+    climb = np.concatenate(climbs)
+    keep = geo.lttb(distance, elevation, points)
+    return {
+        'data': {
+            'distance': np.round(distance[keep], 1).tolist(),
+            'elevation': np.round(elevation[keep], 1).tolist(),
+        },
+        'metadata': {
+            'points': len(distance),
+            'distance': round(float(distance[-1]), 1),
+            'ascent': round(float(climb[climb > 0].sum()), 1),
+            'descent': round(float(-climb[climb < 0].sum()), 1),
+        },
+    }
 
 
 ####################################################################################################
@@ -112,14 +315,25 @@ def tracks_from_hike(hike_id: int):
 
 @bp_tracks_admin.delete('/<int:track_id>')
 def track_delete_one(track_id: int):
-    ''' Delete a track and allow the DB to cascade delete nested data. '''
-    with Session(engine) as session:
+    ''' Hide a track immediately and delete its data in batches in the background. '''
+    with Session(get_engine()) as session:
         session.execute(
-            delete(Track)
+            update(Track)
             .where(Track.id == track_id)
+            .values(deleting=True)
+            .execution_options(synchronize_session=False)
         )
+        bump_track_revision(session, track_id)
         session.commit()
-        return {'status': 'OK'}
+    deletion.start('track', track_id)
+    return {'status': 'OK'}
+
+
+@bp_tracks_admin.get('/<int:track_id>/deletion')
+def track_deletion_status(track_id: int):
+    ''' Report the progress of deleting a track. '''
+    with Session(get_engine()) as session:
+        return deletion.status(session, 'track', track_id)
 
 
 ####################################################################################################
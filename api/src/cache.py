@@ -0,0 +1,272 @@
+'''
+Caches for rendered data: a bounded in-process LRU tier and an on-disk tier shared between all of
+the app's workers.
+
+Entries are never invalidated in place. Instead, keys embed the revision of the data they were
+rendered from, so a change to the data simply results in a new key. Entries of old revisions are
+left to the size limit of each tier, the least recently used are evicted first.
+'''
+
+from collections import OrderedDict
+import os
+from pathlib import Path
+import re
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+from src.common import GLOBALS
+
+_KEY_PAT = re.compile(r'^[\w.-]+(/[\w.-]+)*$')
+
+# Share of the limit of the disk cache written between scans for entries to evict.
+DISK_PRUNE_SHARE = 0.1
+# Share of the limit of the disk cache left in use once pruned.
+DISK_PRUNE_TARGET = 0.9
+
+
+class DiskCache:
+    '''
+    Store bytes in files below a root directory with atomic writes. Above `max_bytes`, the least
+    recently used files are deleted. Their modification time is the time of use, the cache is only
+    scanned once a share of the limit was written by this process.
+    '''
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None) -> None:
+        self._root = root
+        self._max_bytes = max_bytes
+        self._written = 0
+        self._prune_lock = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        ''' Directory the cache entries are stored in. '''
+        if self._root is None:
+            default = str(Path(tempfile.gettempdir(), 'hike-blog-cache'))
+            self._root = Path(GLOBALS.get_env('cache', 'dir', default))
+        return self._root
+
+    def _path(self, key: str) -> Path:
+        if not _KEY_PAT.match(key) or '..' in key.split('/'):
+            raise ValueError(f'Invalid cache key "{key}"')
+        return Path(self.root, key)
+
+    @property
+    def max_bytes(self) -> int:
+        ''' Size above which entries are evicted. '''
+        if self._max_bytes is None:
+            self._max_bytes = GLOBALS.get_env_int('cache', 'disk', 1024) << 20
+        return self._max_bytes
+
+    def contains(self, key: str) -> bool:
+        ''' Whether an entry is stored for `key`. '''
+        return self._path(key).is_file()
+
+    def get(self, key: str) -> Optional[bytes]:
+        ''' Fetch the entry stored for `key`, if any, marking it as recently used. '''
+        path = self._path(key)
+        try:
+            ret = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return ret
+
+    def set(self, key: str, value: bytes) -> None:
+        ''' Store an entry, replacing any existing one without exposing partial writes. '''
+        path = self._path(key)
+        for retry in (True, False):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                fd_, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+                break
+            except FileNotFoundError:
+                # Removed meanwhile by the `prune` of another worker.
+                if not retry:
+                    raise
+        try:
+            with os.fdopen(fd_, 'wb') as outf:
+                outf.write(value)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._prune_lock:
+            self._written += len(value)
+            if self._written < self.max_bytes * DISK_PRUNE_SHARE:
+                return
+            self._written = 0
+        self.prune()
+
+    def prune(self) -> int:
+        '''
+        Delete the least recently used entries, down to `DISK_PRUNE_TARGET` of the limit, once the
+        cache is above it. Returns the number of bytes deleted.
+        '''
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = Path(dirpath, name)
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(x[1] for x in entries)
+        if size <= self.max_bytes:
+            return 0
+        ret = 0
+        entries.sort(key=lambda x: x[0])
+        for _, length, path in entries:
+            if size - ret <= self.max_bytes * DISK_PRUNE_TARGET:
+                break
+            # Other workers prune the same directory.
+            path.unlink(missing_ok=True)
+            ret += length
+            for parent in path.parents:
+                if parent == self.root:
+                    break
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+        return ret
+
+    def get_or_create(self, key: str, builder: Callable[[], bytes]) -> bytes:
+        ''' Fetch the entry for `key`, building and storing it when missing. '''
+        ret = self.get(key)
+        if ret is None:
+            ret = builder()
+            self.set(key, ret)
+        return ret
+
+
+class LruCache:
+    ''' Thread safe in-process cache evicting the least recently used entries above a size. '''
+
+    def __init__(self, max_bytes: int) -> None:
+        self._max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        ''' Total number of bytes stored. '''
+        return self._size
+
+    def contains(self, key: str) -> bool:
+        ''' Whether an entry is stored for `key`, without marking it as used. '''
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        ''' Fetch the entry stored for `key`, marking it as recently used. '''
+        with self._lock:
+            ret = self._entries.get(key)
+            if ret is not None:
+                self._entries.move_to_end(key)
+            return ret
+
+    def set(self, key: str, value: bytes) -> None:
+        ''' Store an entry, evicting old entries as needed. Entries above the limit are dropped. '''
+        if len(value) > self._max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+
+class TieredCache:
+    '''
+    In-process LRU cache, optionally backed by a disk cache shared with the other workers. Entries
+    found on disk are promoted to the memory tier.
+    '''
+
+    def __init__(self, memory: LruCache, disk: Optional[DiskCache] = None) -> None:
+        self._memory = memory
+        self._disk = disk
+        self._lock = threading.Lock()
+        self._counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def contains(self, key: str) -> bool:
+        '''
+        Whether any tier has an entry for `key`. Only a missing entry is counted, as a miss, the
+        entry found is read and counted next.
+        '''
+        if self._memory.contains(key) or (self._disk is not None and self._disk.contains(key)):
+            return True
+        self._count('misses')
+        return False
+
+    def get(self, key: str) -> Optional[bytes]:
+        ''' Fetch the entry stored for `key` from the fastest tier having it. '''
+        ret = self._memory.get(key)
+        if ret is not None:
+            self._count('memory_hits')
+            return ret
+        if self._disk is not None:
+            ret = self._disk.get(key)
+            if ret is not None:
+                self._count('disk_hits')
+                self._memory.set(key, ret)
+                return ret
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        ''' Store an entry in every tier. '''
+        self._count('stores')
+        self._memory.set(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value)
+
+    def get_or_create(self, key: str, builder: Callable[[], bytes]) -> bytes:
+        ''' Fetch the entry for `key`, building and storing it when missing. '''
+        ret = self.get(key)
+        if ret is None:
+            ret = builder()
+            self.set(key, ret)
+        return ret
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        ''' Hit and size metrics of this worker's cache. '''
+        with self._lock:
+            ret: Dict[str, float] = dict(self._counts)
+        lookups = ret['memory_hits'] + ret['disk_hits'] + ret['misses']
+        ret['hit_rate'] = (ret['memory_hits'] + ret['disk_hits']) / lookups if lookups else 0.0
+        ret['entries'] = len(self._memory)
+        ret['bytes'] = self._memory.size
+        ret['evictions'] = self._memory.evictions
+        ret['shared'] = self._disk is not None
+        return ret
+
+
+def _response_cache() -> TieredCache:
+    memory = LruCache(GLOBALS.get_env_int('cache', 'memory', 64) << 20)
+    shared = GLOBALS.get_env('cache', 'shared', 'false').lower() in ('1', 'true', 'yes')
+    return TieredCache(memory, DISK_CACHE if shared else None)
+
+
+DISK_CACHE = DiskCache()
+
+RESPONSE_CACHE = _response_cache()
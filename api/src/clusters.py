@@ -0,0 +1,106 @@
+'''
+Cluster the pictures and waypoints of a hike into map markers for every zoom level.
+
+Markers are binned into a grid of `CELL_SIZE` pixel cells over the Web Mercator map. The grid of
+each zoom level halves the cells of the next one, so the clusters of all levels are built at once
+from the cells of the deepest level by shifting their coordinates.
+'''
+
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session
+
+from src.db.models import Picture, Waypoint
+from src.tiles.geometry import MAX_LATITUDE, MAX_ZOOM
+
+TILE_SIZE = 256
+# Width in pixels of a cell, markers within a cell are merged into a cluster.
+CELL_SIZE = 64
+
+_CELL_BITS = int(np.log2(TILE_SIZE // CELL_SIZE))
+
+
+class Markers(NamedTuple):
+    ''' Geolocated markers, the id of pictures and -1 for waypoints. '''
+    picture: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.picture)
+
+
+def hike_markers(session: Session, hike_id: int, waypoints: bool = False) -> Markers:
+    ''' Pictures of the hike having coordinates, along with its waypoints if `waypoints`. '''
+    rows = session.execute(
+        select(Picture.id, Picture.latitude, Picture.longitude)
+        .where(Picture.parent == hike_id)
+        .where(Picture.latitude.isnot(None))
+        .where(Picture.longitude.isnot(None))
+        .order_by(Picture.time, Picture.id)
+    ).all()
+    if waypoints:
+        rows.extend(session.execute(
+            select(literal(-1), Waypoint.latitude, Waypoint.longitude)
+            .where(Waypoint.parent == hike_id)
+            .where(Waypoint.latitude.isnot(None))
+            .where(Waypoint.longitude.isnot(None))
+            .order_by(Waypoint.time, Waypoint.id)
+        ).all())
+    if not rows:
+        empty = np.empty(0)
+        return Markers(empty.astype(np.int64), empty, empty)
+    picture, latitude, longitude = zip(*rows)
+    return Markers(np.array(picture, dtype=np.int64), np.array(latitude, dtype=np.float64),
+                   np.array(longitude, dtype=np.float64))
+
+
+def _cells(markers: Markers) -> np.ndarray:
+    ''' Integer cell coordinates (x, y) of the markers at `MAX_ZOOM`. '''
+    scale = float(1 << (MAX_ZOOM + _CELL_BITS))
+    lat = np.radians(np.clip(markers.latitude, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (markers.longitude + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.clip(np.floor(np.stack([x, y]) * scale), 0, scale - 1).astype(np.int64)
+
+
+def _level(markers: Markers, cells: np.ndarray) -> List[dict]:
+    keys = (cells[0] << 32) | cells[1]
+    _, group = np.unique(keys, return_inverse=True)
+    group = group.ravel()
+    count = np.bincount(group)
+    latitude = np.bincount(group, weights=markers.latitude) / count
+    longitude = np.bincount(group, weights=markers.longitude) / count
+    is_picture = markers.picture >= 0
+    pictures = np.bincount(group, weights=is_picture).astype(np.int64)
+    # The picture closest to the centroid represents the cluster, waypoints never do.
+    dist = np.hypot(markers.latitude - latitude[group],
+                    (markers.longitude - longitude[group]) * np.cos(np.radians(latitude[group])))
+    dist[~is_picture] = np.inf
+    order = np.lexsort((dist, group))
+    first = order[np.concatenate(([0], np.cumsum(count)[:-1]))]
+    ret = []
+    for i, index in enumerate(first):
+        picture: Optional[int] = int(markers.picture[index]) if is_picture[index] else None
+        ret.append({
+            'latitude': round(float(latitude[i]), 7),
+            'longitude': round(float(longitude[i]), 7),
+            'count': int(count[i]),
+            'pictures': int(pictures[i]),
+            'waypoints': int(count[i] - pictures[i]),
+            'picture': picture,
+        })
+    return ret
+
+
+def cluster_levels(markers: Markers) -> Dict[int, List[dict]]:
+    '''
+    Clusters of the markers for every zoom level up to `MAX_ZOOM`, each with its centroid, the
+    number of pictures and waypoints in it and the id of the picture representing it, if any.
+    '''
+    if not len(markers):
+        return {x: [] for x in range(MAX_ZOOM + 1)}
+    cells = _cells(markers)
+    return {x: _level(markers, cells >> (MAX_ZOOM - x)) for x in range(MAX_ZOOM + 1)}
@@ -3,15 +3,14 @@ Collection of commonly used functions/routines.
 '''
 
 from datetime import datetime
+import functools
 import io
 import logging
 import os
 from pathlib import Path
 import re
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 
-import PIL.ExifTags
-import PIL.Image
 import flask
 import flask.logging
 import pytz
@@ -56,12 +55,37 @@ class _Cached:
             'user': 'DB_USER',
             'pass': 'DB_PASS',
             'passfile': 'DB_PASS_FILE',
+            'replica_host': 'DB_REPLICA_HOST',
+            'replica_max_lag': 'DB_REPLICA_MAX_LAG',
         },
         'app': {
             'mode': 'APP_MODE',
             'secret': 'APP_SECRET',
             'secretfile': 'APP_SECRET_FILE',
         },
+        'server': {
+            'workers': 'SERVER_WORKERS',
+            'threads': 'SERVER_THREADS',
+            'timeout': 'SERVER_TIMEOUT',
+            'keepalive': 'SERVER_KEEPALIVE',
+        },
+        'import': {
+            'workers': 'IMPORT_WORKERS',
+            'filter': 'IMPORT_FILTER',
+            'max_speed': 'IMPORT_MAX_SPEED',
+            'stationary_radius': 'IMPORT_STATIONARY_RADIUS',
+            'elevation_window': 'IMPORT_ELEVATION_WINDOW',
+        },
+        'tracks': {
+            'storage': 'TRACK_STORAGE',
+            'coordinates': 'TRACK_COORDINATES',
+        },
+        'cache': {
+            'dir': 'CACHE_DIR',
+            'memory': 'CACHE_MEMORY_MB',
+            'disk': 'CACHE_DISK_MB',
+            'shared': 'CACHE_SHARED',
+        },
     }
 
     def __init__(self) -> None:
@@ -119,6 +143,9 @@ def to_datetime(value: Union[str, datetime], zone: Optional[str] = None) -> date
 
 
 def picture_timestamp(img_data: bytes, allow_naive: bool = False) -> Optional[datetime]:
+    # PIL is only needed to upload pictures, imported on first use to keep the app start short.
+    import PIL.ExifTags  # pylint: disable=import-outside-toplevel
+    import PIL.Image  # pylint: disable=import-outside-toplevel
     img = PIL.Image.open(io.BytesIO(img_data))
     exifdata = img.getexif()
     for tag_id in exifdata:
@@ -135,6 +162,7 @@ def picture_timestamp(img_data: bytes, allow_naive: bool = False) -> Optional[da
 
 
 def picture_format(img_data: bytes) -> Optional[str]:
+    import PIL.Image  # pylint: disable=import-outside-toplevel
     img = PIL.Image.open(io.BytesIO(img_data))
     return img.format
 
@@ -148,3 +176,22 @@ def strict_schema(schema: Dict[str, Any]):
     for key in data.keys():
         if key not in accepted:
             raise werkzeug.exceptions.BadRequest(f'Unknown key "{key}" in payload')
+
+
+def expects_json(schema: Dict[str, Any], **kwargs) -> Callable:
+    '''
+    Validate the JSON payload against `schema` like `flask_expects_json.expects_json`, which is
+    only imported (with `jsonschema`) by the first request of a decorated route.
+    '''
+    def _decorator(view: Callable) -> Callable:
+        validated = None
+
+        @functools.wraps(view)
+        def _wrapper(*args, **kwargs_):
+            nonlocal validated
+            if validated is None:
+                import flask_expects_json  # pylint: disable=import-outside-toplevel
+                validated = flask_expects_json.expects_json(schema, **kwargs)(view)
+            return validated(*args, **kwargs_)
+        return _wrapper
+    return _decorator
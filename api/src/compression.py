@@ -0,0 +1,142 @@
+'''
+Content negotiation and compression (brotli/gzip) of response bodies.
+
+Regular responses are compressed per request with a fast level, streamed responses chunk by chunk
+as they are produced. Large bodies which can be cached,
+such as complete hike tracks, are compressed once with a high level and stored in the disk cache
+so repeat requests are served from the stored, precompressed form.
+'''
+
+import gzip
+from typing import Callable, Dict, Iterable, Iterator, Optional, Union
+import zlib
+
+import brotli
+import flask
+
+from src.cache import DISK_CACHE, DiskCache, TieredCache
+
+# Preference order used when the client accepts several encodings with the same quality.
+ENCODINGS = ('br', 'gzip')
+
+# Bodies smaller than this are not worth the cost of compressing (nor the extra headers).
+MIN_SIZE = 1024
+
+COMPRESSIBLE = (
+    'application/json',
+    'application/geo+json',
+    'application/vnd.mapbox-vector-tile',
+    'text/html',
+    'text/plain',
+)
+
+_LEVELS = {
+    # Used while handling a request, cheap in CPU time.
+    'fast': {'br': 4, 'gzip': 6},
+    # Used for bodies which are compressed once and stored.
+    'high': {'br': 11, 'gzip': 9},
+}
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    ''' Select the preferred encoding from an `Accept-Encoding` header, if one is acceptable. '''
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, *params = map(str.strip, item.split(';'))
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str, level: str = 'fast') -> bytes:
+    ''' Compress data with the encoding at the named level (`fast` or `high`). '''
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding "{encoding}"')
+    quality = _LEVELS[level][encoding]
+    if encoding == 'br':
+        return brotli.compress(data, quality=quality)
+    return gzip.compress(data, compresslevel=quality, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    ''' Compress a stream of chunks at the fast level, flushing after each chunk. '''
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding "{encoding}"')
+    quality = _LEVELS['fast'][encoding]
+    if encoding == 'br':
+        brc = brotli.Compressor(quality=quality)
+        for chunk in chunks:
+            yield brc.process(chunk) + brc.flush()
+        yield brc.finish()
+        return
+    # A wbits of 31 writes the gzip container rather than a raw zlib stream.
+    gzc = zlib.compressobj(quality, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield gzc.compress(chunk) + gzc.flush(zlib.Z_SYNC_FLUSH)
+    yield gzc.flush()
+
+
+def _is_compressible(response: flask.Response) -> bool:
+    if response.direct_passthrough:
+        return False
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return response.mimetype in COMPRESSIBLE
+
+
+def compress_response(response: flask.Response) -> flask.Response:
+    ''' After request hook compressing the response body when the client accepts it. '''
+    if not _is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length is not None and response.content_length < MIN_SIZE:
+        return response
+    encoding = negotiate(flask.request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def precompressed(key: str, builder: Callable[[], bytes], mimetype: str,
+                  cache: Union[DiskCache, TieredCache] = DISK_CACHE) -> flask.Response:
+    '''
+    Respond with a body stored in `cache` under `key`, building it on a miss. The variant for the
+    negotiated encoding is stored next to it, compressed once with a high level. Keys must
+    identify the exact content (e.g. include the hike revision).
+    '''
+    encoding = negotiate(flask.request.headers.get('Accept-Encoding'))
+    data = cache.get(f'{key}.{encoding}') if encoding is not None else None
+    if data is None:
+        body = cache.get_or_create(key, builder)
+        if encoding is None or len(body) < MIN_SIZE:
+            response = flask.Response(body, mimetype=mimetype)
+            response.vary.add('Accept-Encoding')
+            return response
+        data = compress(body, encoding, level='high')
+        cache.set(f'{key}.{encoding}', data)
+    response = flask.Response(data, mimetype=mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
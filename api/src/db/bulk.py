@@ -0,0 +1,36 @@
+'''
+Set-based helpers for maintenance operations touching many rows.
+'''
+
+import itertools
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import Table, bindparam, update
+from sqlalchemy.orm import Session
+
+BATCH_SIZE = 1000
+
+
+def bulk_update(session: Session, table: Table, rows: Iterable[Dict[str, Any]],
+                key: str = 'id', batch_size: int = BATCH_SIZE) -> int:
+    '''
+    Update rows by primary key with batched executemany statements. Every row provides the `key`
+    column and the same set of columns to update. Returns the number of rows updated, missing keys
+    are not counted unless the driver does not report counts of batches.
+    '''
+    it_ = iter(rows)
+    total = 0
+    while True:
+        batch: List[Dict[str, Any]] = list(itertools.islice(it_, batch_size))
+        if not batch:
+            return total
+        columns = [x for x in batch[0] if x != key]
+        params = [{f'_{name}': value for name, value in row.items()} for row in batch]
+        result = session.execute(
+            update(table)
+            .where(table.c[key] == bindparam(f'_{key}'))
+            .values({name: bindparam(f'_{name}') for name in columns}),
+            params,
+        )
+        # Drivers report -1 when the count of a batch is unknown, assume every row was updated.
+        total += result.rowcount if result.rowcount >= 0 else len(batch)
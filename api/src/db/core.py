@@ -3,6 +3,7 @@ Database setup and engine provider.
 '''
 
 from datetime import datetime
+import threading
 from typing import Dict, Optional
 
 import flask
@@ -14,12 +15,12 @@ from src.db.base import Base
 from src.db.custom import AwareDateTime
 
 
-def _get_db_uri(env: Optional[Dict[str, str]] = None):
+def _get_db_uri(env: Optional[Dict[str, str]] = None, host: Optional[str] = None):
     # TODO Reimplement some sort of test controllable variables
     dialect = GLOBALS.get_env('db', 'dialect', 'postgres')
     uname = GLOBALS.get_env('db', 'user', '')
     passwd = GLOBALS.get_env('db', 'passfile', '')
-    host = GLOBALS.get_env('db', 'host', '')
+    host = host or GLOBALS.get_env('db', 'host', '')
     name = GLOBALS.get_env('db', 'name', '')
     creds = f'{uname}:{passwd}' if passwd else uname
     login = f'{creds}@' if creds else ''
@@ -32,6 +33,12 @@ def get_db_uri(env: Optional[Dict[str, str]] = None):
     return _get_db_uri(env)
 
 
+def _get_replica_uri() -> Optional[str]:
+    ''' The read replica, `DB_REPLICA_HOST`, with the name and credentials of the primary. '''
+    host = GLOBALS.get_env('db', 'replica_host', '')
+    return _get_db_uri(host=host) if host else None
+
+
 class JsonSerializer(flask.json.JSONEncoder):
     def default(self, o):
         def _nested(data):
@@ -57,4 +64,80 @@ class JsonSerializer(flask.json.JSONEncoder):
         return _nested(o)
 
 
-engine = sqlalchemy.create_engine(_get_db_uri(), echo=False)
+_ENGINE: Optional[sqlalchemy.engine.Engine] = None
+_REPLICA: Optional[sqlalchemy.engine.Engine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+# Seconds to wait for a connection to the read replica, reads fall back to the primary when it is
+# unreachable rather than waiting on the default TCP timeout.
+REPLICA_CONNECT_TIMEOUT = 2
+
+
+def _new_engine(uri: str, connect_timeout: Optional[int] = None) -> sqlalchemy.engine.Engine:
+    connect_args = {}
+    backend = sqlalchemy.engine.make_url(uri).get_backend_name()
+    if backend == 'postgresql':
+        # Aware timestamps are returned in the zone of the session, UTC as stored by other dialects.
+        connect_args['options'] = '-c timezone=utc'
+    if connect_timeout is not None and backend in ('postgresql', 'mysql'):
+        connect_args['connect_timeout'] = connect_timeout
+    return sqlalchemy.create_engine(uri, echo=False, connect_args=connect_args)
+
+
+def _create_engine(uri: Optional[str]) -> sqlalchemy.engine.Engine:
+    global _ENGINE  # pylint: disable=global-statement
+    if _ENGINE is not None:
+        _ENGINE.dispose()
+    _ENGINE = _new_engine(uri or _get_db_uri())
+    return _ENGINE
+
+
+def _create_replica(uri: Optional[str]) -> None:
+    global _REPLICA  # pylint: disable=global-statement
+    if _REPLICA is not None:
+        _REPLICA.dispose()
+    _REPLICA = _new_engine(uri, REPLICA_CONNECT_TIMEOUT) if uri else None
+
+
+def init_engine(uri: Optional[str] = None,
+                replica_uri: Optional[str] = None) -> sqlalchemy.engine.Engine:
+    '''
+    Create the engine of the app from `uri`, or the configured database, replacing the current
+    one. Likewise for the read replica, `replica_uri` or the configured one when neither is given,
+    none otherwise. Called by the app factory, see `src.main.create_app`.
+    '''
+    with _ENGINE_LOCK:
+        if uri is None and replica_uri is None:
+            replica_uri = _get_replica_uri()
+        _create_replica(replica_uri)
+        return _create_engine(uri)
+
+
+def get_primary_engine() -> sqlalchemy.engine.Engine:
+    ''' Engine of the app, created from the configuration on first use outside of an app. '''
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _create_engine(None)
+    return _ENGINE
+
+
+def get_replica_engine() -> Optional[sqlalchemy.engine.Engine]:
+    ''' Engine of the read replica, None without one. '''
+    return _REPLICA
+
+
+def use_replica(enabled: bool = True) -> None:
+    ''' Route the statements of the current request to the read replica, when there is one. '''
+    flask.g.db_replica = enabled
+
+
+def get_engine() -> sqlalchemy.engine.Engine:
+    '''
+    Engine of the current request: the read replica for requests routed to it (see
+    `src.replica`), the primary otherwise.
+    '''
+    if _REPLICA is not None and flask.has_app_context() and flask.g.get('db_replica', False):
+        return _REPLICA
+    return get_primary_engine()
@@ -2,19 +2,100 @@
 Custom data types for the ORM.
 '''
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import DateTime, TypeDecorator
+from sqlalchemy import DateTime, Float, Integer, TypeDecorator
 
-from src.common import to_datetime
+from src.common import GLOBALS
+
+# Dialects storing timestamps with their time zone, whose drivers return aware datetimes.
+NATIVE_TZ_DIALECTS = ('postgresql',)
+
+# Steps per unit of coordinates (1e-7 degrees, about 1 cm) and elevations (decimetres) stored as
+# `FixedPoint`.
+COORDINATE_SCALE = 10 ** 7
+ELEVATION_SCALE = 10
+
+COORDINATE_MODES = ('float', 'fixed')
+
+
+def coordinate_mode() -> str:
+    '''
+    How the coordinates of track points and waypoints are stored, `TRACK_COORDINATES`. With
+    `float` (default) as double precision floats, with `fixed` as integers, see `FixedPoint`. The
+    columns are converted by the migration storing coordinates as fixed point, run it again
+    (downgrade and upgrade) after changing the mode.
+    '''
+    ret = GLOBALS.get_env('tracks', 'coordinates', 'float')
+    if ret not in COORDINATE_MODES:
+        raise ValueError(f'Unknown coordinate storage "{ret}"')
+    return ret
 
 
 class AwareDateTime(TypeDecorator):
-    ''' Returns an aware datetime such that timezone is assumed to be UTC. '''
-    impl = DateTime
+    '''
+    Aware datetimes, stored as `timestamptz` where the dialect supports it. Other dialects store
+    naive UTC timestamps, naive values read are assumed to be UTC.
+    '''
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        # Values are passed to drivers of dialects with aware timestamps as is, without a call per
+        # row.
+        if dialect.name in NATIVE_TZ_DIALECTS:
+            return self.impl.bind_processor(dialect)
+        return super().bind_processor(dialect)
+
+    def result_processor(self, dialect, coltype):
+        if dialect.name in NATIVE_TZ_DIALECTS:
+            return self.impl.result_processor(dialect, coltype)
+        return super().result_processor(dialect, coltype)
+
+    def process_bind_param(self, value: Optional[datetime], dialect):
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
 
     def process_result_value(self, value: Optional[datetime], dialect):
-        if value:
-            return to_datetime(value)
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
         return value
+
+
+class FixedPoint(TypeDecorator):
+    '''
+    Floats stored, with the `fixed` coordinate mode, as integer multiples of 1 / `scale`, half the
+    size of a double precision column and its indexes. Values are rounded to the nearest step when
+    bound. Plain floats otherwise, see `coordinate_mode`.
+    '''
+    impl = Float
+    cache_ok = True
+
+    def __init__(self, scale: int) -> None:
+        super().__init__()
+        self.scale = scale
+
+    def load_dialect_impl(self, dialect):
+        if coordinate_mode() == 'fixed':
+            return dialect.type_descriptor(Integer())
+        return dialect.type_descriptor(Float())
+
+    def bind_processor(self, dialect):
+        if coordinate_mode() != 'fixed':
+            return super().bind_processor(dialect)
+        scale = self.scale
+
+        def _process(value: Optional[float]) -> Optional[int]:
+            return None if value is None else round(value * scale)
+        return _process
+
+    def result_processor(self, dialect, coltype):
+        if coordinate_mode() != 'fixed':
+            return super().result_processor(dialect, coltype)
+        scale = self.scale
+
+        def _process(value: Optional[int]) -> Optional[float]:
+            return None if value is None else value / scale
+        return _process
@@ -1,11 +1,14 @@
 # pylint: disable=missing-class-docstring
 # pylint: disable=too-few-public-methods
 
-from sqlalchemy import Boolean, Column, Float, ForeignKey, Integer, LargeBinary, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Boolean, Column, Float, ForeignKey, Index, Integer, LargeBinary, String, Text,
+    UniqueConstraint, false,
+)
+from sqlalchemy.orm import deferred, relationship
 
 from src.db.base import Base
-from src.db.custom import AwareDateTime
+from src.db.custom import COORDINATE_SCALE, ELEVATION_SCALE, AwareDateTime, FixedPoint
 
 
 class Timezone(Base):
@@ -25,6 +28,11 @@ class Hike(Base):
     title = Column(Text)
     brief = Column(Text)
     description = Column(Text)
+    revision = Column(Integer, nullable=False, default=0, server_default='0')
+    # Set while the hike's data is removed in the background, hidden from all reads meanwhile.
+    deleting = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Last progress of the worker deleting the hike, such that no other worker deletes it as well.
+    deletion_claimed = Column(AwareDateTime)
 
     @property
     def serialized(self) -> dict:
@@ -38,6 +46,7 @@ class Hike(Base):
             'title': self.title,
             'brief': self.brief,
             'description': self.description,
+            'revision': self.revision,
         }
         return ret
 
@@ -50,6 +59,17 @@ class Track(Base):
 
     name = Column(Text)
     description = Column(Text)
+    # Set while the track's data is removed in the background, hidden from all reads meanwhile.
+    deleting = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Last progress of the worker deleting the track, see `Hike.deletion_claimed`.
+    deletion_claimed = Column(AwareDateTime)
+    # Name of the imported file and hash of the track's content, used to skip unchanged tracks.
+    source = Column(Text)
+    fingerprint = Column(String(256))
+
+    __table_args__ = (
+        Index('ix_tracks_parent_fingerprint', 'parent', 'fingerprint'),
+    )
 
     @property
     def serialized(self) -> dict:
@@ -69,6 +89,15 @@ class TrackSegment(Base):
     id = Column(Integer, primary_key=True)
     parent = Column(Integer, ForeignKey(Track.id, ondelete='CASCADE'), nullable=False)
 
+    # Points packed by `src.db.trackpack`, NULL when stored as rows of `trackdata` instead. Only
+    # loaded on access, as most queries of segments only need their ids.
+    points = deferred(Column(LargeBinary(1 << 24)))
+    # Bounding box of the packed points.
+    min_latitude = Column(Float)
+    max_latitude = Column(Float)
+    min_longitude = Column(Float)
+    max_longitude = Column(Float)
+
     @property
     def serialized(self) -> dict:
         ''' Return dict for use when serializing. '''
@@ -86,9 +115,15 @@ class TrackData(Base):
     segment = Column(Integer, ForeignKey(TrackSegment.id, ondelete='CASCADE'), nullable=False)
 
     time = Column(AwareDateTime)
-    latitude = Column(Float)
-    longitude = Column(Float)
-    elevation = Column(Float)
+    latitude = Column(FixedPoint(COORDINATE_SCALE))
+    longitude = Column(FixedPoint(COORDINATE_SCALE))
+    elevation = Column(FixedPoint(ELEVATION_SCALE))
+
+    __table_args__ = (
+        Index('ix_trackdata_latitude_longitude', 'latitude', 'longitude'),
+        # Points of a segment in order of time and windows of time within a segment.
+        Index('ix_trackdata_segment_time', 'segment', 'time'),
+    )
 
 
 class Waypoint(Base):
@@ -101,9 +136,32 @@ class Waypoint(Base):
     description = Column(Text)
 
     time = Column(AwareDateTime)
-    latitude = Column(Float)
-    longitude = Column(Float)
-    elevation = Column(Float)
+    latitude = Column(FixedPoint(COORDINATE_SCALE))
+    longitude = Column(FixedPoint(COORDINATE_SCALE))
+    elevation = Column(FixedPoint(ELEVATION_SCALE))
+    # Name of the imported file and hash of the waypoint's content, used to skip unchanged ones.
+    source = Column(Text)
+    fingerprint = Column(String(256))
+
+    __table_args__ = (
+        Index('ix_waypoints_parent_fingerprint', 'parent', 'fingerprint'),
+    )
+
+
+class GpxImport(Base):
+    ''' GPX file imported into a hike, identified by its name and the hash of its content. '''
+    __tablename__ = 'gpximports'
+
+    id = Column(Integer, primary_key=True)
+    parent = Column(Integer, ForeignKey(Hike.id, ondelete='CASCADE'), nullable=False)
+
+    name = Column(Text, nullable=False)
+    sha = Column(String(256), nullable=False)
+    time = Column(AwareDateTime)
+
+    __table_args__ = (
+        UniqueConstraint('parent', 'name'),
+    )
 
 
 class Picture(Base):
@@ -117,6 +175,11 @@ class Picture(Base):
     time = Column(AwareDateTime, nullable=False)
     description = Column(Text)
 
+    # Interpolated from the hike's track data at the time the picture was taken.
+    latitude = Column(Float)
+    longitude = Column(Float)
+    elevation = Column(Float)
+
     @property
     def serialized(self) -> dict:
         ''' Return dict for use when serializing. '''
@@ -127,6 +190,9 @@ class Picture(Base):
             'fmt': self.fmt,
             'time': self.time,
             'description': self.description,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'elevation': self.elevation,
         }
         return ret
 
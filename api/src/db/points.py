@@ -0,0 +1,207 @@
+'''
+Load the track points of a hike as arrays, one set of arrays per track segment. Segments store
+their points either packed (see `src.db.trackpack`) or as rows of `trackdata`, both are read here.
+'''
+
+from datetime import datetime, timezone
+import itertools
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.db import trackpack
+from src.db.models import Track, TrackData, TrackSegment
+
+# Number of rows fetched at a time when streaming points.
+STREAM_BATCH_SIZE = 1000
+
+
+class SegmentArrays(NamedTuple):
+    ''' Points of a track segment sorted by time. Times are POSIX timestamps, missing are NaN. '''
+    track: int
+    segment: int
+    time: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    elevation: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+def _to_float(value) -> float:
+    return np.nan if value is None else value
+
+
+def _packed_segments(session: Session, hike_id: int) -> List[SegmentArrays]:
+    rows = session.execute(
+        select(TrackSegment.parent, TrackSegment.id, TrackSegment.points)
+        .join(Track, Track.id == TrackSegment.parent)
+        .where(Track.parent == hike_id)
+        .where(Track.deleting.is_(False))
+        .where(TrackSegment.points.isnot(None))
+    ).all()
+    ret = []
+    for track_id, seg_id, data in rows:
+        points = trackpack.unpack(data)
+        order = np.argsort(points.time, kind='stable')
+        ret.append(SegmentArrays(track_id, seg_id, *(x[order] for x in points)))
+    return ret
+
+
+def hike_segments(session: Session, hike_id: int) -> List[SegmentArrays]:
+    ''' Points of every segment of the hike's tracks, ordered by track then segment. '''
+    rows = session.execute(
+        select(
+            TrackSegment.parent, TrackData.segment, TrackData.time,
+            TrackData.latitude, TrackData.longitude, TrackData.elevation,
+        )
+        .join(TrackSegment, TrackSegment.id == TrackData.segment)
+        .join(Track, Track.id == TrackSegment.parent)
+        .where(Track.parent == hike_id)
+        .where(Track.deleting.is_(False))
+        .order_by(TrackSegment.parent, TrackData.segment, TrackData.time, TrackData.id)
+    ).all()
+    ret: List[SegmentArrays] = []
+    start = 0
+    for end in range(1, len(rows) + 1):
+        if end < len(rows) and rows[end][1] == rows[start][1]:
+            continue
+        chunk = rows[start:end]
+        ret.append(SegmentArrays(
+            track=chunk[0][0],
+            segment=chunk[0][1],
+            time=np.array([x[2].timestamp() if x[2] is not None else np.nan for x in chunk]),
+            latitude=np.array([_to_float(x[3]) for x in chunk], dtype=np.float64),
+            longitude=np.array([_to_float(x[4]) for x in chunk], dtype=np.float64),
+            elevation=np.array([_to_float(x[5]) for x in chunk], dtype=np.float64),
+        ))
+        start = end
+    ret.extend(_packed_segments(session, hike_id))
+    ret.sort(key=lambda x: (x.track, x.segment))
+    return ret
+
+
+def _timestamp(value: float) -> Optional[datetime]:
+    return None if np.isnan(value) else datetime.fromtimestamp(value, timezone.utc)
+
+
+def _nullable(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def segment_ids(session: Session, track_ids: List[int]) -> Dict[int, List[int]]:
+    ''' Segment ids of each of the tracks, read at once. '''
+    ret: Dict[int, List[int]] = {x: [] for x in track_ids}
+    rows = session.execute(
+        select(TrackSegment.parent, TrackSegment.id)
+        .where(TrackSegment.parent.in_(track_ids))
+        .order_by(TrackSegment.parent, TrackSegment.id)
+    )
+    for track_id, seg_id in rows:
+        ret[track_id].append(seg_id)
+    return ret
+
+
+def _row_points(rows) -> Iterator[Dict[str, Any]]:
+    for point_id, seg_id, time, lat, lon, ele in rows:
+        yield {
+            'id': point_id,
+            'segment': seg_id,
+            'time': time,
+            'latitude': lat,
+            'longitude': lon,
+            'elevation': ele,
+        }
+
+
+def _packed_points(seg_id: int, data: bytes, start: Optional[datetime],
+                   end: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+    points = trackpack.unpack(data)
+    order = np.argsort(points.time, kind='stable')
+    times = points.time[order]
+    first, last = 0, len(times)
+    if start is not None or end is not None:
+        # Missing times are sorted last and never within a window.
+        last = np.count_nonzero(~np.isnan(times))
+    if start is not None:
+        first = np.searchsorted(times[:last], start.timestamp(), side='left')
+    if end is not None:
+        last = np.searchsorted(times[:last], end.timestamp(), side='right')
+    for i in order[first:last]:
+        yield {
+            'id': None,
+            'segment': seg_id,
+            'time': _timestamp(points.time[i]),
+            'latitude': _nullable(points.latitude[i]),
+            'longitude': _nullable(points.longitude[i]),
+            'elevation': _nullable(points.elevation[i]),
+        }
+
+
+def iter_points_by_segment(
+        session: Session, seg_ids: List[int], batch_size: int = STREAM_BATCH_SIZE,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None) -> Iterator[Tuple[int, Iterator[Dict[str, Any]]]]:
+    '''
+    Serialized points of several segments, as `iter_segment_points`, read with two statements
+    whatever the number of segments: one for the packed segments and one streaming the rows of the
+    others. Yields the id and points of every segment in the order of `seg_ids`, which must be
+    ordered by track then segment id. The points of a segment are gone once the next is yielded.
+    '''
+    packed = dict(session.execute(
+        select(TrackSegment.id, TrackSegment.points)
+        .where(TrackSegment.id.in_(seg_ids))
+        .where(TrackSegment.points.isnot(None))
+    ).all())
+    groups: Iterator[Tuple[int, Iterator[Any]]] = iter(())
+    unpacked = [x for x in seg_ids if x not in packed]
+    if unpacked:
+        query = (
+            select(
+                TrackData.id, TrackData.segment, TrackData.time,
+                TrackData.latitude, TrackData.longitude, TrackData.elevation,
+            )
+            .join(TrackSegment, TrackSegment.id == TrackData.segment)
+            .where(TrackData.segment.in_(unpacked))
+        )
+        if start is not None:
+            query = query.where(TrackData.time >= start)
+        if end is not None:
+            query = query.where(TrackData.time <= end)
+        rows = session.execute(
+            query
+            .order_by(TrackSegment.parent, TrackData.segment, TrackData.time, TrackData.id)
+            .execution_options(yield_per=batch_size)
+        )
+        groups = itertools.groupby(rows, key=lambda x: x[1])
+    group = next(groups, None)
+    for seg_id in seg_ids:
+        if seg_id in packed:
+            yield seg_id, _packed_points(seg_id, packed.pop(seg_id), start, end)
+        elif group is not None and group[0] == seg_id:
+            yield seg_id, _row_points(group[1])
+            group = next(groups, None)
+        else:
+            # No points, at least within the window.
+            yield seg_id, iter(())
+
+
+def iter_segment_points(session: Session, seg_id: int, batch_size: int = STREAM_BATCH_SIZE,
+                        start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    '''
+    Serialized points of a segment ordered by time, as `TrackData.serialized`. Rows are streamed
+    from the database in batches of `batch_size`. Packed points have no id of their own. With
+    `start` or `end` only the points timed within the window, both inclusive, are returned.
+    '''
+    for _, points in iter_points_by_segment(session, [seg_id], batch_size, start, end):
+        yield from points
+
+
+def segment_points(session: Session, seg_id: int, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    ''' Serialized points of a segment ordered by time, see `iter_segment_points`. '''
+    return list(iter_segment_points(session, seg_id, start=start, end=end))
@@ -0,0 +1,46 @@
+'''
+Per-hike revision counters used to key cached data derived from a hike.
+
+Any route that changes the data of a hike (metadata, tracks, waypoints or pictures) bumps the
+counter, such that anything cached under the previous revision is never served again.
+'''
+
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from src.db.models import Hike, Track
+
+
+def bump_revision(session: Session, hike_id: int) -> None:
+    ''' Increment the revision of a hike within the current transaction. '''
+    session.execute(
+        update(Hike)
+        .where(Hike.id == hike_id)
+        .values(revision=Hike.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bump_track_revision(session: Session, track_id: int) -> None:
+    ''' Increment the revision of the hike owning the track. '''
+    session.execute(
+        update(Hike)
+        .where(Hike.id == select(Track.parent).where(Track.id == track_id).scalar_subquery())
+        .values(revision=Hike.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def hike_revisions(session: Session,
+                   hike_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    '''
+    Map hike ids to their current revision, optionally limited to `hike_ids`. Hikes being deleted
+    are left out.
+    '''
+    query = select(Hike.id, Hike.revision).where(Hike.deleting.is_(False))
+    if hike_ids is not None:
+        query = query.where(Hike.id.in_(list(hike_ids)))
+    ret = session.execute(query).all()
+    return dict(map(tuple, ret))
@@ -0,0 +1,105 @@
+'''
+Compact storage of the points of a track segment in a single binary column.
+
+Each channel (time, latitude, longitude, elevation) is quantized to integers, delta encoded and
+byte shuffled before being compressed, so consecutive points, which differ little, shrink to a few
+bytes each. Quantization keeps millisecond timestamps, 1e-7 degree coordinates (about 1 cm) and
+millimetre elevations, beyond the precision of the recorded data. Missing values are kept in a
+bitmask per channel.
+'''
+
+import struct
+from typing import NamedTuple, Optional
+import zlib
+
+import numpy as np
+
+from src.common import GLOBALS
+
+_MAGIC = b'TP'
+_VERSION = 1
+_HEADER = struct.Struct('<2sBI')
+
+# Channels in storage order with their quantization scale.
+CHANNELS = (
+    ('time', 1e3),
+    ('latitude', 1e7),
+    ('longitude', 1e7),
+    ('elevation', 1e3),
+)
+
+STORAGE_MODES = ('packed', 'rows')
+
+
+class PackedPoints(NamedTuple):
+    ''' Points of a segment in stored order. Times are POSIX timestamps, missing values are NaN. '''
+    time: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    elevation: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+def storage_mode() -> str:
+    '''
+    How new track points are stored, `TRACK_STORAGE`. With `packed` (default) the points of a
+    segment are packed into the segment, with `rows` every point is a row of `trackdata`.
+    '''
+    ret = GLOBALS.get_env('tracks', 'storage', 'packed')
+    if ret not in STORAGE_MODES:
+        raise ValueError(f'Unknown track storage "{ret}"')
+    return ret
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    return values.astype('<i8').view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unshuffle(data: bytes, count: int) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8).reshape(8, count).T.copy().view('<i8').ravel()
+
+
+def pack(points: PackedPoints) -> bytes:
+    ''' Encode the points of a segment. '''
+    count = len(points)
+    body = []
+    for (_, scale), values in zip(CHANNELS, points):
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        ints = np.round(np.where(missing, 0.0, values) * scale).astype(np.int64)
+        body.append(np.packbits(missing).tobytes())
+        body.append(_shuffle(np.diff(ints, prepend=np.int64(0))))
+    return _HEADER.pack(_MAGIC, _VERSION, count) + zlib.compress(b''.join(body), 6)
+
+
+def unpack(data: bytes) -> PackedPoints:
+    ''' Decode the points of a segment encoded by `pack`. '''
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError('Invalid packed track data')
+    body = zlib.decompress(data[_HEADER.size:])
+    mask_size = (count + 7) // 8
+    offset = 0
+    channels = []
+    for _, scale in CHANNELS:
+        mask = np.frombuffer(body, dtype=np.uint8, count=mask_size, offset=offset)
+        missing = np.unpackbits(mask, count=count).astype(bool)
+        offset += mask_size
+        deltas = _unshuffle(body[offset:offset + 8 * count], count)
+        offset += 8 * count
+        values = np.cumsum(deltas) / scale
+        values[missing] = np.nan
+        channels.append(values)
+    return PackedPoints(*channels)
+
+
+def bounds(points: PackedPoints) -> Optional[tuple]:
+    ''' Bounding box (min lat, max lat, min lon, max lon) of the points, None if there are none. '''
+    valid = ~(np.isnan(points.latitude) | np.isnan(points.longitude))
+    if not valid.any():
+        return None
+    lat = points.latitude[valid]
+    lon = points.longitude[valid]
+    return (float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max()))
@@ -0,0 +1,169 @@
+'''
+Delete hikes and tracks in bounded batches on a background thread.
+
+Deleting a large hike in a single statement relies on the cascades of the database and results in
+one long transaction holding locks on every nested row. Instead the hike (or track) is marked as
+`deleting`, which hides it from every read, and its nested rows are then removed bottom up, one
+short transaction per batch. An interrupted deletion is resumed by requesting it again.
+
+A deletion is claimed in the database (`deletion_claimed`) and the claim renewed with every batch,
+such that a repeated request, handled by any worker, does not delete the same rows concurrently.
+A claim left without progress for `CLAIM_TIMEOUT` seconds, e.g. by a worker which was stopped, is
+taken over by the next request.
+'''
+
+from datetime import datetime, timedelta, timezone
+import threading
+from typing import Dict, List, Tuple
+
+import flask
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from src.common import GLOBALS
+from src.db.core import get_engine
+from src.db.models import Hike, Picture, PictureData, Track, TrackData, TrackSegment, Waypoint
+
+# Number of rows removed per transaction.
+BATCH_SIZE = 5000
+
+# Picture data and packed track segments hold blobs, so far fewer are removed per transaction.
+BLOB_BATCH_SIZE = 20
+
+# Seconds without progress after which a deletion is started again.
+CLAIM_TIMEOUT = 60
+
+
+def _track_ids(session: Session, hike_id: int) -> List[int]:
+    return list(session.execute(select(Track.id).where(Track.parent == hike_id)).scalars())
+
+
+def _steps(kind: str, session: Session, item_id: int) -> List[Tuple[str, object, object, int]]:
+    '''
+    Ordered list of (name, table, id column query, batch size) to delete for a hike or track.
+    '''
+    track_ids = [item_id] if kind == 'track' else _track_ids(session, item_id)
+    segments = select(TrackSegment.id).where(TrackSegment.parent.in_(track_ids))
+    ret = [
+        ('trackdata', TrackData, select(TrackData.id).where(TrackData.segment.in_(segments)),
+         BATCH_SIZE),
+        ('tracksegments', TrackSegment, segments, BLOB_BATCH_SIZE),
+        ('tracks', Track, select(Track.id).where(Track.id.in_(track_ids)), BATCH_SIZE),
+    ]
+    if kind == 'hike':
+        pictures = select(Picture.id).where(Picture.parent == item_id)
+        ret += [
+            ('waypoints', Waypoint, select(Waypoint.id).where(Waypoint.parent == item_id),
+             BATCH_SIZE),
+            ('picturedata', PictureData,
+             select(PictureData.id).where(PictureData.parent.in_(pictures)), BLOB_BATCH_SIZE),
+            ('pictures', Picture, pictures, BATCH_SIZE),
+        ]
+    return ret
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _claim(session: Session, model, item_id: int) -> bool:
+    ''' Claim the deletion of an item marked as `deleting`, unless claimed by a live worker. '''
+    now = _now()
+    ret = session.execute(
+        update(model)
+        .where(model.id == item_id)
+        .where(model.deleting.is_(True))
+        .where(or_(model.deletion_claimed.is_(None),
+                   model.deletion_claimed < now - timedelta(seconds=CLAIM_TIMEOUT)))
+        .values(deletion_claimed=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return ret.rowcount == 1
+
+
+def _renew(session: Session, model, item_id: int) -> None:
+    session.execute(
+        update(model)
+        .where(model.id == item_id)
+        .values(deletion_claimed=_now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_batches(session: Session, model, ids_query, batch_size: int, renew) -> int:
+    # Ids are fetched first as not every dialect supports a LIMIT within a DELETE subquery.
+    total = 0
+    while True:
+        ids = list(session.execute(ids_query.limit(batch_size)).scalars())
+        if not ids:
+            return total
+        session.execute(delete(model).where(model.id.in_(ids)))
+        renew(session)
+        session.commit()
+        total += len(ids)
+
+
+def _run(kind: str, item_id: int) -> None:
+    model = Hike if kind == 'hike' else Track
+    with Session(get_engine()) as session:
+        for name, table, ids_query, batch_size in _steps(kind, session, item_id):
+            count = _delete_batches(session, table, ids_query, batch_size,
+                                    lambda x: _renew(x, model, item_id))
+            GLOBALS.logger.debug('Deleted %d rows of %s for %s %d', count, name, kind, item_id)
+        session.execute(delete(model).where(model.id == item_id))
+        session.commit()
+
+
+def _worker(app: flask.Flask, kind: str, item_id: int) -> None:
+    with app.app_context():
+        try:
+            _run(kind, item_id)
+        except Exception:  # pylint: disable=broad-except
+            GLOBALS.logger.exception('Deletion of %s %d failed', kind, item_id)
+            # Released such that requesting the deletion again resumes it right away.
+            model = Hike if kind == 'hike' else Track
+            with Session(get_engine()) as session:
+                session.execute(
+                    update(model)
+                    .where(model.id == item_id)
+                    .values(deletion_claimed=None)
+                    .execution_options(synchronize_session=False)
+                )
+                session.commit()
+
+
+def start(kind: str, item_id: int) -> bool:
+    '''
+    Start deleting a hike or track (`kind` is `hike` or `track`) already marked as `deleting` on a
+    background thread. Returns False if a worker is already deleting it.
+    '''
+    model = Hike if kind == 'hike' else Track
+    with Session(get_engine()) as session:
+        if not _claim(session, model, item_id):
+            return False
+    app = flask.current_app._get_current_object()  # pylint: disable=protected-access
+    thread = threading.Thread(
+        target=_worker,
+        args=(app, kind, item_id),
+        name=f'delete-{kind}-{item_id}',
+        daemon=True,
+    )
+    thread.start()
+    return True
+
+
+def status(session: Session, kind: str, item_id: int) -> Dict[str, object]:
+    '''
+    Progress of the deletion of a hike or track, derived from the rows left in the database. The
+    state is `present` when no deletion was requested and `deleted` once it completed.
+    '''
+    model = Hike if kind == 'hike' else Track
+    deleting = session.execute(select(model.deleting).where(model.id == item_id)).scalar()
+    if deleting is None:
+        return {'state': 'deleted', 'remaining': {}}
+    remaining = {}
+    for name, _, ids_query, _ in _steps(kind, session, item_id):
+        query = select(func.count()).select_from(ids_query.subquery())
+        remaining[name] = session.execute(query).scalar()
+    return {'state': 'deleting' if deleting else 'present', 'remaining': remaining}
@@ -0,0 +1,95 @@
+'''
+Vectorized geodesic computations and downsampling of track data.
+'''
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+
+
+def haversine(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray,
+              lon2: np.ndarray) -> np.ndarray:
+    ''' Great circle distance in meters between coordinates given in degrees. '''
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    sin_dlat = np.sin((lat2 - lat1) / 2)
+    sin_dlon = np.sin((lon2 - lon1) / 2)
+    hav = sin_dlat * sin_dlat + np.cos(lat1) * np.cos(lat2) * sin_dlon * sin_dlon
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0)))
+
+
+def cumulative_distance(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    ''' Distance along the path at every point, starting at 0. '''
+    ret = np.zeros(len(lat), dtype=np.float64)
+    if len(lat) > 1:
+        np.cumsum(haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]), out=ret[1:])
+    return ret
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets downsampling, returns the indices of the points to keep. The
+    first and last points are always kept; `x` must be sorted.
+    '''
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+    ret = np.empty(threshold, dtype=np.int64)
+    ret[0] = 0
+    ret[-1] = length - 1
+    # Bucket edges over the points between the first and the last one.
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < threshold - 1:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs(
+            (x[selected] - avg_x) * (bucket_y - y[selected])
+            - (x[selected] - bucket_x) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        ret[i + 1] = selected
+    return ret
+
+
+def simplify(lat: np.ndarray, lon: np.ndarray, tolerance: float) -> np.ndarray:
+    '''
+    Douglas-Peucker simplification of a path, returns the indices of the points to keep. Points
+    are projected equirectangularly around the path, `tolerance` is in meters.
+    '''
+    length = len(lat)
+    if length < 3 or tolerance <= 0:
+        return np.arange(length)
+    scale = np.cos(np.radians(np.mean(lat)))
+    x = np.radians(lon) * EARTH_RADIUS * scale
+    y = np.radians(lat) * EARTH_RADIUS
+    keep = np.zeros(length, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, length - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        d_x = x[last] - x[first]
+        d_y = y[last] - y[first]
+        p_x = x[first + 1:last] - x[first]
+        p_y = y[first + 1:last] - y[first]
+        norm = d_x * d_x + d_y * d_y
+        if norm == 0:
+            dist = np.hypot(p_x, p_y)
+        else:
+            ratio = np.clip((p_x * d_x + p_y * d_y) / norm, 0.0, 1.0)
+            dist = np.hypot(p_x - ratio * d_x, p_y - ratio * d_y)
+        index = int(np.argmax(dist))
+        if dist[index] > tolerance:
+            index += first + 1
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return np.flatnonzero(keep)
@@ -0,0 +1,116 @@
+'''
+Place pictures on the map by interpolating their timestamps against the hike's track data.
+'''
+
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.db.bulk import bulk_update
+from src.db.models import Picture
+from src.db.points import hike_segments
+
+# Pictures taken further than this (seconds) from any track point are left without coordinates.
+MAX_GAP = 30 * 60
+
+
+class TrackTimeline:
+    ''' All points of a hike merged into arrays sorted by time. '''
+
+    def __init__(self, time: np.ndarray, segment: np.ndarray, latitude: np.ndarray,
+                 longitude: np.ndarray, elevation: np.ndarray) -> None:
+        order = np.argsort(time, kind='stable')
+        self.time = time[order]
+        self.segment = segment[order]
+        self.latitude = latitude[order]
+        self.longitude = longitude[order]
+        self.elevation = elevation[order]
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def from_hike(cls, session: Session, hike_id: int) -> 'TrackTimeline':
+        ''' Load the points of the hike with a timestamp and coordinates. '''
+        segments = hike_segments(session, hike_id)
+        if not segments:
+            empty = np.empty(0)
+            return cls(empty, empty.astype(np.int64), empty, empty, empty)
+        time = np.concatenate([x.time for x in segments])
+        segment = np.concatenate([np.full(len(x), x.segment, dtype=np.int64) for x in segments])
+        latitude = np.concatenate([x.latitude for x in segments])
+        longitude = np.concatenate([x.longitude for x in segments])
+        elevation = np.concatenate([x.elevation for x in segments])
+        valid = ~(np.isnan(time) | np.isnan(latitude) | np.isnan(longitude))
+        return cls(time[valid], segment[valid], latitude[valid], longitude[valid],
+                   elevation[valid])
+
+    def locate(self, times: np.ndarray) -> Dict[str, np.ndarray]:
+        '''
+        Interpolate coordinates at `times` (POSIX timestamps). Times between two segments snap to
+        the nearest point, as the track between them is unknown. Coordinates of times without a
+        point within `MAX_GAP` are NaN.
+        '''
+        count = len(self.time)
+        nan = np.full(len(times), np.nan)
+        if count == 0:
+            return {'latitude': nan, 'longitude': nan, 'elevation': nan}
+        if count == 1:
+            idx = np.zeros(len(times), dtype=np.int64)
+            before, after, frac = idx, idx, np.zeros(len(times))
+        else:
+            after = np.clip(np.searchsorted(self.time, times, side='right'), 1, count - 1)
+            before = after - 1
+            span = self.time[after] - self.time[before]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                frac = np.where(span > 0, (times - self.time[before]) / span, 0.0)
+            frac = np.clip(frac, 0.0, 1.0)
+            gap = self.segment[before] != self.segment[after]
+            frac = np.where(gap, np.round(frac), frac)
+
+        # Also within the track, e.g. a long gap between two segments.
+        nearest = np.minimum(np.abs(times - self.time[before]), np.abs(times - self.time[after]))
+        too_far = (nearest > MAX_GAP) | np.isnan(times)
+
+        def _interp(values: np.ndarray) -> np.ndarray:
+            ret = values[before] + (values[after] - values[before]) * frac
+            return np.where(too_far, np.nan, ret)
+
+        return {
+            'latitude': _interp(self.latitude),
+            'longitude': _interp(self.longitude),
+            'elevation': _interp(self.elevation),
+        }
+
+
+def _nullable(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def geotag_hike(session: Session, hike_id: int) -> int:
+    '''
+    Set the coordinates of every picture of the hike with batched updates. Returns the
+    number of pictures placed on the track.
+    '''
+    pics = session.execute(
+        select(Picture.id, Picture.time)
+        .where(Picture.parent == hike_id)
+    ).all()
+    if not pics:
+        return 0
+    timeline = TrackTimeline.from_hike(session, hike_id)
+    times = np.array([x[1].timestamp() if x[1] is not None else np.nan for x in pics])
+    coords = timeline.locate(times)
+
+    rows: List[Dict[str, object]] = []
+    for i, pic in enumerate(pics):
+        rows.append({
+            'id': pic[0],
+            'latitude': _nullable(coords['latitude'][i]),
+            'longitude': _nullable(coords['longitude'][i]),
+            'elevation': _nullable(coords['elevation'][i]),
+        })
+    bulk_update(session, Picture.__table__, rows)
+    return int(np.count_nonzero(~np.isnan(coords['latitude'])))
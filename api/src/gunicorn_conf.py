@@ -0,0 +1,78 @@
+'''
+Gunicorn settings, used with `gunicorn -c python:src.gunicorn_conf 'src.main:create_app()'`.
+
+With `APP_MODE=production` the app is served by several threaded workers sized from the CPU count,
+such that a slow picture download or a large track request does not block the whole API. Any other
+mode keeps a single worker, as used while developing.
+'''
+
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+from src.common import GLOBALS
+
+_PRODUCTION = GLOBALS.get_env('app', 'mode', 'development') == 'production'
+_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+
+bind = '0.0.0.0:5000'
+accesslog = '-'
+
+# Threads wait on the database (picture blobs, track points) most of the time, so several threads
+# per process keep the CPU busy. Keep threads at or below the SQLAlchemy pool size (5).
+worker_class = 'gthread'
+workers = GLOBALS.get_env_int('server', 'workers', 2 * _CPUS + 1 if _PRODUCTION else 1)
+threads = GLOBALS.get_env_int('server', 'threads', 4 if _PRODUCTION else 1)
+
+# Import the app once in the master so workers fork with it loaded (faster boot, shared pages).
+preload_app = _PRODUCTION
+
+keepalive = GLOBALS.get_env_int('server', 'keepalive', 5)
+timeout = GLOBALS.get_env_int('server', 'timeout', 120)
+graceful_timeout = 30
+
+# Heartbeat files on a tmpfs, docker's overlay filesystem can stall the worker heartbeat.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Recycle workers now and then to bound memory growth (e.g. the response cache, decoded images).
+max_requests = 2000 if _PRODUCTION else 0
+max_requests_jitter = 200 if _PRODUCTION else 0
+
+# Every worker parses uploaded GPX files on its own process pool (see `src.importers.parallel`),
+# share the cores among workers rather than starting a pool of every core in each of them.
+os.environ.setdefault('IMPORT_WORKERS', str(max(1, _CPUS // max(1, workers))))
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    ''' Drop connections inherited from the master, each worker needs its own pool. '''
+    # pylint: disable=import-outside-toplevel
+    from src.db.core import get_primary_engine, get_replica_engine
+    for engine in (get_primary_engine(), get_replica_engine()):
+        if engine is not None:
+            engine.dispose(close=False)
+
+
+def worker_exit(server, worker):  # pylint: disable=unused-argument
+    ''' Stop the GPX parsing processes of the worker. '''
+    from src.importers import parallel  # pylint: disable=import-outside-toplevel
+    parallel.shutdown()
+
+
+# Workers write their metrics to files in this directory, aggregated by `/metrics`. It has to be
+# set before the app (and so `prometheus_client`) is imported.
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', str(Path(worker_tmp_dir or tempfile.gettempdir(), 'api-metrics')))
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    ''' Start with empty metrics, files of a previous run would be aggregated otherwise. '''
+    path = Path(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    ''' Drop the live gauges (e.g. in-flight requests) of a worker which exited. '''
+    from prometheus_client import multiprocess  # pylint: disable=import-outside-toplevel
+    multiprocess.mark_process_dead(worker.pid)
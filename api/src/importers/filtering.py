@@ -0,0 +1,157 @@
+'''
+Optional clean up of track segments at import time, vectorized over the points of a segment.
+
+Stages, enabled by `IMPORT_FILTER` as a comma separated list, run in this order:
+
+- `speed`: drop fixes reached at an impossible speed and left at one, i.e. single point jumps.
+- `stationary`: collapse the fixes recorded while staying in place (e.g. at camp) into a single
+  location, keeping a fix every `STATIONARY_INTERVAL` seconds such that pictures taken meanwhile
+  are still geotagged.
+- `elevation`: smooth elevations with a moving average.
+
+Points without a time or coordinates are kept as is.
+'''
+
+from typing import TYPE_CHECKING, NamedTuple, Tuple
+
+import numpy as np
+
+from src import geo
+from src.common import GLOBALS
+
+if TYPE_CHECKING:
+    from src.importers.parallel import ParsedSegment
+
+STAGES = ('speed', 'stationary', 'elevation')
+
+# Meters per second above which a fix is a glitch, 180 km/h.
+MAX_SPEED_DEFAULT = 50
+# Meters a device may drift while in place.
+STATIONARY_RADIUS_DEFAULT = 10
+# Seconds within `STATIONARY_RADIUS` for a fix to be part of a stay.
+STATIONARY_WINDOW = 60
+# Seconds between the fixes kept of a stay.
+STATIONARY_INTERVAL = 300
+# Points averaged when smoothing elevations.
+ELEVATION_WINDOW_DEFAULT = 5
+
+
+class FilterSettings(NamedTuple):
+    ''' Stages to run, in `STAGES` order, and their parameters. '''
+    stages: Tuple[str, ...] = ()
+    max_speed: float = MAX_SPEED_DEFAULT
+    stationary_radius: float = STATIONARY_RADIUS_DEFAULT
+    elevation_window: int = ELEVATION_WINDOW_DEFAULT
+
+
+def filter_settings() -> FilterSettings:
+    '''
+    Settings of the import filter from the environment: `IMPORT_FILTER` (none by default),
+    `IMPORT_MAX_SPEED`, `IMPORT_STATIONARY_RADIUS` and `IMPORT_ELEVATION_WINDOW`.
+    '''
+    stages = GLOBALS.get_env('import', 'filter', '')
+    stages = tuple(x.strip() for x in stages.split(',') if x.strip())
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError(f'Unknown import filter "{stage}"')
+    return FilterSettings(
+        stages=tuple(x for x in STAGES if x in stages),
+        max_speed=GLOBALS.get_env_int('import', 'max_speed', MAX_SPEED_DEFAULT),
+        stationary_radius=GLOBALS.get_env_int(
+            'import', 'stationary_radius', STATIONARY_RADIUS_DEFAULT),
+        elevation_window=GLOBALS.get_env_int(
+            'import', 'elevation_window', ELEVATION_WINDOW_DEFAULT),
+    )
+
+
+def _timed(seg: 'ParsedSegment', keep: np.ndarray) -> np.ndarray:
+    ''' Indices of the kept points with a time and coordinates, ordered by time. '''
+    valid = keep & ~(np.isnan(seg.time) | np.isnan(seg.latitude) | np.isnan(seg.longitude))
+    index = np.flatnonzero(valid)
+    return index[np.argsort(seg.time[index], kind='stable')]
+
+
+def drop_impossible(seg: 'ParsedSegment', keep: np.ndarray, max_speed: float) -> None:
+    '''
+    Unset `keep` of the fixes both reached and left faster than `max_speed` meters per second,
+    repeated until no fix is. A real jump in the recording is only fast in one direction, the first
+    and last fix, with a single leg, are therefore always kept.
+    '''
+    index = _timed(seg, keep)
+    while len(index) >= 3:
+        lat = seg.latitude[index]
+        lon = seg.longitude[index]
+        dist = geo.haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        elapsed = np.diff(seg.time[index])
+        fast = np.where(elapsed > 0, dist > max_speed * elapsed, dist > 0)
+        bad = np.concatenate(([False], fast)) & np.concatenate((fast, [False]))
+        if not bad.any():
+            return
+        keep[index[bad]] = False
+        index = index[~bad]
+
+
+def collapse_stationary(seg: 'ParsedSegment', keep: np.ndarray, radius: float) -> None:
+    '''
+    Move the fixes of every stay to the stay's median location and elevation, and unset `keep` of
+    all but one fix every `STATIONARY_INTERVAL` seconds and the last one. A fix is part of a stay
+    along with the fixes of the preceding `STATIONARY_WINDOW` seconds when it is within `radius`
+    meters of the first of them.
+    '''
+    index = _timed(seg, keep)
+    if len(index) < 3:
+        return
+    time = seg.time[index]
+    lat = seg.latitude[index]
+    lon = seg.longitude[index]
+    first = np.searchsorted(time, time - STATIONARY_WINDOW, side='left')
+    # Sparse recordings, without fixes covering the window, are never stationary.
+    still = (geo.haversine(lat[first], lon[first], lat, lon) <= radius)
+    still &= time - time[first] >= STATIONARY_WINDOW / 2
+    if not still.any():
+        return
+    member = np.zeros(len(index) + 1, dtype=np.int64)
+    np.add.at(member, first[still], 1)
+    np.add.at(member, np.flatnonzero(still) + 1, -1)
+    member = np.cumsum(member[:-1]) > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], member, [False])).astype(np.int8)))
+    for start, end in zip(edges[::2], edges[1::2]):
+        stay = index[start:end]
+        seg.latitude[stay] = np.median(seg.latitude[stay])
+        seg.longitude[stay] = np.median(seg.longitude[stay])
+        elevation = seg.elevation[stay]
+        if not np.isnan(elevation).all():
+            seg.elevation[stay] = np.nanmedian(elevation)
+        bucket = (time[start:end] - time[start]) // STATIONARY_INTERVAL
+        kept = np.concatenate(([True], bucket[1:] != bucket[:-1]))
+        kept[-1] = True
+        keep[stay[~kept]] = False
+
+
+def smooth_elevation(seg: 'ParsedSegment', keep: np.ndarray, window: int) -> None:
+    ''' Replace the elevations of the kept points by their centered moving average. '''
+    index = _timed(seg, keep)
+    index = index[~np.isnan(seg.elevation[index])]
+    if window < 2 or len(index) < 2:
+        return
+    kernel = np.ones(window)
+    total = np.convolve(seg.elevation[index], kernel, mode='same')
+    count = np.convolve(np.ones(len(index)), kernel, mode='same')
+    seg.elevation[index] = total / count
+
+
+def filter_segment(seg: 'ParsedSegment', settings: FilterSettings) -> 'ParsedSegment':
+    ''' Run the stages of `settings` on a copy of the segment, its points stay in file order. '''
+    if not settings.stages or not len(seg):
+        return seg
+    seg = type(seg)(*(x.copy() for x in seg))
+    keep = np.ones(len(seg), dtype=bool)
+    if 'speed' in settings.stages:
+        drop_impossible(seg, keep, settings.max_speed)
+    if 'stationary' in settings.stages:
+        collapse_stationary(seg, keep, settings.stationary_radius)
+    if 'elevation' in settings.stages:
+        smooth_elevation(seg, keep, settings.elevation_window)
+    if keep.all():
+        return seg
+    return type(seg)(*(x[keep] for x in seg))
@@ -0,0 +1,179 @@
+'''
+Parse GPX files on a pool of processes. Parsing is CPU bound Python, so a multi-file import only
+uses more than one core when the files are handed to separate processes.
+
+Tracks are returned as arrays per segment rather than as `GpxTrackPoint` objects, which keeps the
+results cheap to send back to the calling process. Tracks and waypoints are fingerprinted with a
+hash of their content, such that re-importing a file only writes what changed. Segments are then
+cleaned up by the stages of `src.importers.filtering` enabled.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.common import GLOBALS
+from src.importers import filtering, gpx
+
+
+class ParsedSegment(NamedTuple):
+    ''' Points of a track segment in file order. Times are POSIX timestamps, missing are NaN. '''
+    time: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    elevation: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+class ParsedTrack(NamedTuple):
+    '''
+    Recorded track with its filtered segments as arrays, a hash identifying its content as
+    recorded, the number of points dropped by the filter and the summaries of the recorded
+    segments (see `summarize`).
+    '''
+    name: Optional[str]
+    description: Optional[str]
+    segments: List[ParsedSegment]
+    fingerprint: str
+    dropped: int = 0
+    summaries: Tuple[np.ndarray, ...] = ()
+
+
+ParsedItem = Union[gpx.GpxWaypoint, ParsedTrack]
+
+# Difference per point allowed between the sums of two summaries of the same points, covering the
+# least precise storage of every channel: whole seconds and single precision floats on MySQL.
+SUMMARY_TOLERANCE = np.array([1.0, 1e-5, 1e-5, 0.1])
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _nan(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+def _segment(item: gpx.GpxTrackSegment) -> ParsedSegment:
+    points = list(item)
+    return ParsedSegment(
+        time=np.array([x.time.timestamp() if x.time is not None else np.nan for x in points],
+                      dtype=np.float64),
+        latitude=np.array([_nan(x.coords[0]) for x in points], dtype=np.float64),
+        longitude=np.array([_nan(x.coords[1]) for x in points], dtype=np.float64),
+        elevation=np.array([_nan(x.coords[2]) for x in points], dtype=np.float64),
+    )
+
+
+def _track_fingerprint(name: Optional[str], description: Optional[str],
+                       segments: List[ParsedSegment]) -> str:
+    hasher = hashlib.sha256(repr((name, description, len(segments))).encode())
+    for seg in segments:
+        hasher.update(len(seg).to_bytes(8, 'little'))
+        for values in seg:
+            hasher.update(values.tobytes())
+    return hasher.hexdigest()
+
+
+def summarize(channels: Sequence[np.ndarray]) -> np.ndarray:
+    '''
+    Number of values present and their sum for every channel (time, latitude, longitude and
+    elevation) of a segment. Unlike the fingerprint, a summary only changes within a known bound
+    when points are stored with less precision, so points stored before tracks were fingerprinted
+    can still be compared with a file, see `same_summary`.
+    '''
+    ret = []
+    for values in channels:
+        values = np.asarray(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        ret += [np.count_nonzero(present), values[present].sum()]
+    return np.array(ret, dtype=np.float64)
+
+
+def same_summary(first: np.ndarray, second: np.ndarray) -> bool:
+    ''' Whether two summaries are of the same points, up to `SUMMARY_TOLERANCE`. '''
+    counts = first[0::2]
+    if not np.array_equal(counts, second[0::2]):
+        return False
+    return bool(np.all(np.abs(first[1::2] - second[1::2]) <= counts * SUMMARY_TOLERANCE))
+
+
+def waypoint_fingerprint(item: gpx.GpxWaypoint) -> str:
+    ''' Hash identifying the content of a waypoint. '''
+    time = item.time.timestamp() if item.time is not None else None
+    data = repr((item.name, item.description, time, item.coords))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def parse(data: bytes,
+          settings: Optional[filtering.FilterSettings] = None) -> List[ParsedItem]:
+    '''
+    Parse a GPX file into its waypoints and tracks, in file order. Segments are filtered with
+    `settings`, those of the environment by default.
+    '''
+    if settings is None:
+        settings = filtering.filter_settings()
+    ret: List[ParsedItem] = []
+    for item in gpx.import_file(data):
+        if isinstance(item, gpx.GpxTrack):
+            segments = list(map(_segment, item))
+            fingerprint = _track_fingerprint(item.name, item.description, segments)
+            summaries = tuple(map(summarize, segments))
+            filtered = [filtering.filter_segment(x, settings) for x in segments]
+            dropped = sum(map(len, segments)) - sum(map(len, filtered))
+            ret.append(ParsedTrack(item.name, item.description, filtered, fingerprint, dropped,
+                                   summaries))
+        elif isinstance(item, gpx.GpxWaypoint):
+            ret.append(item)
+        else:
+            # Outside of the app in pool processes, so not `GLOBALS.logger`.
+            logging.getLogger(__name__).warning('Unhandled GpxType: %s', type(item))
+    return ret
+
+
+def pool_size() -> int:
+    '''
+    Number of processes used to parse files, `IMPORT_WORKERS` or the number of cores. Every
+    gunicorn worker has its own pool, so `src.gunicorn_conf` shares the cores among them.
+    '''
+    return max(1, GLOBALS.get_env_int('import', 'workers', os.cpu_count() or 1))
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL  # pylint: disable=global-statement
+    with _POOL_LOCK:
+        if _POOL is None:
+            # Workers are spawned rather than forked, as forking the threaded server process is
+            # unsafe for the locks and connections it holds.
+            context = multiprocessing.get_context('spawn')
+            _POOL = ProcessPoolExecutor(pool_size(), mp_context=context)
+        return _POOL
+
+
+def shutdown() -> None:
+    ''' Stop the processes of the pool, if started. Called when a gunicorn worker exits. '''
+    global _POOL  # pylint: disable=global-statement
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+def parse_files(files: Sequence[bytes]) -> List[List[ParsedItem]]:
+    '''
+    Parse several GPX files, on the process pool when there is more than one. Results are in the
+    order of `files`.
+    '''
+    # Read once here rather than by every worker.
+    parse_ = functools.partial(parse, settings=filtering.filter_settings())
+    if len(files) < 2 or pool_size() < 2:
+        return list(map(parse_, files))
+    return list(_pool().map(parse_, files))
@@ -0,0 +1,246 @@
+'''
+Per-request performance instrumentation.
+
+Every request records its wall time, the time spent in SQL statements (through engine events),
+the number of statements and rows, the time spent in named sections such as ImageMagick calls
+(see `timed`) and the number of bytes sent. The totals are returned in a `Server-Timing` header
+and logged as one JSON line once the response was sent.
+
+Statements can also be counted for any block of code (see `count_queries` and `query_limit`), e.g.
+to bound the statements issued by a route in tests. In development mode every request is counted
+and a warning is logged if it repeats a statement with different parameters, the pattern of
+queries issued per row of an earlier result.
+'''
+
+from contextlib import contextmanager
+import contextvars
+import functools
+import json
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+_T = TypeVar('_T')
+
+# Number of executions of the same statement with different parameters considered a repetition.
+REPEAT_THRESHOLD = 5
+
+
+class QueryLimitExceeded(AssertionError):
+    ''' More statements were issued than allowed by `count_queries` or `query_limit`. '''
+
+
+class QueryCounter:
+    ''' Statements issued while counting. '''
+
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+        self._parameters: Dict[str, Set[str]] = {}
+
+    @property
+    def count(self) -> int:
+        ''' Number of statements issued. '''
+        return len(self.statements)
+
+    def add(self, statement: str, parameters, executemany: bool) -> None:
+        ''' Record an issued statement. '''
+        self.statements.append(statement)
+        # Batches of parameters are the remedy of repetitions, not worth the cost of their repr.
+        if not executemany:
+            self._parameters.setdefault(statement, set()).add(repr(parameters))
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        ''' Statements issued with at least `threshold` different parameters, with the count. '''
+        return [
+            (statement, len(params))
+            for statement, params in self._parameters.items()
+            if len(params) >= threshold
+        ]
+
+
+class RequestStats:
+    ''' Totals collected while handling a request. '''
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.sql_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.timers: Dict[str, float] = {}
+        self.bytes = 0
+        self.queries: Optional[QueryCounter] = None
+
+    @property
+    def elapsed(self) -> float:
+        ''' Seconds since the request started. '''
+        return time.perf_counter() - self.start
+
+    def add_time(self, name: str, seconds: float) -> None:
+        ''' Add to the time spent in a named section. '''
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+
+_CURRENT: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    'request_stats', default=None)
+_COUNTERS: contextvars.ContextVar[Tuple[QueryCounter, ...]] = contextvars.ContextVar(
+    'query_counters', default=())
+
+
+def current() -> Optional[RequestStats]:
+    ''' Stats of the request being handled, None outside of requests. '''
+    return _CURRENT.get()
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    ''' Count the time spent within the block towards the section `name` of the request. '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _CURRENT.get()
+        if stats is not None:
+            stats.add_time(name, time.perf_counter() - start)
+
+
+@contextmanager
+def count_queries(limit: Optional[int] = None) -> Iterator[QueryCounter]:
+    '''
+    Count the statements issued within the block, by any engine. Raises `QueryLimitExceeded` when
+    leaving the block if more than `limit` statements were issued.
+
+        with count_queries(limit=2) as counter:
+            client.get('/hikes/1')
+    '''
+    counter = QueryCounter()
+    token = _COUNTERS.set(_COUNTERS.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _COUNTERS.reset(token)
+    if limit is not None and counter.count > limit:
+        listing = '\n'.join(f'  {x}' for x in counter.statements)
+        raise QueryLimitExceeded(
+            f'{counter.count} statements issued, expected at most {limit}:\n{listing}')
+
+
+def query_limit(limit: int) -> Callable[[Callable[..., _T]], Callable[..., _T]]:
+    ''' Make the decorated function raise `QueryLimitExceeded` past `limit` statements. '''
+    def _decorator(func: Callable[..., _T]) -> Callable[..., _T]:
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs) -> _T:
+            with count_queries(limit):
+                return func(*args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=unused-argument,too-many-arguments
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=unused-argument,too-many-arguments
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    for counter in _COUNTERS.get():
+        counter.add(statement, parameters, executemany)
+    stats = _CURRENT.get()
+    if stats is None:
+        return
+    if stats.queries is not None:
+        stats.queries.add(statement, parameters, executemany)
+    stats.sql_time += elapsed
+    stats.statements += 1
+    # Rows fetched by selects (or changed by DML) as reported by the driver, unknown (-1) for
+    # server side cursors.
+    stats.rows += max(cursor.rowcount, 0)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    starts = context.connection.info.get('query_start') if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _count_bytes(chunks: Iterable[bytes], stats: RequestStats) -> Iterator[bytes]:
+    for chunk in chunks:
+        stats.bytes += len(chunk)
+        yield chunk
+
+
+def _ms(seconds: float) -> str:
+    return f'{seconds * 1000:.1f}'
+
+
+def server_timing(stats: RequestStats) -> str:
+    ''' Format the stats as a `Server-Timing` header value. '''
+    ret = [
+        f'app;dur={_ms(stats.elapsed)}',
+        f'db;dur={_ms(stats.sql_time)};desc="statements={stats.statements} rows={stats.rows}"',
+    ]
+    ret.extend(f'{name};dur={_ms(value)}' for name, value in sorted(stats.timers.items()))
+    return ', '.join(ret)
+
+
+def init_app(app: flask.Flask) -> None:
+    '''
+    Instrument the requests of the app. Call before registering other `after_request` hooks, as
+    hooks run in reverse order and the bytes sent are counted after e.g. compression.
+    '''
+    def _before():
+        stats = RequestStats()
+        if app.debug:
+            stats.queries = QueryCounter()
+        _CURRENT.set(stats)
+
+    def _after(response: flask.Response) -> flask.Response:
+        stats = _CURRENT.get()
+        if stats is None:
+            return response
+        response.headers['Server-Timing'] = server_timing(stats)
+        if response.is_streamed:
+            response.response = _count_bytes(response.response, stats)
+        else:
+            stats.bytes = response.content_length or 0
+        endpoint = flask.request.endpoint
+        method = flask.request.method
+        path = flask.request.path
+        status = response.status_code
+        replica = flask.g.get('db_replica', False)
+
+        def _log():
+            app.logger.info('%s', json.dumps({
+                'event': 'request',
+                'method': method,
+                'path': path,
+                'endpoint': endpoint,
+                'status': status,
+                'replica': replica,
+                'wall_ms': round(stats.elapsed * 1000, 1),
+                'db_ms': round(stats.sql_time * 1000, 1),
+                'statements': stats.statements,
+                'rows': stats.rows,
+                'timers_ms': {k: round(v * 1000, 1) for k, v in stats.timers.items()},
+                'bytes': stats.bytes,
+            }))
+            for statement, count in stats.queries.repeated() if stats.queries else ():
+                app.logger.warning(
+                    'Statement repeated %d times with different parameters by %s %s: %s',
+                    count, method, path, ' '.join(statement.split()))
+        response.call_on_close(_log)
+        return response
+
+    def _teardown(_exc):
+        _CURRENT.set(None)
+
+    app.before_request(_before)
+    app.after_request(_after)
+    app.teardown_request(_teardown)
@@ -1,56 +1,91 @@
 '''
-Main entrypoint for the flask app.
+Main entrypoint for the flask app, created by `create_app`.
 '''
 
 import http
+import sys
 import traceback
+from typing import Optional
 
 from flask import Flask
 import flask.logging
 from flask_cors import CORS
-from jsonschema import ValidationError
 import werkzeug.exceptions
 import werkzeug.middleware.proxy_fix
 
+from src import instrumentation, metrics, replica
 from src.bp.hikes import bp_hikes
 from src.bp.pics import bp_pics
+from src.bp.tiles import bp_tiles
 from src.bp.time import bp_time
 from src.bp.tracks import bp_tracks
+from src.cache import RESPONSE_CACHE
 from src.common import GLOBALS, get_secret
-from src.db.core import JsonSerializer
+from src.compression import compress_response
+from src.db.core import JsonSerializer, init_engine
+from src.middleware import auth_as_admin
 
-app = Flask(__name__)
 
-if GLOBALS.get_env('app', 'mode') == 'production':
-    app.wsgi_app = werkzeug.middleware.proxy_fix.ProxyFix(
-        app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1,
-    )
+def _is_validation_error(error: Exception) -> bool:
+    # Only imported once a payload was validated, see `src.common.expects_json`.
+    jsonschema = sys.modules.get('jsonschema')
+    return jsonschema is not None and isinstance(error, jsonschema.ValidationError)
 
-app.debug = True
-app.json_encoder = JsonSerializer
-app.secret_key = GLOBALS.get_env('app', 'secretfile', 'my-definately-very-complex-secret')
-CORS(app)
 
-LOG = flask.logging.create_logger(app)
+def create_app(db_uri: Optional[str] = None) -> Flask:
+    '''
+    Create the app and the engine of its database, `db_uri` or the configured database otherwise.
+    '''
+    app = Flask(__name__)
 
+    if GLOBALS.get_env('app', 'mode') == 'production':
+        app.wsgi_app = werkzeug.middleware.proxy_fix.ProxyFix(
+            app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1,
+        )
 
-@app.route('/')
-def index():
-    return 'Hello World!'
+    app.debug = GLOBALS.get_env('app', 'mode') != 'production'
+    app.json_encoder = JsonSerializer
+    app.secret_key = GLOBALS.get_env('app', 'secretfile', 'my-definately-very-complex-secret')
+    CORS(app)
 
+    log = flask.logging.create_logger(app)
 
-@app.errorhandler(Exception)
-def errorhandler(error: Exception):
-    LOG.error('(%s) %s', type(error), ''.join(traceback.format_exception(error)))
-    code = http.HTTPStatus.INTERNAL_SERVER_ERROR
-    if isinstance(error, werkzeug.exceptions.HTTPException):
-        code = http.HTTPStatus(error.code)
-    if isinstance(error, ValidationError):
-        code = http.HTTPStatus.BAD_REQUEST
-    return {'message': str(error), 'code': code.value, 'reason': code.name}, code.value
+    @app.route('/')
+    def index():
+        return 'Hello World!'
 
+    @app.get('/cache/stats')
+    def cache_stats():
+        ''' Hit rate and size of this worker's response cache, for admins only. '''
+        auth_as_admin()
+        return RESPONSE_CACHE.stats
 
-app.register_blueprint(bp_hikes)
-app.register_blueprint(bp_tracks)
-app.register_blueprint(bp_pics)
-app.register_blueprint(bp_time)
+    @app.get('/metrics')
+    def prometheus_metrics():
+        ''' Metrics of all workers in the Prometheus text format. '''
+        return metrics.render()
+
+    @app.errorhandler(Exception)
+    def errorhandler(error: Exception):
+        log.error('(%s) %s', type(error), ''.join(traceback.format_exception(error)))
+        code = http.HTTPStatus.INTERNAL_SERVER_ERROR
+        if isinstance(error, werkzeug.exceptions.HTTPException):
+            code = http.HTTPStatus(error.code)
+        if _is_validation_error(error):
+            code = http.HTTPStatus.BAD_REQUEST
+        return {'message': str(error), 'code': code.value, 'reason': code.name}, code.value
+
+    # Registered first such that its `after_request` hook runs last.
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    replica.init_app(app)
+    app.after_request(compress_response)
+
+    app.register_blueprint(bp_hikes)
+    app.register_blueprint(bp_tracks)
+    app.register_blueprint(bp_pics)
+    app.register_blueprint(bp_time)
+    app.register_blueprint(bp_tiles)
+
+    init_engine(db_uri)
+    return app
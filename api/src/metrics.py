@@ -0,0 +1,117 @@
+'''
+Prometheus metrics of the app, served in the text format by `/metrics`.
+
+When served by several gunicorn workers `PROMETHEUS_MULTIPROC_DIR` is set (see
+`src.gunicorn_conf`), such that every worker writes its samples to files in that directory and a
+scrape, handled by any worker, aggregates the samples of all of them.
+'''
+
+import os
+import time
+
+import flask
+import prometheus_client as prom
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.db.core import get_engine, get_primary_engine
+from src.db.models import Hike, Picture, PictureData, Track
+
+# Blueprints reported by name, requests of other routes are labelled `app`.
+BLUEPRINTS = ('hikes', 'tracks', 'pics', 'time', 'tiles')
+
+REQUEST_LATENCY = prom.Histogram(
+    'api_request_duration_seconds', 'Time to handle a request, including streaming the body.',
+    ['blueprint', 'route', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+REQUESTS_IN_FLIGHT = prom.Gauge(
+    'api_requests_in_flight', 'Requests being handled.', ['blueprint'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_CHECKED_OUT = prom.Gauge(
+    'api_db_pool_checked_out', 'Database connections in use.', multiprocess_mode='livesum',
+)
+DB_POOL_SIZE = prom.Gauge(
+    'api_db_pool_size', 'Database connections kept open.', multiprocess_mode='livesum',
+)
+PICTURE_BYTES = prom.Counter('api_picture_bytes_served', 'Bytes of picture data sent.')
+GPX_POINTS = prom.Counter('api_gpx_points_imported', 'Track points imported from GPX files.')
+
+
+class _BacklogCollector:
+    ''' Work left for background routines, read from the database when scraped. '''
+
+    def collect(self):  # pylint: disable=missing-function-docstring
+        web = select(PictureData.parent).where(PictureData.resized == 'web')
+        with Session(get_engine()) as session:
+            pictures = session.execute(
+                select(func.count(Picture.id))
+                .where(Picture.id.not_in(web))
+            ).scalar()
+            hikes = session.execute(
+                select(func.count(Hike.id))
+                .where(Hike.deleting.is_(True))
+            ).scalar()
+            tracks = session.execute(
+                select(func.count(Track.id))
+                .where(Track.deleting.is_(True))
+            ).scalar()
+        yield GaugeMetricFamily(
+            'api_picture_processing_backlog', 'Pictures without a web version.', value=pictures)
+        ret = GaugeMetricFamily(
+            'api_deletion_backlog', 'Hikes and tracks waiting to be deleted.', labels=['kind'])
+        ret.add_metric(['hike'], hikes)
+        ret.add_metric(['track'], tracks)
+        yield ret
+
+
+def _blueprint() -> str:
+    ret = flask.request.blueprint
+    ret = ret.split('.')[0] if ret else ret
+    return ret if ret in BLUEPRINTS else 'app'
+
+
+def _update_pool() -> None:
+    pool = get_primary_engine().pool
+    if hasattr(pool, 'checkedout'):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_SIZE.set(pool.size())
+
+
+def render() -> flask.Response:
+    ''' Respond with the metrics of all workers in the Prometheus text format. '''
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prom.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prom.REGISTRY
+    backlog = prom.CollectorRegistry()
+    backlog.register(_BacklogCollector())
+    data = prom.generate_latest(registry) + prom.generate_latest(backlog)
+    return flask.Response(data, mimetype=prom.CONTENT_TYPE_LATEST)
+
+
+def init_app(app: flask.Flask) -> None:
+    ''' Record latency and in-flight counts of every request of the app. '''
+    def _before():
+        blueprint = _blueprint()
+        flask.g.metrics_start = (time.perf_counter(), blueprint)
+        REQUESTS_IN_FLIGHT.labels(blueprint).inc()
+        _update_pool()
+
+    def _teardown(_exc):
+        start = flask.g.pop('metrics_start', None)
+        if start is None:
+            return
+        rule = flask.request.url_rule
+        route = rule.rule if rule is not None else 'unmatched'
+        REQUEST_LATENCY.labels(start[1], route, flask.request.method).observe(
+            time.perf_counter() - start[0])
+        REQUESTS_IN_FLIGHT.labels(start[1]).dec()
+        _update_pool()
+
+    app.before_request(_before)
+    app.teardown_request(_teardown)
@@ -7,7 +7,7 @@ import werkzeug.exceptions
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from src.db.core import engine
+from src.db.core import get_engine
 from src.db.models import ApiSession
 
 
@@ -20,7 +20,7 @@ def auth_user():
         api_key = request.cookies['Api-Session']
     else:
         return
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         ret = session.execute(
             select(ApiSession)
             .where(ApiSession.key == api_key)
@@ -39,7 +39,7 @@ def auth_as_admin():
         api_key = request.cookies['Api-Session']
     else:
         raise werkzeug.exceptions.Unauthorized()
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         ret = session.execute(
             select(ApiSession)
             .where(ApiSession.key == api_key)
@@ -0,0 +1,26 @@
+"""Add revision column to hikes
+
+Revision ID: 5d3c1a9e7b42
+Revises: 73d1faeec3fd
+Create Date: 2026-10-19 09:00:12.402118
+
+"""
+from alembic import op
+from sqlalchemy import Column, Integer
+
+
+# revision identifiers, used by Alembic.
+revision = '5d3c1a9e7b42'
+down_revision = '73d1faeec3fd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('hikes', Column('revision', Integer, nullable=False, server_default='0'))
+    op.create_index('ix_trackdata_latitude_longitude', 'trackdata', ['latitude', 'longitude'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_trackdata_latitude_longitude', 'trackdata')
+    op.drop_column('hikes', 'revision')
@@ -0,0 +1,28 @@
+"""Add coordinate columns to pictures
+
+Revision ID: a81f4c2d9e03
+Revises: 5d3c1a9e7b42
+Create Date: 2026-10-19 09:30:41.118274
+
+"""
+from alembic import op
+from sqlalchemy import Column, Float
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81f4c2d9e03'
+down_revision = '5d3c1a9e7b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('pictures', Column('latitude', Float))
+    op.add_column('pictures', Column('longitude', Float))
+    op.add_column('pictures', Column('elevation', Float))
+
+
+def downgrade() -> None:
+    op.drop_column('pictures', 'latitude')
+    op.drop_column('pictures', 'longitude')
+    op.drop_column('pictures', 'elevation')
@@ -0,0 +1,26 @@
+"""Add deleting columns to hikes and tracks
+
+Revision ID: 3be7f0c5a614
+Revises: a81f4c2d9e03
+Create Date: 2026-10-19 10:00:07.563190
+
+"""
+from alembic import op
+from sqlalchemy import Boolean, Column, false
+
+
+# revision identifiers, used by Alembic.
+revision = '3be7f0c5a614'
+down_revision = 'a81f4c2d9e03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('hikes', Column('deleting', Boolean, nullable=False, server_default=false()))
+    op.add_column('tracks', Column('deleting', Boolean, nullable=False, server_default=false()))
+
+
+def downgrade() -> None:
+    op.drop_column('hikes', 'deleting')
+    op.drop_column('tracks', 'deleting')
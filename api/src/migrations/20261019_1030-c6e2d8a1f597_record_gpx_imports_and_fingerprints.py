@@ -0,0 +1,40 @@
+"""Record gpx imports and fingerprints
+
+Revision ID: c6e2d8a1f597
+Revises: 3be7f0c5a614
+Create Date: 2026-10-19 10:30:52.401836
+
+"""
+from alembic import op
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e2d8a1f597'
+down_revision = '3be7f0c5a614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'gpximports',
+        Column('id', Integer, primary_key=True),
+        Column('parent', Integer, ForeignKey('hikes.id', ondelete='CASCADE'), nullable=False),
+        Column('name', Text, nullable=False),
+        Column('sha', String(256), nullable=False),
+        Column('time', DateTime),
+        UniqueConstraint('parent', 'name'),
+    )
+    for table in ('tracks', 'waypoints'):
+        op.add_column(table, Column('source', Text))
+        op.add_column(table, Column('fingerprint', String(256)))
+        op.create_index(f'ix_{table}_parent_fingerprint', table, ['parent', 'fingerprint'])
+
+
+def downgrade() -> None:
+    for table in ('waypoints', 'tracks'):
+        op.drop_index(f'ix_{table}_parent_fingerprint', table_name=table)
+        op.drop_column(table, 'fingerprint')
+        op.drop_column(table, 'source')
+    op.drop_table('gpximports')
@@ -0,0 +1,166 @@
+"""Pack track points into segments
+
+Revision ID: e41b7a9c03d6
+Revises: c6e2d8a1f597
+Create Date: 2026-10-19 11:00:24.773519
+
+"""
+from datetime import datetime, timezone
+import struct
+import zlib
+
+from alembic import op
+import numpy as np
+from sqlalchemy import Column, DateTime, Float, Integer, LargeBinary, column, select, table
+
+from src.common import GLOBALS
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7a9c03d6'
+down_revision = 'c6e2d8a1f597'
+branch_labels = None
+depends_on = None
+
+_SEGMENTS = table(
+    'tracksegments',
+    column('id', Integer),
+    column('points', LargeBinary),
+    column('min_latitude', Float),
+    column('max_latitude', Float),
+    column('min_longitude', Float),
+    column('max_longitude', Float),
+)
+
+# Version 1 of the format of `src.db.trackpack`, frozen such that later versions do not change
+# what this migration writes or reads.
+_MAGIC = b'TP'
+_VERSION = 1
+_HEADER = struct.Struct('<2sBI')
+_SCALES = (1e3, 1e7, 1e7, 1e3)
+
+_DATA = table(
+    'trackdata',
+    column('id', Integer),
+    column('segment', Integer),
+    column('time', DateTime),
+    column('latitude', Float),
+    column('longitude', Float),
+    column('elevation', Float),
+)
+
+
+def _timestamp(value):
+    if value is None:
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _float(value):
+    return np.nan if value is None else value
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+def _pack(channels) -> bytes:
+    body = []
+    for scale, values in zip(_SCALES, channels):
+        missing = np.isnan(values)
+        ints = np.round(np.where(missing, 0.0, values) * scale).astype(np.int64)
+        body.append(np.packbits(missing).tobytes())
+        deltas = np.diff(ints, prepend=np.int64(0))
+        body.append(deltas.astype('<i8').view(np.uint8).reshape(-1, 8).T.tobytes())
+    return _HEADER.pack(_MAGIC, _VERSION, len(channels[0])) + zlib.compress(b''.join(body), 6)
+
+
+def _unpack(data: bytes):
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError('Invalid packed track data')
+    body = zlib.decompress(data[_HEADER.size:])
+    mask_size = (count + 7) // 8
+    offset = 0
+    channels = []
+    for scale in _SCALES:
+        mask = np.frombuffer(body, dtype=np.uint8, count=mask_size, offset=offset)
+        missing = np.unpackbits(mask, count=count).astype(bool)
+        offset += mask_size
+        shuffled = np.frombuffer(body[offset:offset + 8 * count], dtype=np.uint8)
+        deltas = shuffled.reshape(8, count).T.copy().view('<i8').ravel()
+        offset += 8 * count
+        values = np.cumsum(deltas) / scale
+        values[missing] = np.nan
+        channels.append(values)
+    return channels
+
+
+def _bounds(latitude, longitude):
+    valid = ~(np.isnan(latitude) | np.isnan(longitude))
+    if not valid.any():
+        return None
+    lat = latitude[valid]
+    lon = longitude[valid]
+    return (float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max()))
+
+
+def upgrade() -> None:
+    op.add_column('tracksegments', Column('points', LargeBinary(1 << 24)))
+    for name in ('min_latitude', 'max_latitude', 'min_longitude', 'max_longitude'):
+        op.add_column('tracksegments', Column(name, Float))
+
+    # Only with `TRACK_STORAGE=packed` (default), the points are otherwise kept as rows. Run the
+    # migration again (downgrade and upgrade) after changing the storage.
+    if GLOBALS.get_env('tracks', 'storage', 'packed') != 'packed':
+        return
+    # Convert the points of every segment, one segment per statement to bound memory use.
+    conn = op.get_bind()
+    seg_ids = conn.execute(select(_DATA.c.segment).distinct()).scalars().all()
+    for seg_id in seg_ids:
+        rows = conn.execute(
+            select(_DATA.c.time, _DATA.c.latitude, _DATA.c.longitude, _DATA.c.elevation)
+            .where(_DATA.c.segment == seg_id)
+            .order_by(_DATA.c.time, _DATA.c.id)
+        ).all()
+        channels = [
+            np.array([_timestamp(x[0]) for x in rows], dtype=np.float64),
+            np.array([_float(x[1]) for x in rows], dtype=np.float64),
+            np.array([_float(x[2]) for x in rows], dtype=np.float64),
+            np.array([_float(x[3]) for x in rows], dtype=np.float64),
+        ]
+        values = {'points': _pack(channels)}
+        bbox = _bounds(channels[1], channels[2])
+        if bbox is not None:
+            values.update(zip(('min_latitude', 'max_latitude', 'min_longitude', 'max_longitude'),
+                              bbox))
+        conn.execute(_SEGMENTS.update().where(_SEGMENTS.c.id == seg_id).values(**values))
+        conn.execute(_DATA.delete().where(_DATA.c.segment == seg_id))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    seg_ids = conn.execute(
+        select(_SEGMENTS.c.id)
+        .where(_SEGMENTS.c.points.isnot(None))
+    ).scalars().all()
+    for seg_id in seg_ids:
+        data = conn.execute(
+            select(_SEGMENTS.c.points)
+            .where(_SEGMENTS.c.id == seg_id)
+        ).scalar()
+        points = _unpack(data)
+        rows = [{
+            'segment': seg_id,
+            'time': (datetime.fromtimestamp(x[0], timezone.utc) if not np.isnan(x[0]) else None),
+            'latitude': _nullable(x[1]),
+            'longitude': _nullable(x[2]),
+            'elevation': _nullable(x[3]),
+        } for x in zip(*points)]
+        if rows:
+            conn.execute(_DATA.insert(), rows)
+
+    for name in ('max_longitude', 'min_longitude', 'max_latitude', 'min_latitude', 'points'):
+        op.drop_column('tracksegments', name)
@@ -0,0 +1,45 @@
+"""Store timestamps with time zone
+
+Revision ID: 5d9a3e7c21b8
+Revises: e41b7a9c03d6
+Create Date: 2026-10-19 11:30:18.930412
+
+"""
+from alembic import op
+from sqlalchemy import DateTime
+
+from src.db.custom import NATIVE_TZ_DIALECTS
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9a3e7c21b8'
+down_revision = 'e41b7a9c03d6'
+branch_labels = None
+depends_on = None
+
+# Columns of `AwareDateTime`, so far naive timestamps in UTC.
+COLUMNS = [
+    ('hikes', 'start'),
+    ('hikes', 'end'),
+    ('trackdata', 'time'),
+    ('waypoints', 'time'),
+    ('gpximports', 'time'),
+    ('pictures', 'time'),
+]
+
+
+def upgrade() -> None:
+    # Other dialects have no timestamp type with a time zone and keep naive UTC timestamps.
+    if op.get_bind().dialect.name not in NATIVE_TZ_DIALECTS:
+        return
+    for table, name in COLUMNS:
+        op.alter_column(table, name, type_=DateTime(timezone=True),
+                        postgresql_using=f'"{name}" AT TIME ZONE \'UTC\'')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name not in NATIVE_TZ_DIALECTS:
+        return
+    for table, name in COLUMNS:
+        op.alter_column(table, name, type_=DateTime(timezone=False),
+                        postgresql_using=f'"{name}" AT TIME ZONE \'UTC\'')
@@ -0,0 +1,23 @@
+"""Index track points by segment and time
+
+Revision ID: 8b4f6c2d9e13
+Revises: 5d9a3e7c21b8
+Create Date: 2026-10-19 12:00:41.517390
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4f6c2d9e13'
+down_revision = '5d9a3e7c21b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_trackdata_segment_time', 'trackdata', ['segment', 'time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_trackdata_segment_time', 'trackdata')
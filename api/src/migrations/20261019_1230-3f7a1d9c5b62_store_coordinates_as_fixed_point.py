@@ -0,0 +1,76 @@
+"""Store coordinates as fixed point
+
+Revision ID: 3f7a1d9c5b62
+Revises: 8b4f6c2d9e13
+Create Date: 2026-10-19 12:30:07.284611
+
+"""
+from alembic import op
+from sqlalchemy import Float, Integer, column, func, inspect, table
+
+from src.db.custom import COORDINATE_SCALE, ELEVATION_SCALE, coordinate_mode
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7a1d9c5b62'
+down_revision = '8b4f6c2d9e13'
+branch_labels = None
+depends_on = None
+
+# Columns of `FixedPoint` with their scale, so far floats.
+COLUMNS = {
+    'latitude': COORDINATE_SCALE,
+    'longitude': COORDINATE_SCALE,
+    'elevation': ELEVATION_SCALE,
+}
+TABLES = ('trackdata', 'waypoints')
+
+
+def _table(name: str):
+    return table(name, *(column(x, Float) for x in COLUMNS))
+
+
+def _alter_postgres(name: str, type_: str, using: str) -> None:
+    # All columns in a single statement, such that the table is rewritten only once.
+    changes = ', '.join(
+        f'ALTER COLUMN "{x}" TYPE {type_} USING {using.format(name=x, scale=scale)}'
+        for x, scale in COLUMNS.items())
+    op.execute(f'ALTER TABLE "{name}" {changes}')
+
+
+def _is_fixed(name: str) -> bool:
+    columns = {x['name']: x['type'] for x in inspect(op.get_bind()).get_columns(name)}
+    return isinstance(columns['latitude'], Integer)
+
+
+def upgrade() -> None:
+    # Only with `TRACK_COORDINATES=fixed`, the conversion is lossy.
+    if coordinate_mode() != 'fixed':
+        return
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for name in TABLES:
+        if _is_fixed(name):
+            continue
+        if postgres:
+            _alter_postgres(name, 'integer', 'round("{name}" * {scale})::integer')
+            continue
+        data = _table(name)
+        op.execute(data.update().values(
+            {x: func.round(data.c[x] * scale) for x, scale in COLUMNS.items()}))
+        for key in COLUMNS:
+            op.alter_column(name, key, existing_type=Float, type_=Integer)
+
+
+def downgrade() -> None:
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for name in TABLES:
+        if not _is_fixed(name):
+            continue
+        if postgres:
+            _alter_postgres(name, 'double precision', '"{name}"::double precision / {scale}')
+            continue
+        for key in COLUMNS:
+            op.alter_column(name, key, existing_type=Integer, type_=Float)
+        data = _table(name)
+        op.execute(data.update().values(
+            {x: data.c[x] / scale for x, scale in COLUMNS.items()}))
@@ -0,0 +1,28 @@
+"""Add deletion claims to hikes and tracks
+
+Revision ID: 7c1e5b9a4d20
+Revises: 3f7a1d9c5b62
+Create Date: 2026-10-19 13:00:41.208517
+
+"""
+from alembic import op
+from sqlalchemy import Column
+
+from src.db.custom import AwareDateTime
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e5b9a4d20'
+down_revision = '3f7a1d9c5b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('hikes', Column('deletion_claimed', AwareDateTime))
+    op.add_column('tracks', Column('deletion_claimed', AwareDateTime))
+
+
+def downgrade() -> None:
+    op.drop_column('hikes', 'deletion_claimed')
+    op.drop_column('tracks', 'deletion_claimed')
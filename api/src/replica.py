@@ -0,0 +1,137 @@
+'''
+Route the reads of anonymous visitors to a read replica of the database, see `DB_REPLICA_HOST`.
+
+Unauthenticated `GET` and `HEAD` requests use the replica (see `src.db.core.get_engine`), every
+other request uses the primary. Requests fall back to the primary:
+
+- after a mutation, for `DB_REPLICA_MAX_LAG` seconds plus a lag check, through a cookie set on the
+  response of the mutation such that its author reads their own writes;
+- while the replica lags behind the primary by more than `DB_REPLICA_MAX_LAG` seconds, or its lag
+  cannot be measured (e.g. it is down). The lag is measured at most every `LAG_CHECK_INTERVAL`
+  seconds per worker, by one request at a time while the others read from the primary. The probe
+  gives up after `src.db.core.REPLICA_CONNECT_TIMEOUT` seconds connecting and `LAG_PROBE_TIMEOUT`
+  seconds querying.
+
+Background threads (e.g. `src.deletion`) run outside of requests and always use the primary.
+'''
+
+import threading
+import time
+from typing import Callable, Optional
+
+import flask
+import sqlalchemy
+from sqlalchemy import text
+
+from src.common import GLOBALS
+from src.db.core import get_replica_engine, use_replica
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Set after a mutation, requests sending it read from the primary until it expires.
+READ_PRIMARY_COOKIE = 'read-primary'
+# Seconds a measured lag is trusted.
+LAG_CHECK_INTERVAL = 5
+# Seconds of lag above which reads go to the primary.
+MAX_LAG_DEFAULT = 5
+# Seconds the lag query may run, see `src.db.core.REPLICA_CONNECT_TIMEOUT` for connecting.
+LAG_PROBE_TIMEOUT = 1
+
+_POSTGRES_LAG = text('''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+''')
+
+
+def measure_lag(engine: sqlalchemy.engine.Engine) -> Optional[float]:
+    ''' Seconds the database of `engine` is behind its primary, None if unknown. '''
+    try:
+        with engine.connect() as conn, conn.begin():
+            dialect = engine.dialect.name
+            if dialect == 'postgresql':
+                conn.execute(text(f'SET LOCAL statement_timeout = {LAG_PROBE_TIMEOUT * 1000}'))
+                ret = conn.execute(_POSTGRES_LAG).scalar()
+            elif dialect == 'mysql':
+                row = conn.execute(text('SHOW SLAVE STATUS')).mappings().first()
+                # Not replicating, i.e. a primary.
+                ret = row['Seconds_Behind_Master'] if row is not None else 0
+            elif dialect == 'sqlite':
+                ret = 0
+            else:
+                return None
+    except sqlalchemy.exc.SQLAlchemyError:
+        return None
+    return float(ret) if ret is not None else None
+
+
+class LagMonitor:
+    '''
+    Lag of the replica, measured by `measure` at most every `interval` seconds. While a thread
+    measures it, the lag of other threads is unknown rather than waiting on the measurement.
+    '''
+
+    def __init__(self, measure: Callable[[], Optional[float]],
+                 interval: float = LAG_CHECK_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._measure = measure
+        self._interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._lag: Optional[float] = None
+        self._checked: Optional[float] = None
+        self._measuring = False
+
+    def lag(self) -> Optional[float]:
+        ''' Last measured lag in seconds, None if unknown or being measured. '''
+        with self._lock:
+            if self._measuring:
+                return None
+            if self._checked is not None and self._clock() - self._checked < self._interval:
+                return self._lag
+            self._measuring = True
+        ret = None
+        try:
+            ret = self._measure()
+        finally:
+            with self._lock:
+                self._lag = ret
+                self._checked = self._clock()
+                self._measuring = False
+        return ret
+
+
+def _authenticated() -> bool:
+    request = flask.request
+    return 'Api-Session' in request.headers or 'Api-Session' in request.cookies
+
+
+def init_app(app: flask.Flask) -> None:
+    ''' Route the anonymous reads of the app to the replica, if one is configured. '''
+    max_lag = GLOBALS.get_env_int('db', 'replica_max_lag', MAX_LAG_DEFAULT)
+    monitor = LagMonitor(lambda: measure_lag(get_replica_engine()))
+
+    def _before():
+        if get_replica_engine() is None:
+            return
+        request = flask.request
+        if request.method not in SAFE_METHODS or _authenticated():
+            return
+        if READ_PRIMARY_COOKIE in request.cookies:
+            return
+        lag = monitor.lag()
+        if lag is not None and lag <= max_lag:
+            use_replica()
+
+    def _after(response: flask.Response) -> flask.Response:
+        if get_replica_engine() is None:
+            return response
+        if flask.request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        response.set_cookie(READ_PRIMARY_COOKIE, '1', max_age=max_lag + LAG_CHECK_INTERVAL,
+                            httponly=True, samesite='Lax')
+        return response
+
+    app.before_request(_before)
+    app.after_request(_after)
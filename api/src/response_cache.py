@@ -0,0 +1,95 @@
+'''
+Cache of serialized responses for read-only routes returning data of a single hike.
+
+Responses are keyed by the route, hike id, revision of the hike and the query string. Every route
+changing the data of a hike bumps its revision (see `src.db.revision`), so no explicit
+invalidation is needed.
+
+Streamed responses (see `src.streaming`) are sent as they are encoded and stored once the last
+chunk was sent, unless larger than `MAX_STREAMED_BYTES`. Repeat requests are then served from the
+cache, precompressed.
+'''
+
+import functools
+import hashlib
+from typing import Iterable, Iterator, List, Optional
+import urllib.parse
+
+import flask
+from sqlalchemy.orm import Session
+import werkzeug.exceptions
+
+from src.cache import RESPONSE_CACHE
+from src.compression import precompressed
+from src.db.core import get_engine
+from src.db.revision import hike_revisions
+
+# Largest streamed body kept while sending it, larger ones are only streamed.
+MAX_STREAMED_BYTES = 16 << 20
+
+
+class _Uncacheable(Exception):
+    def __init__(self, response: flask.Response) -> None:
+        super().__init__()
+        self.response = response
+
+
+def _query_digest() -> str:
+    it_ = sorted(flask.request.args.items(multi=True))
+    return hashlib.sha256(urllib.parse.urlencode(it_).encode()).hexdigest()[:16]
+
+
+def _is_cacheable(response: flask.Response) -> bool:
+    return response.status_code == 200 and response.mimetype == 'application/json'
+
+
+def _tee(chunks: Iterable[bytes], key: str) -> Iterator[bytes]:
+    ''' Pass the chunks on, storing them under `key` once all of them were sent. '''
+    buf: Optional[List[bytes]] = []
+    size = 0
+    for chunk in chunks:
+        if buf is not None:
+            size += len(chunk)
+            if size > MAX_STREAMED_BYTES:
+                buf = None
+            else:
+                buf.append(chunk)
+        yield chunk
+    if buf is not None:
+        RESPONSE_CACHE.set(key, b''.join(buf))
+
+
+def cached_per_hike(view):
+    '''
+    Decorate a route taking a `hike_id` such that successful JSON responses, streamed or not, are
+    cached per hike revision. Hikes that do not exist or are being deleted are not found.
+    '''
+    @functools.wraps(view)
+    def _wrapper(hike_id: int, **kwargs):
+        with Session(get_engine()) as session:
+            revision = hike_revisions(session, [hike_id]).get(hike_id)
+        if revision is None:
+            raise werkzeug.exceptions.NotFound(f'Hike {hike_id} does not exist')
+
+        # Only for an entry evicted since checking for it.
+        def _build() -> bytes:
+            response = flask.current_app.make_response(view(hike_id=hike_id, **kwargs))
+            if not _is_cacheable(response):
+                raise _Uncacheable(response)
+            return response.get_data()
+
+        key = f'responses/{flask.request.endpoint}/hike-{hike_id}/{revision}/{_query_digest()}'
+        if not RESPONSE_CACHE.contains(key):
+            response = flask.current_app.make_response(view(hike_id=hike_id, **kwargs))
+            if not _is_cacheable(response):
+                return response
+            if response.is_streamed:
+                response.response = _tee(response.response, key)
+                return response
+            RESPONSE_CACHE.set(key, response.get_data())
+        try:
+            return precompressed(key, _build, 'application/json', cache=RESPONSE_CACHE)
+        except _Uncacheable as exc:
+            return exc.response
+
+    return _wrapper
@@ -0,0 +1,56 @@
+'''
+Incrementally encoded JSON responses, for results too large to build in memory at once.
+'''
+
+from datetime import datetime
+import json
+from typing import Any, Iterable, Iterator
+
+import flask
+
+GEOJSON_MIMETYPE = 'application/geo+json'
+
+# Encoded items are joined into chunks of about this many bytes before being sent.
+CHUNK_SIZE = 64 << 10
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(value: Any) -> str:
+    ''' Encode a value as compact JSON, with sorted keys like `flask.jsonify`. '''
+    return json.dumps(value, default=_default, sort_keys=True, separators=(',', ':'))
+
+
+def json_array(items: Iterable[Any]) -> Iterator[str]:
+    ''' Encode the items as a JSON array, one item at a time. '''
+    yield '['
+    for i, item in enumerate(items):
+        yield ',' + dumps(item) if i else dumps(item)
+    yield ']'
+
+
+def chunked(parts: Iterable[str]) -> Iterator[bytes]:
+    ''' Join small encoded parts into chunks of about `CHUNK_SIZE` bytes. '''
+    buf = []
+    size = 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buf).encode()
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf).encode()
+
+
+def stream(parts: Iterable[str], mimetype: str = 'application/json') -> flask.Response:
+    '''
+    Respond with the encoded parts as they are produced. The generator keeps the request context,
+    so it may hold a database session for the duration of the response.
+    '''
+    return flask.Response(flask.stream_with_context(chunked(parts)), mimetype=mimetype)
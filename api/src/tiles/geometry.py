@@ -0,0 +1,139 @@
+'''
+Geometry helpers for rendering slippy map tiles (web mercator projection, clipping and line
+simplification). Coordinates within a tile are expressed in tile units, `[0, extent)`.
+'''
+
+import math
+from typing import List, Tuple
+
+Point = Tuple[float, float]
+Line = List[Point]
+Bounds = Tuple[float, float, float, float]
+
+MAX_ZOOM = 22
+MAX_LATITUDE = 85.0511287798
+
+
+def valid_tile(zoom: int, x: int, y: int) -> bool:
+    ''' Check the tile coordinates exist at the zoom level. '''
+    if not 0 <= zoom <= MAX_ZOOM:
+        return False
+    size = 1 << zoom
+    return 0 <= x < size and 0 <= y < size
+
+
+def _tile_to_lonlat(zoom: int, x: float, y: float) -> Point:
+    size = 1 << zoom
+    lon = x / size * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / size))))
+    return lon, lat
+
+
+def tile_bounds(zoom: int, x: int, y: int, margin: float = 0.0) -> Bounds:
+    '''
+    Bounds of the tile as (min lon, min lat, max lon, max lat), grown by `margin` tile widths on
+    each side.
+    '''
+    min_lon, max_lat = _tile_to_lonlat(zoom, x - margin, y - margin)
+    max_lon, min_lat = _tile_to_lonlat(zoom, x + 1 + margin, y + 1 + margin)
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def project(lon: float, lat: float, zoom: int, x: int, y: int, extent: int) -> Point:
+    ''' Project a coordinate into the tile units of tile (`zoom`, `x`, `y`). '''
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    size = 1 << zoom
+    world_x = (lon + 180.0) / 360.0 * size
+    sin_lat = math.sin(math.radians(lat))
+    world_y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * size
+    return (world_x - x) * extent, (world_y - y) * extent
+
+
+def _clip_segment(p_0: Point, p_1: Point, low: float, high: float):
+    ''' Liang-Barsky clipping of a single segment, returns None when fully outside. '''
+    t_0, t_1 = 0.0, 1.0
+    d_x = p_1[0] - p_0[0]
+    d_y = p_1[1] - p_0[1]
+    checks = (
+        (-d_x, p_0[0] - low),
+        (d_x, high - p_0[0]),
+        (-d_y, p_0[1] - low),
+        (d_y, high - p_0[1]),
+    )
+    for p_val, q_val in checks:
+        if p_val == 0:
+            if q_val < 0:
+                return None
+            continue
+        ratio = q_val / p_val
+        if p_val < 0:
+            if ratio > t_1:
+                return None
+            t_0 = max(t_0, ratio)
+        else:
+            if ratio < t_0:
+                return None
+            t_1 = min(t_1, ratio)
+    start = (p_0[0] + t_0 * d_x, p_0[1] + t_0 * d_y)
+    end = (p_0[0] + t_1 * d_x, p_0[1] + t_1 * d_y)
+    return start, end, t_1 < 1.0
+
+
+def clip_line(line: Line, low: float, high: float) -> List[Line]:
+    ''' Clip a line to the square `[low, high]`, splitting it where it leaves the square. '''
+    if len(line) == 1:
+        point = line[0]
+        inside = low <= point[0] <= high and low <= point[1] <= high
+        return [[point]] if inside else []
+    ret: List[Line] = []
+    current: Line = []
+    for p_0, p_1 in zip(line, line[1:]):
+        clipped = _clip_segment(p_0, p_1, low, high)
+        if clipped is None:
+            if current:
+                ret.append(current)
+                current = []
+            continue
+        start, end, exits = clipped
+        if not current:
+            current.append(start)
+        current.append(end)
+        if exits:
+            ret.append(current)
+            current = []
+    if current:
+        ret.append(current)
+    return ret
+
+
+def _distance_to_segment(point: Point, start: Point, end: Point) -> float:
+    d_x = end[0] - start[0]
+    d_y = end[1] - start[1]
+    if d_x == 0 and d_y == 0:
+        return math.hypot(point[0] - start[0], point[1] - start[1])
+    ratio = ((point[0] - start[0]) * d_x + (point[1] - start[1]) * d_y) / (d_x * d_x + d_y * d_y)
+    ratio = max(0.0, min(1.0, ratio))
+    return math.hypot(point[0] - (start[0] + ratio * d_x), point[1] - (start[1] + ratio * d_y))
+
+
+def simplify(line: Line, tolerance: float) -> Line:
+    ''' Douglas-Peucker line simplification (iterative to avoid recursion limits). '''
+    if len(line) < 3 or tolerance <= 0:
+        return list(line)
+    keep = [False] * len(line)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(line) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_dist = 0.0
+        index = first
+        for i in range(first + 1, last):
+            dist = _distance_to_segment(line[i], line[first], line[last])
+            if dist > max_dist:
+                max_dist = dist
+                index = i
+        if max_dist > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(line, keep) if kept]
@@ -0,0 +1,152 @@
+'''
+Minimal Mapbox Vector Tile (v2) encoder.
+
+Only the subset of the spec required by the app is implemented: point and linestring features with
+scalar properties. See https://github.com/mapbox/vector-tile-spec/tree/master/2.1 for the format.
+'''
+
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+
+_CMD_MOVE_TO = 1
+_CMD_LINE_TO = 2
+
+_WIRE_VARINT = 0
+_WIRE_64BIT = 1
+_WIRE_LENGTH = 2
+
+IntPoint = Tuple[int, int]
+
+
+def _varint(value: int) -> bytes:
+    ret = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            ret.append(byte | 0x80)
+        else:
+            ret.append(byte)
+            return bytes(ret)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire: int) -> bytes:
+    return _varint((field << 3) | wire)
+
+
+def _field_varint(field: int, value: int) -> bytes:
+    return _key(field, _WIRE_VARINT) + _varint(value)
+
+
+def _field_bytes(field: int, value: bytes) -> bytes:
+    return _key(field, _WIRE_LENGTH) + _varint(len(value)) + value
+
+
+def _field_packed(field: int, values: Sequence[int]) -> bytes:
+    return _field_bytes(field, b''.join(map(_varint, values)))
+
+
+def _command(cmd: int, count: int) -> int:
+    return (cmd & 0x7) | (count << 3)
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return _field_varint(7, int(value))
+    if isinstance(value, int):
+        if value < 0:
+            return _field_varint(6, _zigzag(value))
+        return _field_varint(5, value)
+    if isinstance(value, float):
+        return _key(3, _WIRE_64BIT) + struct.pack('<d', value)
+    return _field_bytes(1, str(value).encode())
+
+
+def _encode_geometry(geom_type: int, parts: Sequence[Sequence[IntPoint]]) -> List[int]:
+    ret: List[int] = []
+    cur_x, cur_y = 0, 0
+
+    def _params(point: IntPoint):
+        nonlocal cur_x, cur_y
+        ret.append(_zigzag(point[0] - cur_x))
+        ret.append(_zigzag(point[1] - cur_y))
+        cur_x, cur_y = point
+
+    if geom_type == GEOM_POINT:
+        points = [point for part in parts for point in part]
+        ret.append(_command(_CMD_MOVE_TO, len(points)))
+        for point in points:
+            _params(point)
+        return ret
+    for line in parts:
+        ret.append(_command(_CMD_MOVE_TO, 1))
+        _params(line[0])
+        ret.append(_command(_CMD_LINE_TO, len(line) - 1))
+        for point in line[1:]:
+            _params(point)
+    return ret
+
+
+class Layer:
+    ''' Collection of features sharing a name within a tile. '''
+
+    def __init__(self, name: str, extent: int = 4096) -> None:
+        self.name = name
+        self.extent = extent
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, Any], int] = {}
+        self._features: List[bytes] = []
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def _tags(self, properties: Dict[str, Any]) -> List[int]:
+        ret = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            key_idx = self._keys.setdefault(key, len(self._keys))
+            value_idx = self._values.setdefault((type(value), value), len(self._values))
+            ret.extend((key_idx, value_idx))
+        return ret
+
+    def add_feature(self, geom_type: int, parts: Sequence[Sequence[IntPoint]],
+                    properties: Optional[Dict[str, Any]] = None,
+                    feature_id: Optional[int] = None) -> None:
+        '''
+        Add a feature. For points `parts` is a list of point groups, for linestrings it is a list
+        of lines. Lines with fewer than two points are dropped.
+        '''
+        if geom_type == GEOM_LINESTRING:
+            parts = [line for line in parts if len(line) >= 2]
+        if not any(parts):
+            return
+        data = b''
+        if feature_id is not None:
+            data += _field_varint(1, feature_id)
+        data += _field_packed(2, self._tags(properties or {}))
+        data += _field_varint(3, geom_type)
+        data += _field_packed(4, _encode_geometry(geom_type, parts))
+        self._features.append(data)
+
+    def encode(self) -> bytes:
+        ''' Serialize the layer message. '''
+        data = _field_varint(15, 2)
+        data += _field_bytes(1, self.name.encode())
+        data += b''.join(map(lambda x: _field_bytes(2, x), self._features))
+        data += b''.join(map(lambda x: _field_bytes(3, x.encode()), self._keys))
+        data += b''.join(map(lambda x: _field_bytes(4, _encode_value(x[1])), self._values))
+        data += _field_varint(5, self.extent)
+        return data
+
+
+def encode_tile(layers: Sequence[Layer]) -> bytes:
+    ''' Serialize a tile from its layers, skipping layers without features. '''
+    return b''.join(map(lambda x: _field_bytes(3, x.encode()), filter(len, layers)))
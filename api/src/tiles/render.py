@@ -0,0 +1,133 @@
+'''
+Render the tracks and waypoints of hikes into vector tiles.
+'''
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.db import trackpack
+from src.db.models import Track, TrackData, TrackSegment, Waypoint
+from src.tiles import geometry, mvt
+
+EXTENT = 4096
+BUFFER = 64
+# Fraction of a tile width added around the tile when selecting points, such that lines leaving
+# the tile are still clipped against the tile edges rather than stopping at the last point inside.
+QUERY_MARGIN = 0.25
+SIMPLIFY_TOLERANCE = 1.0
+
+_TrackKey = Tuple[int, int]
+
+
+def _track_runs(session: Session, hike_ids: List[int], bounds: geometry.Bounds):
+    '''
+    Select the track points within `bounds`, grouped into runs of consecutive points of a segment.
+    Points of a segment are inserted in a single flush, so a gap in the ids marks the points
+    omitted by the bounding box filter. Packed points are consecutive by their position instead.
+    '''
+    min_lon, min_lat, max_lon, max_lat = bounds
+    rows = session.execute(
+        select(
+            Track.parent, Track.id, Track.name,
+            TrackData.segment, TrackData.id, TrackData.longitude, TrackData.latitude,
+        )
+        .join(TrackSegment, TrackSegment.id == TrackData.segment)
+        .join(Track, Track.id == TrackSegment.parent)
+        .where(Track.parent.in_(hike_ids))
+        .where(Track.deleting.is_(False))
+        .where(TrackData.latitude.between(min_lat, max_lat))
+        .where(TrackData.longitude.between(min_lon, max_lon))
+        .order_by(TrackData.segment, TrackData.id)
+    )
+    runs: Dict[_TrackKey, List[List[Tuple[float, float]]]] = {}
+    names: Dict[_TrackKey, Optional[str]] = {}
+    last: Optional[Tuple[int, int]] = None
+    for hike_id, track_id, name, seg_id, point_id, lon, lat in rows:
+        key = (hike_id, track_id)
+        names[key] = name
+        track_runs = runs.setdefault(key, [])
+        if last != (seg_id, point_id - 1):
+            track_runs.append([])
+        track_runs[-1].append((lon, lat))
+        last = (seg_id, point_id)
+
+    # Packed segments are selected by their bounding box, then filtered point by point.
+    rows = session.execute(
+        select(Track.parent, Track.id, Track.name, TrackSegment.points)
+        .join(Track, Track.id == TrackSegment.parent)
+        .where(Track.parent.in_(hike_ids))
+        .where(Track.deleting.is_(False))
+        .where(TrackSegment.points.isnot(None))
+        .where(TrackSegment.min_latitude <= max_lat)
+        .where(TrackSegment.max_latitude >= min_lat)
+        .where(TrackSegment.min_longitude <= max_lon)
+        .where(TrackSegment.max_longitude >= min_lon)
+        .order_by(TrackSegment.id)
+    )
+    for hike_id, track_id, name, data in rows:
+        points = trackpack.unpack(data)
+        inside = np.flatnonzero(
+            (points.latitude >= min_lat) & (points.latitude <= max_lat)
+            & (points.longitude >= min_lon) & (points.longitude <= max_lon))
+        if not len(inside):
+            continue
+        key = (hike_id, track_id)
+        names[key] = name
+        track_runs = runs.setdefault(key, [])
+        for run in np.split(inside, np.flatnonzero(np.diff(inside) != 1) + 1):
+            track_runs.append(list(zip(points.longitude[run].tolist(),
+                                       points.latitude[run].tolist())))
+    return runs, names
+
+
+def _waypoints(session: Session, hike_ids: List[int], bounds: geometry.Bounds):
+    min_lon, min_lat, max_lon, max_lat = bounds
+    return session.execute(
+        select(Waypoint.id, Waypoint.parent, Waypoint.name, Waypoint.longitude, Waypoint.latitude)
+        .where(Waypoint.parent.in_(hike_ids))
+        .where(Waypoint.latitude.between(min_lat, max_lat))
+        .where(Waypoint.longitude.between(min_lon, max_lon))
+        .order_by(Waypoint.time)
+    ).all()
+
+
+def _quantize(line: Iterable[geometry.Point]) -> List[mvt.IntPoint]:
+    ret: List[mvt.IntPoint] = []
+    for point in line:
+        point = (round(point[0]), round(point[1]))
+        if not ret or ret[-1] != point:
+            ret.append(point)
+    return ret
+
+
+def render_tile(session: Session, hike_ids: List[int], zoom: int, x: int, y: int) -> bytes:
+    ''' Render the tracks and waypoints of the hikes which intersect the tile. '''
+    if not hike_ids:
+        return b''
+
+    def _project(point: Tuple[float, float]) -> geometry.Point:
+        return geometry.project(point[0], point[1], zoom, x, y, EXTENT)
+
+    tracks = mvt.Layer('tracks', extent=EXTENT)
+    runs, names = _track_runs(session, hike_ids, geometry.tile_bounds(zoom, x, y, QUERY_MARGIN))
+    for (hike_id, track_id), track_runs in runs.items():
+        lines = []
+        for run in track_runs:
+            projected = list(map(_project, run))
+            for clipped in geometry.clip_line(projected, -BUFFER, EXTENT + BUFFER):
+                clipped = geometry.simplify(clipped, SIMPLIFY_TOLERANCE)
+                lines.append(_quantize(clipped))
+        properties = {'hike': hike_id, 'track': track_id, 'name': names[(hike_id, track_id)]}
+        tracks.add_feature(mvt.GEOM_LINESTRING, lines, properties, feature_id=track_id)
+
+    waypoints = mvt.Layer('waypoints', extent=EXTENT)
+    for wpt_id, hike_id, name, lon, lat in _waypoints(
+            session, hike_ids, geometry.tile_bounds(zoom, x, y)):
+        point = _quantize([_project((lon, lat))])
+        properties = {'hike': hike_id, 'id': wpt_id, 'name': name}
+        waypoints.add_feature(mvt.GEOM_POINT, [point], properties, feature_id=wpt_id)
+
+    return mvt.encode_tile([tracks, waypoints])
@@ -0,0 +1,41 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, select
+from sqlalchemy.orm import Session
+
+from src.db.bulk import bulk_update
+
+
+class TestBulkUpdate(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+        self.table = Table(
+            'items', MetaData(),
+            Column('id', Integer, primary_key=True),
+            Column('name', Text),
+        )
+        self.table.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(self.table.insert(), [{'id': x, 'name': 'old'} for x in range(10)])
+        return super().setUp()
+
+    def test_batches(self):
+        rows = ({'id': x, 'name': f'new-{x}'} for x in range(0, 10, 2))
+        with Session(self.engine) as session:
+            self.assertEqual(bulk_update(session, self.table, rows, batch_size=2), 5)
+            session.commit()
+            ret = session.execute(select(self.table.c.name).order_by(self.table.c.id)).scalars()
+            self.assertEqual(list(ret)[:4], ['new-0', 'old', 'new-2', 'old'])
+
+    def test_empty(self):
+        with Session(self.engine) as session:
+            self.assertEqual(bulk_update(session, self.table, []), 0)
+
+    def test_missing(self):
+        rows = [{'id': x, 'name': 'new'} for x in (1, 2, 42, 43)]
+        with Session(self.engine) as session:
+            self.assertEqual(bulk_update(session, self.table, rows, batch_size=3), 2)
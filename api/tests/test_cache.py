@@ -0,0 +1,146 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import flask
+from sqlalchemy import create_engine
+
+from src import streaming
+from src.cache import DiskCache, LruCache, TieredCache
+from src.response_cache import cached_per_hike
+
+
+class TestLruCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LruCache(10)
+        cache.set('a', b'1234')
+        cache.set('b', b'1234')
+        cache.get('a')
+        cache.set('c', b'1234')
+        self.assertEqual(cache.get('a'), b'1234')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_oversized_entry_dropped(self):
+        cache = LruCache(4)
+        cache.set('a', b'12345')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.root = Path(self._tmpdir.name)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_prune_least_recently_used(self):
+        writer = DiskCache(self.root, max_bytes=1000)
+        for i, key in enumerate(('tiles/hike-1/1/a', 'tiles/hike-1/2/a', 'tiles/hike-1/3/a')):
+            writer.set(key, b'x' * 40)
+            os.utime(Path(self.root, key), (i, i))
+        cache = DiskCache(self.root, max_bytes=100)
+        cache.get('tiles/hike-1/1/a')
+        self.assertEqual(cache.prune(), 40)
+        self.assertEqual(cache.get('tiles/hike-1/1/a'), b'x' * 40)
+        self.assertIsNone(cache.get('tiles/hike-1/2/a'))
+        self.assertFalse(Path(self.root, 'tiles/hike-1/2').exists())
+        self.assertEqual(cache.prune(), 0)
+
+    def test_prune_on_write(self):
+        cache = DiskCache(self.root, max_bytes=100)
+        for i in range(20):
+            cache.set(f'responses/hike-1/{i}/a', b'x' * 20)
+        size = sum(x.stat().st_size for x in self.root.rglob('*') if x.is_file())
+        self.assertLessEqual(size, 100)
+        self.assertEqual(cache.get('responses/hike-1/19/a'), b'x' * 20)
+
+
+class TestTieredCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.disk = DiskCache(Path(self._tmpdir.name))
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_disk_shared_between_instances(self):
+        first = TieredCache(LruCache(1024), self.disk)
+        second = TieredCache(LruCache(1024), self.disk)
+        self.assertEqual(first.get_or_create('responses/a', lambda: b'data'), b'data')
+        self.assertEqual(second.get('responses/a'), b'data')
+        self.assertEqual(second.get('responses/a'), b'data')
+        stats = second.stats
+        self.assertEqual(stats['disk_hits'], 1)
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['hit_rate'], 1.0)
+
+    def test_memory_only(self):
+        cache = TieredCache(LruCache(1024))
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', b'data')
+        self.assertEqual(cache.get('a'), b'data')
+        self.assertEqual(cache.stats['hit_rate'], 0.5)
+        self.assertFalse(list(Path(self._tmpdir.name).iterdir()))
+
+    def test_invalid_key(self):
+        with self.assertRaises(ValueError):
+            self.disk.get('../secret')
+
+
+class TestCachedPerHike(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = TieredCache(LruCache(1 << 20))
+        for name, value in (('RESPONSE_CACHE', self.cache),
+                            ('get_engine', lambda: create_engine('sqlite://')),
+                            ('hike_revisions', lambda session, ids: {1: 3})):
+            patcher = mock.patch(f'src.response_cache.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.encoded = []
+        app = flask.Flask(__name__)
+
+        @app.get('/hikes/<int:hike_id>/points')
+        @cached_per_hike
+        def _points(hike_id: int):  # pylint: disable=unused-argument
+            def _generate():
+                for i in range(3):
+                    self.encoded.append(i)
+                    yield str(i) * streaming.CHUNK_SIZE
+            return streaming.stream(_generate(), 'application/json')
+
+        self.client = app.test_client()
+        return super().setUp()
+
+    def test_streamed_then_cached(self):
+        size = streaming.CHUNK_SIZE
+        resp = self.client.get('/hikes/1/points', buffered=False)
+        chunks = iter(resp.response)
+        self.assertEqual(next(chunks), b'0' * size)
+        self.assertEqual(self.encoded, [0])
+        self.assertEqual(b''.join(chunks), b'1' * size + b'2' * size)
+        resp.close()
+        resp = self.client.get('/hikes/1/points')
+        self.assertEqual(resp.data, b'0' * size + b'1' * size + b'2' * size)
+        self.assertFalse(resp.is_streamed)
+        self.assertEqual(self.encoded, [0, 1, 2])
+
+    def test_interrupted_not_cached(self):
+        resp = self.client.get('/hikes/1/points', buffered=False)
+        next(iter(resp.response))
+        resp.close()
+        self.client.get('/hikes/1/points').get_data()
+        self.assertEqual(self.encoded, [0, 0, 1, 2])
@@ -0,0 +1,46 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+import numpy as np
+
+from src.clusters import Markers, cluster_levels
+from src.tiles.geometry import MAX_ZOOM
+
+
+def _markers(*points) -> Markers:
+    picture, latitude, longitude = zip(*points)
+    return Markers(np.array(picture), np.array(latitude), np.array(longitude))
+
+
+class TestClusterLevels(unittest.TestCase):
+    def test_levels(self):
+        # Two groups of markers about 10 km apart, the markers of a group about 10 m apart.
+        markers = _markers(
+            (1, 35.25, -85.24), (2, 35.2501, -85.24), (-1, 35.2502, -85.24),
+            (3, 35.34, -85.24),
+        )
+        ret = cluster_levels(markers)
+        self.assertEqual(set(ret), set(range(MAX_ZOOM + 1)))
+        self.assertEqual(ret[0], [{
+            'latitude': 35.272575, 'longitude': -85.24, 'count': 4, 'pictures': 3,
+            'waypoints': 1, 'picture': 2,
+        }])
+        self.assertEqual(sorted(x['count'] for x in ret[12]), [1, 3])
+        self.assertEqual(len(ret[MAX_ZOOM]), 4)
+        for level in ret.values():
+            self.assertEqual(sum(x['count'] for x in level), 4)
+
+    def test_representative(self):
+        # The picture closest to the centroid, never a waypoint.
+        markers = _markers((1, 35.25, -85.24), (2, 35.2503, -85.24), (-1, 35.2501, -85.24))
+        self.assertEqual(cluster_levels(markers)[10][0]['picture'], 1)
+        markers = _markers((-1, 35.25, -85.24), (-1, 35.2501, -85.24))
+        self.assertIsNone(cluster_levels(markers)[10][0]['picture'])
+
+    def test_empty(self):
+        empty = np.empty(0)
+        ret = cluster_levels(Markers(empty.astype(np.int64), empty, empty))
+        self.assertEqual(ret[0], [])
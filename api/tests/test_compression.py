@@ -0,0 +1,45 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import gzip
+import unittest
+
+import brotli
+
+from src.compression import compress, compress_stream, negotiate
+
+
+class TestCompression(unittest.TestCase):
+    def test_negotiate(self):
+        data = [
+            (None, None),
+            ('', None),
+            ('identity', None),
+            ('gzip', 'gzip'),
+            ('gzip, deflate, br', 'br'),
+            ('br;q=0.5, gzip', 'gzip'),
+            ('br;q=0, gzip;q=0', None),
+            ('*', 'br'),
+            ('*;q=0.1, gzip;q=0.5', 'gzip'),
+            ('GZIP;q=bad', None),
+        ]
+        for value, expect in data:
+            with self.subTest(value=value):
+                self.assertEqual(negotiate(value), expect)
+
+    def test_compress_roundtrip(self):
+        data = b'{"latitude": 35.250601, "longitude": -85.238672}' * 100
+        self.assertEqual(brotli.decompress(compress(data, 'br')), data)
+        self.assertEqual(gzip.decompress(compress(data, 'gzip', level='high')), data)
+        with self.assertRaises(ValueError):
+            compress(data, 'deflate')
+
+    def test_compress_stream(self):
+        chunks = [b'{"points": [', b'[-85.238672, 35.250601],' * 50, b'[]]}']
+        for encoding, decompress in (('br', brotli.decompress), ('gzip', gzip.decompress)):
+            with self.subTest(encoding=encoding):
+                ret = list(compress_stream(iter(chunks), encoding))
+                # Every chunk is flushed such that the client can decode it right away.
+                self.assertEqual(len(ret), len(chunks) + 1)
+                self.assertEqual(decompress(b''.join(ret)), b''.join(chunks))
@@ -0,0 +1,107 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from datetime import datetime, timedelta, timezone
+import os
+import unittest
+from unittest import mock
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select, text
+from sqlalchemy.dialects import postgresql
+
+from src.db.custom import (COORDINATE_SCALE, ELEVATION_SCALE, AwareDateTime, FixedPoint,
+                           coordinate_mode)
+
+
+class TestAwareDateTime(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+        self.table = Table(
+            'stamps', MetaData(),
+            Column('id', Integer, primary_key=True),
+            Column('time', AwareDateTime),
+        )
+        self.table.metadata.create_all(self.engine)
+        return super().setUp()
+
+    def _round_trip(self, value):
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table).values(time=value))
+            return conn.execute(select(self.table.c.time)).scalar_one()
+
+    def test_aware(self):
+        value = datetime(2022, 5, 7, 11, 10, tzinfo=timezone(timedelta(hours=-4)))
+        ret = self._round_trip(value)
+        self.assertEqual(ret, value)
+        self.assertEqual(ret.tzinfo, timezone.utc)
+
+    def test_naive_is_utc(self):
+        ret = self._round_trip(datetime(2022, 5, 7, 15, 10))
+        self.assertEqual(ret, datetime(2022, 5, 7, 15, 10, tzinfo=timezone.utc))
+
+    def test_none(self):
+        self.assertIsNone(self._round_trip(None))
+
+    def test_native_dialect(self):
+        dialect = postgresql.psycopg2.dialect()
+        type_ = AwareDateTime()
+        self.assertIsNone(type_.result_processor(dialect, None))
+        self.assertIsNone(type_.bind_processor(dialect))
+        self.assertEqual(str(type_.compile(dialect=dialect)), 'TIMESTAMP WITH TIME ZONE')
+
+
+class TestFixedPoint(unittest.TestCase):
+    MODE = 'fixed'
+
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(os.environ, {'TRACK_COORDINATES': self.MODE})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Processors are memoized per dialect, i.e. per engine.
+        self.engine = create_engine('sqlite://')
+        self.table = Table(
+            'points', MetaData(),
+            Column('id', Integer, primary_key=True),
+            Column('latitude', FixedPoint(COORDINATE_SCALE)),
+            Column('elevation', FixedPoint(ELEVATION_SCALE)),
+        )
+        self.table.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table), [
+                {'id': 1, 'latitude': 35.2506012, 'elevation': 402.94},
+                {'id': 2, 'latitude': -35.25, 'elevation': -2.0},
+                {'id': 3, 'latitude': None, 'elevation': None},
+            ])
+        return super().setUp()
+
+    def test_round_trip(self):
+        with self.engine.connect() as conn:
+            ret = conn.execute(select(self.table.c.latitude, self.table.c.elevation)
+                               .order_by(self.table.c.id)).all()
+            stored = conn.execute(text('SELECT latitude, elevation FROM points WHERE id = 1')).one()
+        self.assertEqual(ret, [(35.2506012, 402.9), (-35.25, -2.0), (None, None)])
+        self.assertEqual(tuple(stored), (352506012, 4029))
+
+    def test_compare(self):
+        with self.engine.connect() as conn:
+            ret = conn.execute(select(self.table.c.id)
+                               .where(self.table.c.latitude.between(35.25, 35.3))).scalars()
+            self.assertEqual(list(ret), [1])
+
+
+class TestFloatPoint(TestFixedPoint):
+    MODE = 'float'
+
+    def test_round_trip(self):
+        with self.engine.connect() as conn:
+            ret = conn.execute(select(self.table.c.latitude, self.table.c.elevation)
+                               .order_by(self.table.c.id)).all()
+            stored = conn.execute(text('SELECT latitude, elevation FROM points WHERE id = 1')).one()
+        self.assertEqual(ret, [(35.2506012, 402.94), (-35.25, -2.0), (None, None)])
+        self.assertEqual(tuple(stored), (35.2506012, 402.94))
+
+    def test_mode(self):
+        self.assertEqual(coordinate_mode(), 'float')
+        with mock.patch.dict(os.environ, {'TRACK_COORDINATES': 'packed'}):
+            self.assertRaises(ValueError, coordinate_mode)
@@ -0,0 +1,128 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.importers import filtering
+from src.importers.parallel import ParsedSegment
+
+START = 1651935600.0
+# Degrees of latitude per meter.
+METER = 1 / 111195.0
+
+
+def _walk(seconds: int, speed: float = 1.0) -> ParsedSegment:
+    ''' A fix per second walking north at `speed` meters per second. '''
+    time = START + np.arange(seconds, dtype=np.float64)
+    return ParsedSegment(
+        time=time,
+        latitude=35.0 + np.arange(seconds) * speed * METER,
+        longitude=np.full(seconds, -85.0),
+        elevation=np.full(seconds, 400.0),
+    )
+
+
+def _settings(*stages: str) -> filtering.FilterSettings:
+    return filtering.FilterSettings(stages=stages)
+
+
+class TestFilterSegment(unittest.TestCase):
+    def test_disabled(self):
+        seg = _walk(100)
+        self.assertIs(filtering.filter_segment(seg, _settings()), seg)
+
+    def test_drop_impossible(self):
+        seg = _walk(100)
+        seg.latitude[40] += 0.01
+        seg.latitude[60] += 0.01
+        ret = filtering.filter_segment(seg, _settings('speed'))
+        self.assertEqual(len(ret), 98)
+        self.assertNotIn(START + 40, ret.time)
+        self.assertNotIn(START + 60, ret.time)
+        # The input is left untouched.
+        self.assertEqual(len(seg), 100)
+
+    def test_drop_single_glitch(self):
+        # Of A, G, B only the glitch G is reached and left fast.
+        seg = _walk(3)
+        seg.latitude[1] += 0.01
+        ret = filtering.filter_segment(seg, _settings('speed'))
+        np.testing.assert_array_equal(ret.time, [START, START + 2])
+
+    def test_keep_jump_at_ends(self):
+        # The first and last fix have a single fast leg, like a real jump.
+        seg = _walk(100)
+        seg.latitude[0] -= 0.01
+        seg.latitude[-1] += 0.01
+        self.assertEqual(len(filtering.filter_segment(seg, _settings('speed'))), 100)
+
+    def test_keep_gap(self):
+        # A jump after a gap in the recording is possible and kept.
+        seg = _walk(100)
+        seg.time[50:] += 3600
+        seg.latitude[50:] += 0.05
+        self.assertEqual(len(filtering.filter_segment(seg, _settings('speed'))), 100)
+
+    def test_collapse_stationary(self):
+        walk = _walk(600)
+        rng = np.random.default_rng(3)
+        # Walking for 10 minutes, sitting for an hour with a few meters of noise, walking on.
+        camp = 3600
+        seg = ParsedSegment(
+            time=np.concatenate([walk.time, START + 600 + np.arange(camp), walk.time + 600 + camp]),
+            latitude=np.concatenate([
+                walk.latitude,
+                walk.latitude[-1] + rng.normal(0, 2 * METER, camp),
+                walk.latitude + walk.latitude[-1] - 35.0,
+            ]),
+            longitude=np.full(1200 + camp, -85.0),
+            elevation=np.full(1200 + camp, 400.0),
+        )
+        ret = filtering.filter_segment(seg, _settings('stationary'))
+        self.assertLess(len(ret), 1200 + 60)
+        self.assertGreater(len(ret), 1200 - 120)
+        # A fix is kept every `STATIONARY_INTERVAL` of the stay, at a single location.
+        stay = (ret.time >= START + 660) & (ret.time < START + 600 + camp)
+        self.assertGreaterEqual(np.count_nonzero(stay), camp // filtering.STATIONARY_INTERVAL - 1)
+        self.assertEqual(len(np.unique(ret.latitude[stay])), 1)
+        self.assertLessEqual(np.diff(ret.time).max(), filtering.STATIONARY_INTERVAL)
+
+    def test_walking_is_not_stationary(self):
+        seg = _walk(600, speed=0.5)
+        self.assertEqual(len(filtering.filter_segment(seg, _settings('stationary'))), 600)
+
+    def test_sparse_is_not_stationary(self):
+        seg = _walk(10)
+        seg.time[:] = START + np.arange(10) * 600
+        seg.latitude[:] = 35.0
+        self.assertEqual(len(filtering.filter_segment(seg, _settings('stationary'))), 10)
+
+    def test_smooth_elevation(self):
+        seg = _walk(10)
+        seg.elevation[5] = 410.0
+        seg.elevation[7] = np.nan
+        ret = filtering.filter_segment(seg, _settings('elevation'))
+        self.assertEqual(len(ret), 10)
+        self.assertAlmostEqual(ret.elevation[5], 402.0)
+        self.assertTrue(np.isnan(ret.elevation[7]))
+        self.assertAlmostEqual(ret.elevation[0], 400.0)
+
+    def test_missing_values_kept(self):
+        seg = _walk(100)
+        seg.time[10] = np.nan
+        seg.latitude[20] = np.nan
+        seg.latitude[40] += 0.01
+        ret = filtering.filter_segment(seg, _settings(*filtering.STAGES))
+        self.assertTrue(np.isnan(ret.time).any())
+        self.assertTrue(np.isnan(ret.latitude).any())
+        self.assertEqual(len(ret), 99)
+
+    def test_settings(self):
+        with mock.patch.dict('os.environ', {'IMPORT_FILTER': 'elevation, speed'}):
+            self.assertEqual(filtering.filter_settings().stages, ('speed', 'elevation'))
+        with mock.patch.dict('os.environ', {'IMPORT_FILTER': 'smooth'}):
+            self.assertRaises(ValueError, filtering.filter_settings)
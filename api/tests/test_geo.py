@@ -0,0 +1,51 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+import numpy as np
+
+from src import geo
+
+
+class TestGeo(unittest.TestCase):
+    def test_haversine(self):
+        # One degree of latitude is ~111.2 km.
+        ret = geo.haversine(np.array([0.0]), np.array([0.0]), np.array([1.0]), np.array([0.0]))
+        self.assertAlmostEqual(ret[0], 111195.0, delta=1.0)
+
+    def test_cumulative_distance(self):
+        lat = np.array([35.0, 35.001, 35.002])
+        lon = np.array([-85.0, -85.0, -85.0])
+        ret = geo.cumulative_distance(lat, lon)
+        self.assertEqual(ret[0], 0.0)
+        self.assertAlmostEqual(ret[2], 2 * ret[1])
+        self.assertEqual(len(geo.cumulative_distance(lat[:1], lon[:1])), 1)
+
+    def test_lttb_keeps_extremes(self):
+        x = np.arange(100, dtype=np.float64)
+        y = np.zeros(100)
+        y[37] = 50.0
+        y[80] = -20.0
+        ret = geo.lttb(x, y, 10)
+        self.assertEqual(len(ret), 10)
+        self.assertEqual(ret[0], 0)
+        self.assertEqual(ret[-1], 99)
+        self.assertIn(37, ret)
+        self.assertIn(80, ret)
+        self.assertTrue(np.all(np.diff(ret) > 0))
+
+    def test_lttb_small_input(self):
+        x = np.arange(5, dtype=np.float64)
+        self.assertEqual(list(geo.lttb(x, x, 10)), [0, 1, 2, 3, 4])
+
+    def test_simplify(self):
+        # A straight line north with a detour of ~11 m east at the middle.
+        lat = np.linspace(35.0, 35.01, 101)
+        lon = np.full(101, -85.0)
+        lon[50] += 1e-4
+        self.assertEqual(list(geo.simplify(lat, lon, 20.0)), [0, 100])
+        self.assertEqual(list(geo.simplify(lat, lon, 5.0)), [0, 49, 50, 51, 100])
+        self.assertEqual(len(geo.simplify(lat, lon, 0.0)), 101)
+        self.assertEqual(list(geo.simplify(lat[:2], lon[:2], 5.0)), [0, 1])
@@ -0,0 +1,57 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+import numpy as np
+
+from src.geotag import MAX_GAP, TrackTimeline
+
+
+class TestTrackTimeline(unittest.TestCase):
+    def setUp(self) -> None:
+        # Two segments: 0s-20s and 1000s-1010s, out of order to check sorting.
+        self.timeline = TrackTimeline(
+            time=np.array([1000.0, 1010.0, 0.0, 10.0, 20.0]),
+            segment=np.array([2, 2, 1, 1, 1]),
+            latitude=np.array([10.0, 11.0, 0.0, 1.0, 2.0]),
+            longitude=np.array([20.0, 21.0, 0.0, -1.0, -2.0]),
+            elevation=np.array([100.0, 110.0, 0.0, 10.0, 20.0]),
+        )
+        return super().setUp()
+
+    def test_interpolates_within_segment(self):
+        ret = self.timeline.locate(np.array([5.0, 1005.0]))
+        np.testing.assert_allclose(ret['latitude'], [0.5, 10.5])
+        np.testing.assert_allclose(ret['longitude'], [-0.5, 20.5])
+        np.testing.assert_allclose(ret['elevation'], [5.0, 105.0])
+
+    def test_snaps_between_segments(self):
+        ret = self.timeline.locate(np.array([100.0, 900.0]))
+        np.testing.assert_allclose(ret['latitude'], [2.0, 10.0])
+
+    def test_outside_track(self):
+        ret = self.timeline.locate(np.array([-60.0, -MAX_GAP - 1.0, 1010.0 + MAX_GAP + 1.0]))
+        self.assertEqual(ret['latitude'][0], 0.0)
+        self.assertTrue(np.isnan(ret['latitude'][1]))
+        self.assertTrue(np.isnan(ret['latitude'][2]))
+
+    def test_gap_within_track(self):
+        # Segments three hours apart, a picture in between is too far from both.
+        timeline = TrackTimeline(
+            time=np.array([0.0, 10.0, 10800.0, 10810.0]),
+            segment=np.array([1, 1, 2, 2]),
+            latitude=np.array([0.0, 1.0, 10.0, 11.0]),
+            longitude=np.array([0.0, -1.0, 20.0, 21.0]),
+            elevation=np.array([0.0, 10.0, 100.0, 110.0]),
+        )
+        ret = timeline.locate(np.array([10.0 + MAX_GAP, 5400.0, 10800.0 - MAX_GAP - 1.0]))
+        self.assertEqual(ret['latitude'][0], 1.0)
+        self.assertTrue(np.isnan(ret['latitude'][1]))
+        self.assertTrue(np.isnan(ret['elevation'][2]))
+
+    def test_empty_track(self):
+        empty = np.empty(0)
+        timeline = TrackTimeline(empty, empty.astype(np.int64), empty, empty, empty)
+        self.assertTrue(np.isnan(timeline.locate(np.array([1.0]))['latitude'][0]))
@@ -0,0 +1,70 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+import numpy as np
+
+from src.importers import gpx, parallel
+
+GPX = b'''<?xml version="1.0" encoding="UTF-8"?>
+<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1">
+  <wpt lat="35.1" lon="-85.1">
+    <ele>400.0</ele><time>2022-05-07T15:00:00Z</time><name>camp</name>
+  </wpt>
+  <trk>
+    <name>day 1</name>
+    <trkseg>
+      <trkpt lat="35.0" lon="-85.0"><ele>400.0</ele><time>2022-05-07T15:00:00Z</time></trkpt>
+      <trkpt lat="35.001" lon="-85.0"><time>2022-05-07T15:01:00Z</time></trkpt>
+    </trkseg>
+  </trk>
+</gpx>
+'''
+
+
+class TestParse(unittest.TestCase):
+    def test_parse(self):
+        wpt, track = parallel.parse(GPX)
+        self.assertIsInstance(wpt, gpx.GpxWaypoint)
+        self.assertEqual(track.name, 'day 1')
+        self.assertEqual(len(track.segments), 1)
+        seg = track.segments[0]
+        self.assertEqual(len(seg), 2)
+        self.assertEqual(seg.time[1] - seg.time[0], 60.0)
+        self.assertTrue(np.isnan(seg.elevation[1]))
+
+    def test_parse_skips_unhandled(self):
+        data = GPX.replace(b'</gpx>', b'<trkseg><trkpt lat="35.0" lon="-85.0"/></trkseg></gpx>')
+        with self.assertLogs('src.importers.parallel', 'WARNING'):
+            ret = parallel.parse(data)
+        self.assertEqual([type(x) for x in ret], [gpx.GpxWaypoint, parallel.ParsedTrack])
+
+    def test_parse_files_keeps_order(self):
+        other = GPX.replace(b'day 1', b'day 2')
+        ret = parallel.parse_files([GPX, other, GPX])
+        self.assertEqual([x[1].name for x in ret], ['day 1', 'day 2', 'day 1'])
+
+    def test_fingerprints(self):
+        wpt, track = parallel.parse(GPX)
+        wpt2, track2 = parallel.parse(GPX.replace(b'<?xml', b'\n<?xml').strip())
+        self.assertEqual(track.fingerprint, track2.fingerprint)
+        self.assertEqual(parallel.waypoint_fingerprint(wpt), parallel.waypoint_fingerprint(wpt2))
+        _, moved = parallel.parse(GPX.replace(b'lat="35.001"', b'lat="35.002"'))
+        self.assertNotEqual(track.fingerprint, moved.fingerprint)
+        _, renamed = parallel.parse(GPX.replace(b'day 1', b'day 2'))
+        self.assertNotEqual(track.fingerprint, renamed.fingerprint)
+
+    def test_summaries(self):
+        _, track = parallel.parse(GPX)
+        summary, = track.summaries
+        np.testing.assert_array_equal(summary[0::2], [2, 2, 2, 1])
+        # Stored with single precision and the time in whole seconds, the points are the same.
+        stored = [x.astype(np.float32) for x in track.segments[0][1:]]
+        stored.insert(0, track.segments[0].time + 0.4)
+        self.assertTrue(parallel.same_summary(summary, parallel.summarize(stored)))
+        _, moved = parallel.parse(GPX.replace(b'lat="35.001"', b'lat="35.002"'))
+        self.assertFalse(parallel.same_summary(summary, moved.summaries[0]))
+        _, dropped = parallel.parse(GPX.replace(b'<ele>400.0</ele>', b''))
+        self.assertFalse(parallel.same_summary(summary, dropped.summaries[0]))
@@ -0,0 +1,80 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import time
+import unittest
+
+import flask
+from sqlalchemy import create_engine, text
+
+from src import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+        app = flask.Flask(__name__)
+        instrumentation.init_app(app)
+        self.app = app
+
+        @app.get('/queries/<int:count>')
+        def _queries(count: int):
+            with self.engine.connect() as conn:
+                for i in range(count):
+                    conn.execute(text('SELECT :value'), {'value': i})
+            with instrumentation.timed('magick'):
+                time.sleep(0.01)
+            return {'count': count}
+
+        self.client = app.test_client()
+        return super().setUp()
+
+    def test_server_timing(self):
+        resp = self.client.get('/queries/3')
+        timing = dict(map(lambda x: x.split(';', 1), resp.headers['Server-Timing'].split(', ')))
+        self.assertIn('statements=3 ', timing['db'])
+        self.assertGreaterEqual(float(timing['magick'].split('=')[1]), 10.0)
+        self.assertIn('app', timing)
+
+    def test_outside_request(self):
+        with self.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        self.assertIsNone(instrumentation.current())
+        with instrumentation.timed('magick'):
+            pass
+
+    def test_count_queries(self):
+        with instrumentation.count_queries() as outer:
+            with instrumentation.count_queries(limit=2) as inner:
+                self.client.get('/queries/2')
+            self.client.get('/queries/1')
+        self.assertEqual(inner.count, 2)
+        self.assertEqual(outer.count, 3)
+        with self.assertRaises(instrumentation.QueryLimitExceeded):
+            with instrumentation.count_queries(limit=2):
+                self.client.get('/queries/3')
+
+    def test_query_limit(self):
+        @instrumentation.query_limit(1)
+        def _request(count: int):
+            return self.client.get(f'/queries/{count}').json['count']
+
+        self.assertEqual(_request(1), 1)
+        with self.assertRaises(instrumentation.QueryLimitExceeded):
+            _request(2)
+
+    def test_repeated(self):
+        with instrumentation.count_queries() as counter:
+            self.client.get(f'/queries/{instrumentation.REPEAT_THRESHOLD}')
+            with self.engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+                conn.execute(text('SELECT 1'))
+        self.assertEqual(counter.repeated(), [('SELECT ?', instrumentation.REPEAT_THRESHOLD)])
+
+    def test_repeated_warning(self):
+        self.app.debug = True
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            # The request is logged once the response is closed.
+            self.client.get(f'/queries/{instrumentation.REPEAT_THRESHOLD}').close()
+        self.assertIn(f'repeated {instrumentation.REPEAT_THRESHOLD} times', logs.output[0])
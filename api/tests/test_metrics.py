@@ -0,0 +1,46 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+import flask
+import prometheus_client as prom
+
+from src import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        app = flask.Flask(__name__)
+        metrics.init_app(app)
+        bp_ = flask.Blueprint('tracks', __name__, url_prefix='/tracks')
+
+        @bp_.get('/<int:track_id>')
+        def _track(track_id: int):
+            labels = {'blueprint': 'tracks'}
+            in_flight = prom.REGISTRY.get_sample_value('api_requests_in_flight', labels)
+            return {'id': track_id, 'in_flight': in_flight}
+
+        app.register_blueprint(bp_)
+        self.client = app.test_client()
+        return super().setUp()
+
+    def _count(self, blueprint: str, route: str) -> float:
+        labels = {'blueprint': blueprint, 'route': route, 'method': 'GET'}
+        ret = prom.REGISTRY.get_sample_value('api_request_duration_seconds_count', labels)
+        return ret or 0.0
+
+    def test_request_latency(self):
+        before = self._count('tracks', '/tracks/<int:track_id>')
+        resp = self.client.get('/tracks/1')
+        self.assertEqual(resp.json['in_flight'], 1.0)
+        self.client.get('/tracks/2')
+        self.assertEqual(self._count('tracks', '/tracks/<int:track_id>'), before + 2)
+        labels = {'blueprint': 'tracks'}
+        self.assertEqual(prom.REGISTRY.get_sample_value('api_requests_in_flight', labels), 0.0)
+
+    def test_unmatched_route(self):
+        before = self._count('app', 'unmatched')
+        self.assertEqual(self.client.get('/missing').status_code, 404)
+        self.assertEqual(self._count('app', 'unmatched'), before + 1)
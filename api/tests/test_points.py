@@ -0,0 +1,86 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from src.db import trackpack
+from src.db.base import Base
+from src.db.models import Hike, Track, TrackData, TrackSegment
+from src import instrumentation
+from src.db.points import iter_points_by_segment, segment_points
+
+START = datetime(2022, 5, 7, 15, 0, tzinfo=timezone.utc)
+
+
+class TestSegmentPoints(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        times = [START + timedelta(seconds=10 * x) for x in range(10)]
+        with self.engine.begin() as conn:
+            conn.execute(insert(Hike), [{'id': 1, 'name': 'hike', 'zone': None}])
+            conn.execute(insert(Track), [{'id': 1, 'parent': 1}])
+            packed = trackpack.pack(trackpack.PackedPoints(
+                time=np.array([x.timestamp() for x in reversed(times)] + [np.nan]),
+                latitude=np.linspace(35.0, 35.1, 11),
+                longitude=np.linspace(-85.0, -85.1, 11),
+                elevation=np.full(11, 400.0),
+            ))
+            conn.execute(insert(TrackSegment), [{'id': 1, 'parent': 1, 'points': None},
+                                                {'id': 2, 'parent': 1, 'points': packed}])
+            conn.execute(insert(TrackData), [
+                {'segment': 1, 'time': x, 'latitude': 35.0, 'longitude': -85.0, 'elevation': None}
+                for x in reversed(times)
+            ])
+        return super().setUp()
+
+    def test_window(self):
+        start = START + timedelta(seconds=15)
+        end = START + timedelta(seconds=40)
+        with Session(self.engine) as session:
+            for seg_id in (1, 2):
+                ret = [x['time'] for x in segment_points(session, seg_id, start=start, end=end)]
+                self.assertEqual(ret, [START + timedelta(seconds=x) for x in (20, 30, 40)])
+
+    def test_open_ended(self):
+        with Session(self.engine) as session:
+            for seg_id in (1, 2):
+                ret = segment_points(session, seg_id, start=START + timedelta(seconds=85))
+                self.assertEqual([x['time'] for x in ret], [START + timedelta(seconds=90)])
+                ret = segment_points(session, seg_id, end=START)
+                self.assertEqual([x['time'] for x in ret], [START])
+
+    def test_unbounded(self):
+        with Session(self.engine) as session:
+            self.assertEqual(len(segment_points(session, 1)), 10)
+            # Points without a time are only returned without a window.
+            self.assertEqual(segment_points(session, 2)[-1]['time'], None)
+            self.assertEqual(len(segment_points(session, 2)), 11)
+
+    def test_empty(self):
+        start = START + timedelta(days=1)
+        with Session(self.engine) as session:
+            for seg_id in (1, 2):
+                self.assertEqual(segment_points(session, seg_id, start=start), [])
+
+
+    def test_by_segment(self):
+        with self.engine.begin() as conn:
+            conn.execute(insert(Track), [{'id': 2, 'parent': 1}])
+            conn.execute(insert(TrackSegment), [{'id': 3, 'parent': 2, 'points': None},
+                                                {'id': 4, 'parent': 2, 'points': None}])
+            conn.execute(insert(TrackData), [
+                {'segment': 4, 'time': START, 'latitude': 35.0, 'longitude': -85.0,
+                 'elevation': None},
+            ])
+        with Session(self.engine) as session:
+            with instrumentation.count_queries(2):
+                ret = [(x, [y['time'] for y in points])
+                       for x, points in iter_points_by_segment(session, [1, 2, 3, 4], end=START)]
+        self.assertEqual(ret, [(1, [START]), (2, [START]), (3, []), (4, [START])])
@@ -0,0 +1,138 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from pathlib import Path
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src import instrumentation
+from src.db.core import get_engine
+from src.db.models import ApiSession
+from src.main import create_app
+from tests.common import DATA_FOLDER, TESTS_FOLDER
+
+# Most statements a request of each route of `src.bp` may issue, for a hike of several tracks.
+# Statements issued per row of a result, e.g. per track, make a route exceed its bound.
+ROUTE_STATEMENTS = {
+    'hikes.list_hikes': 1,
+    'hikes.list_hikes_': 1,
+    # The revision, the hike, its tracks, their segments, both kinds of track points and waypoints.
+    'hikes.one_hike': 7,
+    'hikes.get_hike_waypoints': 2,
+    # The revision, the hike, its tracks, both kinds of track points, waypoints and pictures.
+    'hikes.hike_page': 7,
+    'hikes.hikes.hike_deletion_status': 9,
+    'pics.list_pics': 2,
+    'pics.list_pics_': 2,
+    'pics.get_pic': 1,
+    'pics.get_pic_data': 2,
+    'pics.get_pics_for_hike': 2,
+    # The revision, the pictures and the waypoints, the clusters of all zooms are built at once.
+    'pics.get_clusters_for_hike': 3,
+    'tiles.get_tile': 4,
+    'time.list_timezones': 1,
+    'tracks.list_tracks': 1,
+    'tracks.list_tracks_': 1,
+    'tracks.one_track': 1,
+    'tracks.list_segments': 1,
+    'tracks.list_track_points': 3,
+    'tracks.tracks.track_deletion_status': 5,
+    # The revision, the tracks, their segments and both kinds of track points, while streaming.
+    'tracks.tracks_from_hike': 5,
+    'tracks.hike_elevation_profile': 3,
+}
+
+
+class TestQueryBounds(unittest.TestCase):
+    GPX_FILES = sorted(Path(DATA_FOLDER, '20220507-CT-North-Chick-Hike/gpx-data').glob('*.gpx'))
+    PICTURE = Path(TESTS_FOLDER, 'test_data/2022-05-07 10.38.57.jpg')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app()
+        with Session(get_engine()) as session:
+            key = session.execute(
+                select(ApiSession.key)
+                .where(ApiSession.admin.is_(True))
+                .limit(1)
+            ).scalar_one()
+        cls.headers = {'Api-Session': key}
+        cls.client = cls.app.test_client()
+        resp = cls.client.post(
+            '/hikes/new', json={'name': 'test-query-bounds'}, headers=cls.headers)
+        cls.hike_id = resp.json['id']
+        files = {x.name: (x.open('rb'), x.name) for x in cls.GPX_FILES}
+        resp = cls.client.post(f'/hikes/{cls.hike_id}/data', data=files, headers=cls.headers)
+        assert resp.status_code == 200, resp.data
+        with cls.PICTURE.open('rb') as file:
+            resp = cls.client.post(
+                f'/pictures/hike/{cls.hike_id}', data={'file': (file, cls.PICTURE.name)},
+                headers=cls.headers)
+        cls.pic_id = resp.json['created'][0]['id']
+        # Not through routes of the hike, such that their responses are not cached yet.
+        tracks = cls.client.get('/tracks').json['data']
+        tracks = [x['id'] for x in tracks if x['parent'] == cls.hike_id]
+        assert len(tracks) > 1, tracks
+        cls.track_id = tracks[0]
+        cls.segment_id = cls.client.get(f'/tracks/{cls.track_id}/segment').json['id']
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.delete(f'/hikes/{cls.hike_id}', headers=cls.headers)
+
+    def _urls(self):
+        hike, track, segment = self.hike_id, self.track_id, self.segment_id
+        return {
+            'hikes.list_hikes': ['/hikes'],
+            'hikes.list_hikes_': ['/hikes/'],
+            'hikes.one_hike': [f'/hikes/{hike}', f'/hikes/{hike}?includeTrack=true'],
+            'hikes.get_hike_waypoints': [f'/hikes/{hike}/waypoints'],
+            'hikes.hike_page': [f'/hikes/{hike}/page'],
+            'hikes.hikes.hike_deletion_status': [f'/hikes/{hike}/deletion'],
+            'pics.list_pics': ['/pictures'],
+            'pics.list_pics_': ['/pictures/'],
+            'pics.get_pic': [f'/pictures/{self.pic_id}'],
+            'pics.get_pic_data': [f'/pictures/{self.pic_id}.jpg'],
+            'pics.get_pics_for_hike': [f'/pictures/hike/{hike}'],
+            'pics.get_clusters_for_hike': [
+                f'/pictures/hike/{hike}/clusters?zoom=12',
+                f'/pictures/hike/{hike}/clusters?zoom=12&waypoints=true',
+            ],
+            'tiles.get_tile': ['/tiles/10/273/408.mvt'],
+            'time.list_timezones': ['/timezones'],
+            'tracks.list_tracks': ['/tracks'],
+            'tracks.list_tracks_': ['/tracks/'],
+            'tracks.one_track': [f'/tracks/{track}'],
+            'tracks.list_segments': [f'/tracks/{track}/segment'],
+            'tracks.list_track_points': [
+                f'/tracks/{track}/segment/{segment}/points',
+                f'/tracks/{track}/segment/{segment}/points?format=geojson',
+            ],
+            'tracks.tracks.track_deletion_status': [f'/tracks/{track}/deletion'],
+            'tracks.tracks_from_hike': [
+                f'/tracks/hike/{hike}?format=geojson',
+                f'/tracks/hike/{hike}?format=json',
+            ],
+            'tracks.hike_elevation_profile': [f'/tracks/hike/{hike}/profile'],
+        }
+
+    def test_every_route_bounded(self):
+        endpoints = {
+            x.endpoint for x in self.app.url_map.iter_rules()
+            if 'GET' in x.methods and '.' in x.endpoint and x.endpoint != 'static'
+        }
+        self.assertEqual(endpoints, set(ROUTE_STATEMENTS))
+        self.assertEqual(set(self._urls()), set(ROUTE_STATEMENTS))
+
+    def test_route_statements(self):
+        for endpoint, urls in self._urls().items():
+            for url in urls:
+                with self.subTest(url=url):
+                    with instrumentation.count_queries(ROUTE_STATEMENTS[endpoint]):
+                        resp = self.client.get(url, headers=self.headers)
+                        # Streamed responses read from the database while being consumed.
+                        resp.get_data()
+                    self.assertEqual(resp.status_code, 200, resp.data)
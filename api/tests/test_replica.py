@@ -0,0 +1,122 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import flask
+from sqlalchemy import create_engine
+
+from src import replica
+from src.db.core import get_engine, init_engine
+
+
+class TestReplica(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.primary = f'sqlite:///{self.tmp.name}/primary.db'
+        self.replica = f'sqlite:///{self.tmp.name}/replica.db'
+        init_engine(self.primary, self.replica)
+        self.client = self._client()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        init_engine('sqlite://')
+        self.tmp.cleanup()
+        return super().tearDown()
+
+    @staticmethod
+    def _client():
+        app = flask.Flask(__name__)
+        replica.init_app(app)
+
+        @app.get('/engine')
+        def _engine():
+            return {'url': str(get_engine().url)}
+
+        @app.post('/engine')
+        def _mutate():
+            return {'url': str(get_engine().url)}
+
+        @app.post('/fail')
+        def _fail():
+            flask.abort(400)
+
+        return app.test_client()
+
+    def _url(self, **kwargs) -> str:
+        return self.client.get('/engine', **kwargs).json['url']
+
+    def test_anonymous_read(self):
+        self.assertEqual(self._url(), self.replica)
+        with self.client.application.app_context():
+            self.assertEqual(str(get_engine().url), self.primary)
+
+    def test_authenticated_read(self):
+        self.assertEqual(self._url(headers={'Api-Session': 'key'}), self.primary)
+        self.client.set_cookie('localhost', 'Api-Session', 'key')
+        self.assertEqual(self._url(), self.primary)
+
+    def test_read_your_writes(self):
+        resp = self.client.post('/engine')
+        self.assertEqual(resp.json['url'], self.primary)
+        cookie = resp.headers['Set-Cookie']
+        self.assertIn(f'{replica.READ_PRIMARY_COOKIE}=1', cookie)
+        self.assertIn(f'Max-Age={replica.MAX_LAG_DEFAULT + replica.LAG_CHECK_INTERVAL}', cookie)
+        self.assertEqual(self._url(), self.primary)
+        self.client.delete_cookie('localhost', replica.READ_PRIMARY_COOKIE)
+        self.assertEqual(self._url(), self.replica)
+
+    def test_failed_mutation(self):
+        resp = self.client.post('/fail')
+        self.assertEqual(resp.status_code, 400)
+        self.assertNotIn('Set-Cookie', resp.headers)
+
+    def test_lag(self):
+        for lag, expected in ((replica.MAX_LAG_DEFAULT + 1, self.primary), (None, self.primary),
+                              (0.5, self.replica)):
+            with mock.patch('src.replica.measure_lag', return_value=lag):
+                client = self._client()
+                self.assertEqual(client.get('/engine').json['url'], expected)
+
+    def test_no_replica(self):
+        init_engine(self.primary)
+        self.assertEqual(self._url(), self.primary)
+        self.assertNotIn('Set-Cookie', self.client.post('/engine').headers)
+
+
+class TestLagMonitor(unittest.TestCase):
+    def test_interval(self):
+        now = [0.0]
+        lags = iter([1.0, 8.0])
+        monitor = replica.LagMonitor(lambda: next(lags), interval=5, clock=lambda: now[0])
+        self.assertEqual(monitor.lag(), 1.0)
+        now[0] = 4.9
+        self.assertEqual(monitor.lag(), 1.0)
+        now[0] = 5.0
+        self.assertEqual(monitor.lag(), 8.0)
+
+    def test_measure_lag(self):
+        self.assertEqual(replica.measure_lag(create_engine('sqlite://')), 0.0)
+        engine = create_engine('sqlite:////nonexistent/directory/replica.db')
+        self.assertIsNone(replica.measure_lag(engine))
+
+    def test_concurrent(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def _measure():
+            started.set()
+            release.wait(5)
+            return 1.0
+        monitor = replica.LagMonitor(_measure)
+        thread = threading.Thread(target=monitor.lag)
+        thread.start()
+        started.wait(5)
+        self.assertIsNone(monitor.lag())
+        release.set()
+        thread.join()
+        self.assertEqual(monitor.lag(), 1.0)
@@ -0,0 +1,24 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+from datetime import datetime, timezone
+import json
+import unittest
+
+from src import streaming
+
+
+class TestStreaming(unittest.TestCase):
+    def test_json_array(self):
+        items = [{'b': 1, 'a': datetime(2022, 5, 7, 15, tzinfo=timezone.utc)}, None, [1.5]]
+        ret = ''.join(streaming.json_array(iter(items)))
+        self.assertEqual(ret, '[{"a":"2022-05-07T15:00:00+00:00","b":1},null,[1.5]]')
+        self.assertEqual(''.join(streaming.json_array([])), '[]')
+
+    def test_chunked(self):
+        parts = streaming.json_array(range(50000))
+        chunks = list(streaming.chunked(parts))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(x) >= streaming.CHUNK_SIZE for x in chunks[:-1]))
+        self.assertEqual(json.loads(b''.join(chunks)), list(range(50000)))
@@ -0,0 +1,76 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=protected-access
+
+import unittest
+
+from src.tiles import geometry, mvt
+
+
+class TestGeometry(unittest.TestCase):
+    def test_valid_tile(self):
+        self.assertTrue(geometry.valid_tile(0, 0, 0))
+        self.assertTrue(geometry.valid_tile(2, 3, 3))
+        self.assertFalse(geometry.valid_tile(2, 4, 0))
+        self.assertFalse(geometry.valid_tile(23, 0, 0))
+
+    def test_project_corners(self):
+        x_0, y_0 = geometry.project(-180.0, geometry.MAX_LATITUDE, 0, 0, 0, 4096)
+        x_1, y_1 = geometry.project(180.0, -geometry.MAX_LATITUDE, 0, 0, 0, 4096)
+        self.assertAlmostEqual(x_0, 0.0)
+        self.assertAlmostEqual(y_0, 0.0, places=3)
+        self.assertAlmostEqual(x_1, 4096.0)
+        self.assertAlmostEqual(y_1, 4096.0, places=3)
+
+    def test_tile_bounds(self):
+        min_lon, min_lat, max_lon, max_lat = geometry.tile_bounds(1, 1, 0)
+        self.assertAlmostEqual(min_lon, 0.0)
+        self.assertAlmostEqual(max_lon, 180.0)
+        self.assertAlmostEqual(min_lat, 0.0)
+        self.assertAlmostEqual(max_lat, geometry.MAX_LATITUDE)
+
+    def test_clip_line(self):
+        line = [(-10.0, 5.0), (5.0, 5.0), (20.0, 5.0), (20.0, 8.0), (5.0, 8.0)]
+        ret = geometry.clip_line(line, 0.0, 10.0)
+        self.assertEqual(ret, [[(0.0, 5.0), (5.0, 5.0), (10.0, 5.0)], [(10.0, 8.0), (5.0, 8.0)]])
+
+    def test_clip_line_outside(self):
+        self.assertEqual(geometry.clip_line([(20.0, 20.0), (30.0, 20.0)], 0.0, 10.0), [])
+
+    def test_simplify(self):
+        line = [(0.0, 0.0), (1.0, 0.1), (2.0, -0.1), (3.0, 5.0), (4.0, 6.0)]
+        self.assertEqual(geometry.simplify(line, 0.5), [(0.0, 0.0), (2.0, -0.1), (3.0, 5.0),
+                                                          (4.0, 6.0)])
+        self.assertEqual(geometry.simplify(line, 10.0), [(0.0, 0.0), (4.0, 6.0)])
+
+
+class TestMvt(unittest.TestCase):
+    def test_varint(self):
+        self.assertEqual(mvt._varint(1), b'\x01')
+        self.assertEqual(mvt._varint(300), b'\xac\x02')
+
+    def test_zigzag(self):
+        self.assertEqual(list(map(mvt._zigzag, [0, -1, 1, -2, 2])), [0, 1, 2, 3, 4])
+
+    def test_point_geometry(self):
+        # Example taken from the vector tile specification.
+        self.assertEqual(mvt._encode_geometry(mvt.GEOM_POINT, [[(25, 17)]]), [9, 50, 34])
+
+    def test_linestring_geometry(self):
+        # Example taken from the vector tile specification.
+        ret = mvt._encode_geometry(mvt.GEOM_LINESTRING, [[(2, 2), (2, 10), (10, 10)]])
+        self.assertEqual(ret, [9, 4, 4, 18, 0, 16, 16, 0])
+
+    def test_empty_layers_skipped(self):
+        layer = mvt.Layer('tracks')
+        layer.add_feature(mvt.GEOM_LINESTRING, [[(1, 1)]])
+        self.assertEqual(len(layer), 0)
+        self.assertEqual(mvt.encode_tile([layer]), b'')
+
+    def test_shared_tags(self):
+        layer = mvt.Layer('waypoints')
+        layer.add_feature(mvt.GEOM_POINT, [[(1, 1)]], {'hike': 1, 'name': 'a'})
+        layer.add_feature(mvt.GEOM_POINT, [[(2, 2)]], {'hike': 1, 'name': 'b'})
+        self.assertEqual(layer._keys, {'hike': 0, 'name': 1})
+        self.assertEqual(len(layer._values), 3)
@@ -0,0 +1,59 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+
+import unittest
+
+import numpy as np
+
+from src.db import trackpack
+
+
+def _points(count: int) -> trackpack.PackedPoints:
+    rng = np.random.default_rng(7)
+    return trackpack.PackedPoints(
+        time=1651938583.0 + np.arange(count) * 5.0,
+        latitude=np.round(35.25 + np.cumsum(rng.normal(0, 1e-4, count)), 6),
+        longitude=np.round(-85.23 + np.cumsum(rng.normal(0, 1e-4, count)), 6),
+        elevation=np.round(400.0 + np.cumsum(rng.normal(0, 0.5, count)), 1),
+    )
+
+
+class TestTrackPack(unittest.TestCase):
+    def test_round_trip(self):
+        points = _points(1000)
+        ret = trackpack.unpack(trackpack.pack(points))
+        for expected, actual in zip(points, ret):
+            np.testing.assert_array_equal(expected, actual)
+
+    def test_missing_values(self):
+        points = _points(10)
+        points.time[3] = np.nan
+        points.elevation[[0, 9]] = np.nan
+        ret = trackpack.unpack(trackpack.pack(points))
+        self.assertTrue(np.isnan(ret.time[3]))
+        self.assertEqual(ret.time[4], points.time[4])
+        self.assertTrue(np.isnan(ret.elevation[[0, 9]]).all())
+        self.assertEqual(ret.elevation[1], points.elevation[1])
+
+    def test_empty(self):
+        empty = trackpack.PackedPoints(*[np.empty(0)] * 4)
+        self.assertEqual(len(trackpack.unpack(trackpack.pack(empty))), 0)
+        self.assertIsNone(trackpack.bounds(empty))
+
+    def test_compact(self):
+        # Well below the 4 float columns (32 bytes) per point of the raw values.
+        self.assertLess(len(trackpack.pack(_points(1000))), 1000 * 12)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            trackpack.unpack(b'XX\x01\x00\x00\x00\x00')
+
+    def test_bounds(self):
+        points = _points(100)
+        points.latitude[0] = np.nan
+        min_lat, max_lat, min_lon, max_lon = trackpack.bounds(points)
+        self.assertEqual(min_lat, np.nanmin(points.latitude))
+        self.assertEqual(max_lat, np.nanmax(points.latitude))
+        self.assertEqual(min_lon, points.longitude.min())
+        self.assertEqual(max_lon, points.longitude.max())
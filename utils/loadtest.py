@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+'''
+Replay a mix of traffic against a running stack and report latency, throughput and errors per
+endpoint, to check the capacity of the site before traffic spikes.
+
+The traffic is either replayed from access logs (nginx `combined` lines or the json request lines
+logged by the api) or synthesized from the hikes of the site: visits of the hike browser followed
+by a hike page with its tracks, waypoints, picture list and pictures.
+
+    ./loadtest.py --url http://localhost:8080 --concurrency 16 --duration 60
+    ./loadtest.py --log access.log --rate 50 --duration 120 --json
+'''
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+from pathlib import Path
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from common.config import CONFIG, get_logger
+
+LOG = get_logger()
+
+_TIMEOUT = 60
+
+# Pictures fetched per hike page of the synthetic traffic, as far as the hike has pictures.
+_PICTURES_PER_VISIT = 12
+
+_COMBINED_PAT = re.compile(r'"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+" (?P<status>\d{3})')
+
+# Endpoint names of request paths (without the query string), first match wins.
+_ENDPOINTS = [
+    (re.compile(r'^/api/hikes/?$'), 'hikes'),
+    (re.compile(r'^/api/hikes/\d+$'), 'hike'),
+    (re.compile(r'^/api/hikes/\d+/waypoints$'), 'waypoints'),
+    (re.compile(r'^/api/tracks/hike/\d+$'), 'hike tracks'),
+    (re.compile(r'^/api/pictures/hike/\d+$'), 'hike pictures'),
+    (re.compile(r'^/api/pictures/\d+\.\w+$'), 'picture'),
+    (re.compile(r'^/api/tiles/\d+/\d+/\d+\.mvt$'), 'tile'),
+]
+
+
+def _endpoint(path: str) -> str:
+    route, _, query = path.partition('?')
+    for pat, name in _ENDPOINTS:
+        if pat.match(route):
+            return f'{name} (track)' if 'includeTrack=true' in query else name
+    return re.sub(r'\d+', '<id>', route)
+
+
+def _percentile(values: List[float], perc: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(perc / 100 * (len(values) - 1))))
+    return values[index]
+
+
+####################################################################################################
+# Traffic
+
+def _log_paths(files: List[Path]) -> List[str]:
+    ''' Paths of the GET requests of the api in access logs. '''
+    ret = []
+    for file in files:
+        for line in file.read_text(encoding='utf-8', errors='replace').splitlines():
+            if line.startswith('{'):
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                # Logged by the api itself, behind the `/api` prefix of the proxy.
+                if data.get('event') == 'request' and data.get('method') == 'GET':
+                    ret.append(f'/api{data["path"]}')
+                continue
+            match = _COMBINED_PAT.search(line)
+            if match and match['method'] == 'GET' and match['path'].startswith('/api/'):
+                ret.append(match['path'])
+    return ret
+
+
+def _synthetic_paths(base_url: str, rng: random.Random) -> Iterator[str]:
+    ''' Endless visits of the hike browser and hike pages of the hikes on the site. '''
+    resp = requests.get(f'{base_url}/api/hikes/', timeout=_TIMEOUT)
+    resp.raise_for_status()
+    hikes = [x['id'] for x in resp.json()['data']]
+    if not hikes:
+        raise ValueError('No hikes to visit on the site')
+    pictures: Dict[int, List[str]] = {}
+    for hike_id in hikes:
+        resp = requests.get(f'{base_url}/api/pictures/hike/{hike_id}', timeout=_TIMEOUT)
+        resp.raise_for_status()
+        pictures[hike_id] = [f'/api/pictures/{x["id"]}.{x["fmt"].lower()}'
+                             for x in resp.json()['data']]
+    while True:
+        hike_id = rng.choice(hikes)
+        yield '/api/hikes/'
+        yield f'/api/hikes/{hike_id}?includeTrack=true'
+        yield f'/api/tracks/hike/{hike_id}'
+        yield f'/api/hikes/{hike_id}/waypoints'
+        yield f'/api/pictures/hike/{hike_id}'
+        pics = pictures[hike_id]
+        yield from rng.sample(pics, min(len(pics), _PICTURES_PER_VISIT))
+
+
+####################################################################################################
+# Replay
+
+class _Results:
+    ''' Latencies and failures per endpoint, shared by the workers. '''
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.bytes = 0
+
+    def add(self, endpoint: str, latency: float, nbytes: int, failed: bool) -> None:
+        ''' Record a request. '''
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + int(failed)
+            self.bytes += nbytes
+
+    def report(self, elapsed: float) -> List[Dict[str, object]]:
+        ''' Stats per endpoint, then of all of them as `total`. '''
+        ret = []
+        items = sorted(self.latencies.items())
+        total = list(itertools.chain.from_iterable(x for _, x in items))
+        for endpoint, values in [*items, ('total', total)]:
+            errors = sum(self.errors.values()) if endpoint == 'total' else self.errors[endpoint]
+            ret.append({
+                'endpoint': endpoint,
+                'requests': len(values),
+                'errors': errors,
+                'error_rate': errors / len(values) if values else 0.0,
+                'throughput_rps': len(values) / elapsed,
+                'p50_ms': _percentile(values, 50) * 1000,
+                'p95_ms': _percentile(values, 95) * 1000,
+                'p99_ms': _percentile(values, 99) * 1000,
+            })
+        return ret
+
+
+def _replay(base_url: str, paths: Iterator[str], concurrency: int, rate: Optional[float],
+            duration: float, results: _Results) -> float:
+    '''
+    Request the paths on `concurrency` workers until `duration` passed. With a `rate` (requests
+    per second) requests are scheduled at fixed intervals and latencies count from the scheduled
+    time, such that time spent waiting for a free worker is part of the latency. Otherwise the
+    workers send requests back to back.
+    '''
+    lock = threading.Lock()
+    start = time.monotonic()
+    stop = start + duration
+    count = itertools.count()
+
+    def _worker():
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    path = next(paths)
+                    index = next(count)
+                scheduled = start + index / rate if rate else time.monotonic()
+                if scheduled >= stop:
+                    return
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    resp = session.get(f'{base_url}{path}', timeout=_TIMEOUT)
+                    nbytes = len(resp.content)
+                    failed = resp.status_code >= 400
+                except requests.RequestException:
+                    nbytes, failed = 0, True
+                results.add(_endpoint(path), time.monotonic() - scheduled, nbytes, failed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(_worker) for _ in range(concurrency)]:
+            future.result()
+    return time.monotonic() - start
+
+
+####################################################################################################
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Origin of the stack, the `url` of the app config if unset.')
+    parser.add_argument('--log', type=Path, nargs='+',
+                        help='Access logs to replay, synthetic traffic if unset.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients.')
+    parser.add_argument('--rate', type=float,
+                        help='Requests per second, as fast as the clients go if unset.')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to send requests.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic traffic.')
+    parser.add_argument('--json', action='store_true', help='Print results as json lines.')
+    args = parser.parse_args()
+
+    base_url = (args.url or CONFIG.get('url', section='app')).rstrip('/')
+    if args.log:
+        recorded = _log_paths(args.log)
+        if not recorded:
+            parser.error('No GET requests of the api found in the logs')
+        paths = itertools.cycle(recorded)
+        LOG.info('Replaying %d requests of %d log files', len(recorded), len(args.log))
+    else:
+        paths = _synthetic_paths(base_url, random.Random(args.seed))
+
+    results = _Results()
+    elapsed = _replay(base_url, paths, args.concurrency, args.rate, args.duration, results)
+    report = results.report(elapsed)
+    if args.json:
+        for ret in report:
+            print(json.dumps({'concurrency': args.concurrency, 'rate': args.rate, **ret}))
+        return
+    throughput = results.bytes / elapsed / 1e6
+    print(f'{elapsed:.1f} s, concurrency={args.concurrency}, {throughput:.2f} MB/s')
+    print(f'{"endpoint":22s} {"requests":>8s} {"req/s":>8s} {"errors":>7s} '
+          f'{"p50 ms":>9s} {"p95 ms":>9s} {"p99 ms":>9s}')
+    for ret in report:
+        print(f'{ret["endpoint"]:22s} {ret["requests"]:8d} {ret["throughput_rps"]:8.1f} '
+              f'{ret["error_rate"]:7.1%} {ret["p50_ms"]:9.1f} {ret["p95_ms"]:9.1f} '
+              f'{ret["p99_ms"]:9.1f}')
+
+
+if __name__ == '__main__':
+    _main()
@@ -9,18 +9,18 @@ import os
 from pathlib import Path
 import re
 
-from alembic import config
-import alembic
-import alembic.command
-import pytz
-import requests
-
 from common.config import CONFIG, ROOT, get_logger
 from common.progress import Progress, FilesProgress
 
 LOG = get_logger()
 
 
+def _requests():
+    ''' The `requests` module, imported by the actions calling the api only. '''
+    import requests  # pylint: disable=import-outside-toplevel
+    return requests
+
+
 ####################################################################################################
 
 def _time_type(value: str) -> datetime:
@@ -44,6 +44,7 @@ def _time_type(value: str) -> datetime:
 
 
 def _tz_type(value: str) -> str:
+    import pytz  # pylint: disable=import-outside-toplevel
     if value not in pytz.common_timezones:
         raise argparse.ArgumentTypeError(f'Unknown timezone string "{value}"')
     return value
@@ -57,6 +58,10 @@ def _action_migrate(args_):
     otherwise, "base" can be used to completely revert the migrations, or a relative identifier can
     be use (e.g. -3  or +2).
     '''
+    # Only this action needs alembic, which is slow to import.
+    from alembic import config  # pylint: disable=import-outside-toplevel
+    import alembic.command  # pylint: disable=import-outside-toplevel
+
     parser = argparse.ArgumentParser()
     parser.add_argument('rev', nargs='?', default='head')
     args = parser.parse_args(args_.others)
@@ -92,7 +97,7 @@ def _action_list(args_):
 
     base_url = CONFIG.get('url', section='app')
     url = f'{base_url}/api/hikes'
-    resp = requests.get(url)
+    resp = _requests().get(url)
     resp.raise_for_status()
 
     data = resp.json()['data']
@@ -134,7 +139,7 @@ def _action_create(args_):
     data = filter(lambda x: x[1] is not None, data)
     data = dict(data)
 
-    resp = requests.post(url, json=data, headers=headers, timeout=10)
+    resp = _requests().post(url, json=data, headers=headers, timeout=10)
     resp.raise_for_status()
 
     print(f' Hike: {json.dumps(resp.json(), indent=2)}')
@@ -175,7 +180,7 @@ def _action_update(args_):
     data = filter(lambda x: x[1] is not None, data)
     data = dict(data)
 
-    resp = requests.post(url, json=data, headers=headers, timeout=10)
+    resp = _requests().post(url, json=data, headers=headers, timeout=10)
     resp.raise_for_status()
 
     print(' Hike: {json.dumps(resp.json(), indent=2)}')
@@ -216,7 +221,7 @@ def _action_upload(args_):
             url = f'{base_url}/api/hikes/{args.hikeid}/data'
         inf = MyBuf(file)
         files = {file.name: inf}
-        resp = requests.post(
+        resp = _requests().post(
             url,
             files=files,
             headers=headers,
@@ -238,7 +243,7 @@ def _action_process(args_):
 
     url = f'{base_url}/api/pictures/process?limit={args.limit}'
 
-    resp = requests.post(
+    resp = _requests().post(
         url,
         headers=headers,
         timeout=args.timeout,
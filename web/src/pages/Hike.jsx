@@ -31,21 +31,8 @@ mapboxgl.accessToken = MAPBOXGL_ACCESS_TOKEN;
 
 let gHikeTimezone = 'UTC';
 
-async function queryHike(hikeId, { includeTrack=false } = {}) {
-    const query = { includeTrack };
-    return apiCall(`/hikes/${hikeId}`, 'GET', { json: true, query });
-}
-
-async function queryTracks(hikeId) {
-    return apiCall(`/tracks/hike/${hikeId}`, 'GET', { json: true });
-}
-
-async function queryWaypoints(hikeId) {
-    return apiCall(`/hikes/${hikeId}/waypoints`, 'GET', { json: true });
-}
-
-async function queryPictures(hikeId) {
-    return apiCall(`/pictures/hike/${hikeId}`, 'GET', { json: true });
+async function queryHikePage(hikeId) {
+    return apiCall(`/hikes/${hikeId}/page`, 'GET', { json: true });
 }
 
 function mapStyleUrl(name) {
@@ -499,23 +486,17 @@ function Hike(props = {}) {
     };
 
     useEffect(() => {
-        queryHike(params.hikeId).then((ret) => {
-            setHike(ret);
-            if (!!ret.zone) {
-                gHikeTimezone = ret.zone;
+        queryHikePage(params.hikeId).then((ret) => {
+            setHike(ret.hike);
+            if (!!ret.hike.zone) {
+                gHikeTimezone = ret.hike.zone;
             }
-        }).catch((err) => console.error('Failed to get hike info:', err)).finally(() => {
+            setTracks(ret.tracks);
+            setWaypoints(ret.waypoints);
+            setPictures(ret.pictures);
+        }).catch((err) => console.error('Failed to get hike page info:', err)).finally(() => {
             setHikeMetaLoaded(true);
         });
-        queryTracks(params.hikeId).then((ret) => {
-            setTracks(ret.data);
-        }).catch((err) => console.error('Failed to get hike track info:', err));
-        queryWaypoints(params.hikeId).then((ret) => {
-            setWaypoints(ret.data);
-        }).catch((err) => console.error('Failed to get hike waypoint info:', err));
-        queryPictures(params.hikeId).then((ret) => {
-            setPictures(ret.data);
-        }).catch((err) => console.error('Failed to get hike pictures info:', err));
     }, [])
 
     useEffect(() => {